@@ -0,0 +1,68 @@
+"""
+Admin routes and endpoints.
+This module handles:
+- GET /admin/slow-queries: Returns the most recent slow warehouse queries
+- GET /admin/slow-queries/hottest: Returns slow queries aggregated by query shape
+- GET /admin/resources: Returns DuckDB thread, memory and spill usage across open connections,
+  and the state of the query worker pool
+"""
+
+from flask import Blueprint, request, jsonify
+from core.security import Security
+from services.query_log import slow_query_log
+from services.resource_governor import resource_governor
+from services.query_executor import query_executor
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
+
+def _get_limit(default: int) -> int:
+    limit = int(request.args.get("limit", default))
+    if limit <= 0:
+        raise ValueError("Limit parameter must be a positive number")
+    return limit
+
+@admin_bp.route("/slow-queries", methods=["GET"])
+@Security.require_admin
+def get_slow_queries():
+    """Get the most recent slow queries, optionally filtered by warehouse."""
+    try:
+        limit = _get_limit(100)
+    except ValueError:
+        return jsonify({"error": "Limit parameter must be a positive number"}), 400
+
+    try:
+        entries = slow_query_log.get_entries(limit=limit, warehouse_id=request.args.get("warehouse_id"))
+        return jsonify(entries), 200
+    except Exception as e:
+        logger.error(f"Error getting slow queries: {str(e)}")
+        return jsonify({"error": "Failed to retrieve slow queries. Please try again later."}), 500
+
+@admin_bp.route("/slow-queries/hottest", methods=["GET"])
+@Security.require_admin
+def get_hottest_queries():
+    """Get slow queries grouped by fingerprint, ordered by total time spent."""
+    try:
+        limit = _get_limit(20)
+    except ValueError:
+        return jsonify({"error": "Limit parameter must be a positive number"}), 400
+
+    try:
+        shapes = slow_query_log.get_hottest(limit=limit)
+        return jsonify(shapes), 200
+    except Exception as e:
+        logger.error(f"Error getting hottest queries: {str(e)}")
+        return jsonify({"error": "Failed to retrieve slow queries. Please try again later."}), 500
+
+@admin_bp.route("/resources", methods=["GET"])
+@Security.require_admin
+def get_resource_usage():
+    """Get the DuckDB resource budget currently leased by open connections."""
+    try:
+        return jsonify({**resource_governor.get_usage(), "query_workers": query_executor.get_status()}), 200
+    except Exception as e:
+        logger.error(f"Error getting resource usage: {str(e)}")
+        return jsonify({"error": "Failed to retrieve resource usage. Please try again later."}), 500
@@ -4,20 +4,75 @@ This module handles:
 - GET /datasets: Returns metadata for all datasets uploaded by the authenticated user.
 - POST /datasets: Create a new dataset in a wareshouse
 - GET /datasets/{dataset_id}: Get a dataset by ID
+- GET /datasets/{dataset_id}/preview: Get sampled preview rows of a dataset
 - PUT /datasets/{dataset_id}: Update a dataset by ID
+- PUT /datasets/{dataset_id}/rollups: Define the rollup tables of a dataset
+- PUT /datasets/{dataset_id}/indexes: Define the point-lookup indexes of a dataset
+- PUT /datasets/{dataset_id}/text_search: Define the full-text search index of a dataset
+- GET /datasets/jobs/{job_id}: Get the status of a dataset ingest job
+- POST /datasets/jobs/{job_id}/cancel: Cancel a dataset ingest job
 - DELETE /datasets/{dataset_id}: Delete a dataset by ID
 """
 
 from flask import Blueprint, request, jsonify
 from services.datasets_service import DatasetService
+from services.ingest_jobs import ingest_jobs, IngestQueueFullError
+from services.utils.file_formats import parse_file_type
+from services.utils.validation import validate_csv_options, validate_json_options, validate_partitioning
 from core.security import Security
 from supabase import create_client, Client
 from core.config import settings
-import os
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _get_csv_options() -> dict:
+    """Read the optional typed CSV ingestion options from the form data."""
+    csv_options = {}
+    if request.form.get("column_types"):
+        try:
+            csv_options["column_types"] = json.loads(request.form["column_types"])
+        except json.JSONDecodeError:
+            raise ValueError("Column types must be a JSON object mapping column names to DuckDB types")
+    if request.form.get("sample_size"):
+        try:
+            csv_options["sample_size"] = int(request.form["sample_size"])
+        except ValueError:
+            raise ValueError("Sample size must be a number")
+    for key in ("date_format", "timestamp_format"):
+        if request.form.get(key):
+            csv_options[key] = request.form[key]
+    if request.form.get("rejects"):
+        csv_options["rejects"] = request.form["rejects"].lower() == "true"
+
+    validate_csv_options(csv_options)
+    return csv_options
+
+def _get_json_options() -> dict:
+    """Read the optional nested JSON flattening options from the form data."""
+    json_options = {}
+    if request.form.get("flatten_json"):
+        json_options["flatten"] = request.form["flatten_json"].lower() == "true"
+    if request.form.get("split_arrays"):
+        json_options["split_arrays"] = request.form["split_arrays"].lower() == "true"
+
+    validate_json_options(json_options)
+    return json_options
+
+def _get_partitioning() -> dict:
+    """Read the optional hive partitioning column and time grain from the form data."""
+    if not request.form.get("partition_by"):
+        if request.form.get("partition_grain"):
+            raise ValueError("A partition grain requires partition_by")
+        return {}
+    partitioning = {"column": request.form["partition_by"].strip()}
+    if request.form.get("partition_grain"):
+        partitioning["grain"] = request.form["partition_grain"].lower()
+
+    validate_partitioning(partitioning)
+    return partitioning
+
 # Initialize Supabase client
 supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_API_KEY)
 
@@ -67,10 +122,41 @@ def get_dataset(dataset_id: str):
         logger.error(f"Error getting dataset {dataset_id}: {str(e)}")
         return jsonify({"error": f"Failed to retrieve dataset {dataset_id}. Please try again later."}), 500
 
+@datasets_bp.route("/<string:dataset_id>/preview", methods=["GET"])
+@Security.require_auth
+def get_dataset_preview(dataset_id: str):
+    """Preview `rows` rows of a dataset sampled by `method` (first, random or stratified by `stratify_by`)."""
+    # Get user ID from the authenticated token
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    try:
+        rows = int(request.args["rows"]) if request.args.get("rows") else None
+    except ValueError:
+        return jsonify({"error": "Rows must be a number"}), 400
+
+    try:
+        preview = dataset_service.get_dataset_preview(
+            user_id=user_id,
+            dataset_id=dataset_id,
+            rows=rows,
+            method=request.args.get("method", "random"),
+            stratify_by=request.args.get("stratify_by")
+        )
+        return jsonify(preview), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error previewing dataset {dataset_id}: {str(e)}")
+        return jsonify({"error": f"Failed to preview dataset {dataset_id}. Please try again later."}), 500
+
 @datasets_bp.route("", methods=["POST"])
 @Security.require_auth
 def create_dataset():
-    """Create a new dataset in a warehouse."""
+    """Queue the creation of a new dataset in a warehouse.
+
+    Returns 202 with the ingest job; poll GET /datasets/jobs/{job_id} for its progress.
+    """
     # Get user ID from the authenticated token
     token = request.headers.get("Authorization").split(" ")[1]
     user_id = Security.get_user_id_from_token(token)
@@ -96,32 +182,92 @@ def create_dataset():
     # Get optional description
     description = request.form.get("description")
 
-    # Get file type from extension
-    file_type = os.path.splitext(file.filename)[1].lower().lstrip(".")
+    # Get optional comma-separated sort key used to cluster the table's rows
+    sort_key = [col.strip() for col in request.form.get("sort_key", "").split(",") if col.strip()]
+
+    # Get optional comma-separated columns to build point-lookup indexes on
+    indexes = [col.strip() for col in request.form.get("indexes", "").split(",") if col.strip()]
+
+    # Get optional comma-separated text columns to build a full-text search index over,
+    # and the unique column identifying rows in search results
+    text_search_columns = [col.strip() for col in request.form.get("text_search_columns", "").split(",") if col.strip()]
+    text_search = {"columns": text_search_columns, "id_column": request.form.get("text_search_id")} if text_search_columns else None
+
+    # Get file type from extension; the actual format is confirmed from the file's magic bytes
+    file_type = parse_file_type(file.filename)
     if not file_type:
         return jsonify({"error": "Could not determine file type"}), 400
 
+    # Get optional CSV type hints, sniff sample size, date formats and rejects mode,
+    # the nested JSON flattening options and the hive partitioning
+    try:
+        csv_options = _get_csv_options()
+        json_options = _get_json_options()
+        partitioning = _get_partitioning()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         # Read file data
         file_data = file.read()
         
-        # Create dataset
-        dataset = dataset_service.create_dataset(
-            user_id=user_id,
-            warehouse_id=warehouse_id,
-            name=name,
-            file_data=file_data,
-            file_type=file_type,
-            description=description
+        # Create dataset on a background worker
+        job = ingest_jobs.submit(
+            user_id,
+            "create_dataset",
+            len(file_data),
+            lambda job: dataset_service.create_dataset(
+                user_id=user_id,
+                warehouse_id=warehouse_id,
+                name=name,
+                file_data=file_data,
+                file_type=file_type,
+                description=description,
+                sort_key=sort_key or None,
+                job=job,
+                csv_options=csv_options or None,
+                json_options=json_options or None,
+                partitioning=partitioning or None,
+                indexes=indexes or None,
+                text_search=text_search
+            )
         )
         
-        return jsonify(dataset), 201
+        return jsonify(job.to_dict()), 202
 
+    except IngestQueueFullError as e:
+        return jsonify({"error": str(e)}), 503
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+@datasets_bp.route("/jobs/<string:job_id>", methods=["GET"])
+@Security.require_auth
+def get_ingest_job(job_id: str):
+    """Get the status and progress of a dataset ingest job."""
+    # Get user ID from the authenticated token
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    job = ingest_jobs.get(job_id, user_id)
+    if not job:
+        return jsonify({"error": f"Ingest job with ID {job_id} not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@datasets_bp.route("/jobs/<string:job_id>/cancel", methods=["POST"])
+@Security.require_auth
+def cancel_ingest_job(job_id: str):
+    """Cancel a queued or running dataset ingest job."""
+    # Get user ID from the authenticated token
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    job = ingest_jobs.cancel(job_id, user_id)
+    if not job:
+        return jsonify({"error": f"Ingest job with ID {job_id} not found"}), 404
+    return jsonify(job.to_dict()), 200
+
 @datasets_bp.route("/<string:dataset_id>", methods=["PUT"])
 @Security.require_auth
 def update_dataset(dataset_id: str):
@@ -138,11 +284,23 @@ def update_dataset(dataset_id: str):
     if not file.filename:
         return jsonify({"error": "No file selected"}), 400
 
-    # Get file type from extension
-    file_type = os.path.splitext(file.filename)[1].lower().lstrip(".")
+    # Get file type from extension; the actual format is confirmed from the file's magic bytes
+    file_type = parse_file_type(file.filename)
     if not file_type:
         return jsonify({"error": "Could not determine file type"}), 400
 
+    # Replace the table, or merge the file's rows into it
+    mode = request.form.get("mode", "replace")
+    if mode not in ("replace", "append", "upsert"):
+        return jsonify({"error": "Invalid mode. Must be one of: replace, append, upsert"}), 400
+    key = [col.strip() for col in request.form.get("key", "").split(",") if col.strip()]
+
+    # Get optional CSV options; without them the dataset's stored ones are used
+    try:
+        csv_options = _get_csv_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         # Read file data
         file_data = file.read()
@@ -152,7 +310,10 @@ def update_dataset(dataset_id: str):
             user_id=user_id,
             dataset_id=dataset_id,
             file_data=file_data,
-            file_type=file_type
+            file_type=file_type,
+            mode=mode,
+            key=key or None,
+            csv_options=csv_options or None
         )
         
         return jsonify(dataset), 200
@@ -163,6 +324,93 @@ def update_dataset(dataset_id: str):
         logger.error(f"Error updating dataset {dataset_id}: {str(e)}")
         return jsonify({"error": f"Failed to update dataset {dataset_id}. Please try again later."}), 500
 
+@datasets_bp.route("/<string:dataset_id>/rollups", methods=["PUT"])
+@Security.require_auth
+def update_rollups(dataset_id: str):
+    """Replace the rollups materialized for a dataset."""
+    # Get user ID from the authenticated token
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    data = request.get_json(silent=True) or {}
+    rollups = data.get("rollups")
+    if not isinstance(rollups, list) or not all(isinstance(rollup, dict) for rollup in rollups):
+        return jsonify({"error": "rollups must be a list of objects"}), 400
+
+    try:
+        dataset = dataset_service.update_rollups(
+            user_id=user_id,
+            dataset_id=dataset_id,
+            rollups=rollups
+        )
+
+        return jsonify(dataset), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating rollups of dataset {dataset_id}: {str(e)}")
+        return jsonify({"error": f"Failed to update rollups of dataset {dataset_id}. Please try again later."}), 500
+
+@datasets_bp.route("/<string:dataset_id>/indexes", methods=["PUT"])
+@Security.require_auth
+def update_indexes(dataset_id: str):
+    """Replace the columns of a dataset that carry point-lookup indexes."""
+    # Get user ID from the authenticated token
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    data = request.get_json(silent=True) or {}
+    indexes = data.get("indexes")
+    if not isinstance(indexes, list) or not all(isinstance(column, str) for column in indexes):
+        return jsonify({"error": "indexes must be a list of column names"}), 400
+
+    try:
+        dataset = dataset_service.update_indexes(
+            user_id=user_id,
+            dataset_id=dataset_id,
+            indexes=indexes
+        )
+
+        return jsonify(dataset), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating indexes of dataset {dataset_id}: {str(e)}")
+        return jsonify({"error": f"Failed to update indexes of dataset {dataset_id}. Please try again later."}), 500
+
+@datasets_bp.route("/<string:dataset_id>/text_search", methods=["PUT"])
+@Security.require_auth
+def update_text_search(dataset_id: str):
+    """Replace the full-text search index of a dataset."""
+    # Get user ID from the authenticated token
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    data = request.get_json(silent=True) or {}
+    columns = data.get("columns")
+    if not isinstance(columns, list) or not all(isinstance(column, str) for column in columns):
+        return jsonify({"error": "columns must be a list of column names"}), 400
+    id_column = data.get("id_column")
+    if id_column is not None and not isinstance(id_column, str):
+        return jsonify({"error": "id_column must be a column name"}), 400
+
+    try:
+        dataset = dataset_service.update_text_search(
+            user_id=user_id,
+            dataset_id=dataset_id,
+            text_search={"columns": columns, "id_column": id_column}
+        )
+
+        return jsonify(dataset), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating the text search index of dataset {dataset_id}: {str(e)}")
+        return jsonify({"error": f"Failed to update the text search index of dataset {dataset_id}. Please try again later."}), 500
+
 @datasets_bp.route("/<string:dataset_id>", methods=["DELETE"])
 @Security.require_auth
 def delete_dataset(dataset_id: str):
@@ -0,0 +1,110 @@
+"""
+Query result routes and endpoints.
+This module handles:
+- GET /results/{result_id}: Get the row count, columns and expiry of a spilled query result
+- GET /results/{result_id}/rows: Page through the rows of a spilled query result
+- GET /results/{result_id}/download: Download a spilled query result as Parquet or CSV
+- DELETE /results/{result_id}: Discard a spilled query result
+"""
+
+from flask import Blueprint, request, jsonify, send_file, after_this_request
+from core.security import Security
+from core.config import settings
+from services.duckdb_handler import DuckDBHandler, ResourcesBusyError
+from services.file_handler import FileHandler
+from services.result_store import result_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+results_bp = Blueprint("results", __name__, url_prefix="/api/results")
+
+@results_bp.route("/<string:result_id>", methods=["GET"])
+@Security.require_auth
+def get_result(result_id: str):
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    handle = result_store.get(result_id, user_id)
+    if not handle:
+        return jsonify({"error": f"Result with ID {result_id} not found or expired"}), 404
+    return jsonify(handle.to_dict()), 200
+
+@results_bp.route("/<string:result_id>/rows", methods=["GET"])
+@Security.require_auth
+def get_result_rows(result_id: str):
+    """Get `limit` rows of a result starting at `offset`."""
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", settings.RESULT_PAGE_ROWS))
+    except ValueError:
+        return jsonify({"error": "Offset and limit must be numbers"}), 400
+    if offset < 0 or limit <= 0 or limit > settings.RESULT_PAGE_ROWS:
+        return jsonify({"error": f"Offset must not be negative and limit must be between 1 and {settings.RESULT_PAGE_ROWS}"}), 400
+
+    handle = result_store.get(result_id, user_id)
+    if not handle:
+        return jsonify({"error": f"Result with ID {result_id} not found or expired"}), 404
+
+    try:
+        rows = DuckDBHandler().read_result(handle, offset=offset, limit=limit)
+        return jsonify({
+            "data": rows,
+            "offset": offset,
+            "row_count": handle.row_count,
+            "has_more": offset + len(rows) < handle.row_count
+        }), 200
+    except ResourcesBusyError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 503
+    except Exception as e:
+        logger.error(f"Error reading result {result_id}: {str(e)}")
+        return jsonify({"error": f"Failed to read result {result_id}. Please try again later."}), 500
+
+@results_bp.route("/<string:result_id>/download", methods=["GET"])
+@Security.require_auth
+def download_result(result_id: str):
+    """Download a whole result; `format` is parquet (the stored file) or csv."""
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    file_format = request.args.get("format", "parquet")
+    if file_format not in ("parquet", "csv"):
+        return jsonify({"error": "Invalid format. Must be one of: parquet, csv"}), 400
+
+    handle = result_store.get(result_id, user_id)
+    if not handle:
+        return jsonify({"error": f"Result with ID {result_id} not found or expired"}), 404
+
+    if file_format == "parquet":
+        return send_file(handle.path, as_attachment=True, download_name=f"{result_id}.parquet", mimetype="application/vnd.apache.parquet")
+
+    file_handler = FileHandler()
+    csv_path = file_handler.create_empty_temp_file(".csv")
+    try:
+        DuckDBHandler().export_result(handle, csv_path, file_format="csv")
+    except Exception as e:
+        file_handler.cleanup(csv_path)
+        logger.error(f"Error exporting result {result_id}: {str(e)}")
+        return jsonify({"error": f"Failed to export result {result_id}. Please try again later."}), 500
+
+    # Set up cleanup after the response is sent
+    @after_this_request
+    def cleanup(response):
+        file_handler.cleanup(csv_path)
+        return response
+
+    return send_file(csv_path, as_attachment=True, download_name=f"{result_id}.csv", mimetype="text/csv")
+
+@results_bp.route("/<string:result_id>", methods=["DELETE"])
+@Security.require_auth
+def delete_result(result_id: str):
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    if not result_store.delete(result_id, user_id):
+        return jsonify({"error": f"Result with ID {result_id} not found or expired"}), 404
+    return "", 204
@@ -6,6 +6,11 @@ This module handles:
 - GET /warehouses/{warehouse_id}: Get a warehouse by ID
 - PUT /warehouses/{warehouse_id}: Update a warehouse by ID
 - DELETE /warehouses/{warehouse_id}: Delete a warehouse by ID
+- POST /warehouses/{warehouse_id}/query: Run a query on a warehouse, optionally joining other attached warehouses;
+  large results come back as a first page and a result handle (see /results)
+- POST /warehouses/{warehouse_id}/profile: Run a query with profiling and return its profile
+- PUT /warehouses/{warehouse_id}/semantic_model: Define the metrics and dimensions of a warehouse
+- POST /warehouses/{warehouse_id}/metrics: Compute metrics of the semantic model by dimensions
 """
 
 from flask import Blueprint, request, jsonify
@@ -14,7 +19,7 @@ from core.security import Security
 from supabase import create_client, Client
 from core.config import settings
 from services.file_handler import FileHandler
-from services.duckdb_handler import DuckDBHandler
+from services.duckdb_handler import DuckDBHandler, QueryError, ResourcesBusyError
 
 # Initialize Supabase client
 supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_API_KEY)
@@ -133,6 +138,21 @@ def query_warehouse(warehouse_id: str):
             return jsonify({"error": "Query parameter is required"}), 400
             
         query = data["query"]
+
+        # Optional named parameters referenced in the query as $name
+        params = data.get("params")
+        if params is not None and not isinstance(params, dict):
+            return jsonify({"error": "Params must be an object mapping parameter names to values"}), 400
+
+        # Optionally answer from the table's reservoir sample, with scaled aggregates
+        approximate = data.get("approximate", False)
+        if not isinstance(approximate, bool):
+            return jsonify({"error": "Approximate must be a boolean"}), 400
+
+        # Other warehouses of the user to attach read-only, queried as alias.table
+        attach = data.get("attach") or []
+        if not isinstance(attach, list) or not all(isinstance(item, dict) and "warehouse_id" in item and "alias" in item for item in attach):
+            return jsonify({"error": "Attach must be a list of objects with warehouse_id and alias"}), 400
         
         # Get warehouse details
         warehouse = warehouse_service.get_warehouse(user_id=user_id, warehouse_id=warehouse_id)
@@ -143,22 +163,151 @@ def query_warehouse(warehouse_id: str):
         
         # Download warehouse file temporarily
         local_path = file_handler.create_empty_temp_file(".duckdb")
+        attachments = {}
         try:
             file_handler.download_file(warehouse["storage_path"], local_path)
+            warehouse_service.sync_partitions(user_id, warehouse)
+            attachments = warehouse_service.download_attached_warehouses(user_id, attach)
             
             # Execute query using DuckDBHandler
             duckdb_handler = DuckDBHandler()
-            result = duckdb_handler.execute_query(local_path, query)
+            attached_warehouses = {item["alias"]: item["warehouse_id"] for item in attach}
+            cache_key = DuckDBHandler.query_cache_key(query, params, approximate=approximate, attached_warehouses=attached_warehouses)
+            if approximate:
+                result = duckdb_handler.execute_approximate_query(local_path, query, params=params, warehouse_id=warehouse_id, source="query_api", attachments=attachments)
+                return jsonify({**result, "cache_key": cache_key}), 200
+
+            # Large results are spilled to Parquet and paged through /results instead of sent whole
+            result = duckdb_handler.execute_query_to_result(local_path, query, user_id, params=params, warehouse_id=warehouse_id, source="query_api", attachments=attachments)
             
-            return jsonify({"data": result}), 200
+            return jsonify({**result, "cache_key": cache_key}), 200
             
         finally:
-            # Clean up temporary file
-            file_handler.cleanup(local_path)
+            # Clean up temporary files
+            file_handler.cleanup(local_path, *attachments.values())
             
+    except ResourcesBusyError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 503
+    except QueryError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 422
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
         # Return the actual error message from DuckDB
         return jsonify({"error": str(e)}), 500
 
+
+
+
+@warehouses_bp.route("/<string:warehouse_id>/profile", methods=["POST"])
+@Security.require_auth
+def profile_warehouse_query(warehouse_id: str):
+    """Run a query with DuckDB profiling enabled and return the profile."""
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+    
+    try:
+        data = request.get_json()
+        if not data or "query" not in data:
+            return jsonify({"error": "Query parameter is required"}), 400
+
+        params = data.get("params")
+        if params is not None and not isinstance(params, dict):
+            return jsonify({"error": "Params must be an object mapping parameter names to values"}), 400
+
+        mode = data.get("mode", "json")
+        if mode not in DuckDBHandler.PROFILING_MODES:
+            return jsonify({"error": f"Invalid mode. Must be one of: {', '.join(DuckDBHandler.PROFILING_MODES)}"}), 400
+
+        warehouse = warehouse_service.get_warehouse(user_id=user_id, warehouse_id=warehouse_id)
+        
+        file_handler = FileHandler()
+        file_handler.set_bucket(warehouse["bucket"])
+        
+        local_path = file_handler.create_empty_temp_file(".duckdb")
+        try:
+            file_handler.download_file(warehouse["storage_path"], local_path)
+            warehouse_service.sync_partitions(user_id, warehouse)
+            
+            duckdb_handler = DuckDBHandler()
+            profile = duckdb_handler.profile_query(local_path, data["query"], mode=mode, params=params)
+            
+            return jsonify(profile), 200
+            
+        finally:
+            file_handler.cleanup(local_path)
+            
+    except ResourcesBusyError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 503
+    except QueryError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 422
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@warehouses_bp.route("/<string:warehouse_id>/semantic_model", methods=["PUT"])
+@Security.require_auth
+def update_semantic_model(warehouse_id: str):
+    """Replace the metric and dimension definitions of a warehouse."""
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "The semantic model must be an object with metrics and dimensions"}), 400
+
+    try:
+        warehouse = warehouse_service.update_semantic_model(user_id=user_id, warehouse_id=warehouse_id, model=data)
+        return jsonify(warehouse), 200
+    except ResourcesBusyError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@warehouses_bp.route("/<string:warehouse_id>/metrics", methods=["POST"])
+@Security.require_auth
+def query_metrics(warehouse_id: str):
+    """Compute named metrics, optionally by dimensions, time grain and filters."""
+    token = request.headers.get("Authorization").split(" ")[1]
+    user_id = Security.get_user_id_from_token(token)
+
+    data = request.get_json(silent=True) or {}
+    metrics = data.get("metrics")
+    if not isinstance(metrics, list) or not metrics or not all(isinstance(metric, str) for metric in metrics):
+        return jsonify({"error": "metrics must be a non-empty list of metric names"}), 400
+    filters = data.get("filters") or []
+    if not isinstance(filters, list) or not all(isinstance(item, dict) for item in filters):
+        return jsonify({"error": "filters must be a list of objects with dimension, operator and value"}), 400
+    limit = data.get("limit")
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool)):
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    try:
+        result = warehouse_service.query_metrics(
+            user_id=user_id,
+            warehouse_id=warehouse_id,
+            metrics=metrics,
+            dimensions=data.get("dimensions"),
+            time_grain=data.get("time_grain"),
+            start=data.get("start"),
+            end=data.get("end"),
+            filters=filters,
+            order_by=data.get("order_by"),
+            descending=bool(data.get("descending", True)),
+            limit=limit,
+            source="metrics_api"
+        )
+        return jsonify(result), 200
+    except ResourcesBusyError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 503
+    except QueryError as e:
+        return jsonify({"error": str(e), "error_type": type(e).__name__}), 422
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
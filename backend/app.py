@@ -5,6 +5,7 @@ This module:
 - Registers blueprints
 - Configures middleware
 - Sets up error handlers
+- Preloads DuckDB extensions and warms up DuckDB
 """
 
 from flask import Flask, jsonify
@@ -17,8 +18,11 @@ from api.routes.datasets import datasets_bp
 from api.routes.chats import chats_bp
 from api.routes.tools import tools_bp
 from api.routes.exports import exports_bp
+from api.routes.admin import admin_bp
+from api.routes.results import results_bp
 from core.security import Security
 from core.config import settings
+from services.duckdb_extensions import warm_up
 
 # Load environment variables
 load_dotenv()
@@ -50,6 +54,11 @@ def create_app():
     app.register_blueprint(chats_bp)
     app.register_blueprint(tools_bp)
     app.register_blueprint(exports_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(results_bp)
+    
+    # Load DuckDB extensions now rather than inside the first request that needs them
+    warm_up()
     
     # Health check endpoint
     @app.route("/api/health")
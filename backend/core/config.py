@@ -9,6 +9,7 @@ This module handles:
 """
 
 import os
+import tempfile
 from typing import Optional, List
 from pydantic import Field, field_validator, ConfigDict
 from pydantic_settings import BaseSettings
@@ -46,6 +47,69 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT: str = "200 per day"
     
+    # DuckDB Query Limits
+    DUCKDB_QUERY_TIMEOUT_SECONDS: float = 30.0
+    DUCKDB_MEMORY_LIMIT: str = "1GB"
+    DUCKDB_THREADS: int = 2
+    DUCKDB_TEMP_DIRECTORY: str = os.path.join(tempfile.gettempdir(), "duckdb_spill")
+    
+    # DuckDB Resource Governor (totals shared by all open connections)
+    DUCKDB_MAX_TOTAL_THREADS: int = os.cpu_count() or 4
+    DUCKDB_MAX_TOTAL_MEMORY: str = "4GB"
+    DUCKDB_MIN_MEMORY_LIMIT: str = "256MB"
+    DUCKDB_MAX_TEMP_DIRECTORY_SIZE: Optional[str] = None
+    DUCKDB_RESOURCE_WAIT_SECONDS: float = 30.0
+    
+    # Query Workers ("inline" runs queries in the request thread, "process" in a pool of worker processes)
+    QUERY_EXECUTOR: str = "inline"
+    QUERY_WORKER_PROCESSES: int = 4
+    QUERY_WORKER_MAX_TASKS: int = 200
+    QUERY_WORKER_MEMORY_LIMIT: Optional[str] = "4GB"
+    QUERY_WORKER_MAX_ISOLATED_RETRIES: int = 2
+
+    # Local copies of the Parquet files of hive-partitioned datasets
+    PARTITION_CACHE_DIRECTORY: str = os.path.join(tempfile.gettempdir(), "duckdb_partitions")
+    
+    # DuckDB Extensions (installed and loaded at startup, never during a request)
+    DUCKDB_EXTENSIONS: List[str] = ["json", "parquet", "icu", "excel", "fts"]
+    DUCKDB_EXTENSION_DIRECTORY: Optional[str] = None
+    DUCKDB_EXTENSION_REPOSITORY: Optional[str] = None
+    
+    # Query Profiling
+    SLOW_QUERY_THRESHOLD_SECONDS: float = 1.0
+    SLOW_QUERY_LOG_SIZE: int = 1000
+    
+    # Admin (emails of the users allowed to use the admin endpoints)
+    ADMIN_EMAILS: List[str] = []
+    
+    # Background Ingest Jobs
+    INGEST_WORKERS: int = 2
+    INGEST_MAX_PENDING_JOBS: int = 20
+    INGEST_JOB_HISTORY_SIZE: int = 500
+    
+    # Query Results (large results are written to Parquet and fetched through a handle)
+    RESULT_DIRECTORY: str = os.path.join(tempfile.gettempdir(), "duckdb_results")
+    RESULT_SPILL_ROWS: int = 10000
+    RESULT_PAGE_ROWS: int = 1000
+    RESULT_TTL_SECONDS: int = 3600
+    RESULT_MAX_HANDLES: int = 200
+    
+    # Approximate Queries
+    SAMPLE_TABLE_ROWS: int = 100000
+    
+    # Dataset Previews (sampled on request and cached per dataset version)
+    PREVIEW_ROWS: int = 10
+    PREVIEW_MAX_ROWS: int = 100
+    PREVIEW_CACHE_SIZE: int = 256
+    
+    # Semantic Metrics (metric query results are cached per dataset version)
+    METRIC_MAX_ROWS: int = 1000
+    METRIC_CACHE_SIZE: int = 256
+    
+    # Dictionary Encoding (text columns stored as ENUMs)
+    ENUM_MAX_DISTINCT_RATIO: float = 0.1
+    ENUM_MAX_VALUES: int = 10000
+    
     @field_validator("SKIP_EMAIL_CONFIRMATION", mode="before")
     def set_skip_email_confirmation(cls, v, info):
         return v if v is not None else info.data.get("FLASK_ENV") == "development"
@@ -57,6 +121,18 @@ class Settings(BaseSettings):
             raise ValueError(f"FLASK_ENV must be one of {allowed_envs}")
         return v
     
+    @field_validator("QUERY_EXECUTOR")
+    def validate_query_executor(cls, v):
+        if v not in ("inline", "process"):
+            raise ValueError("QUERY_EXECUTOR must be one of ['inline', 'process']")
+        return v
+    
+    @field_validator("QUERY_WORKER_MAX_ISOLATED_RETRIES")
+    def validate_query_worker_max_isolated_retries(cls, v):
+        if v < 1:
+            raise ValueError("QUERY_WORKER_MAX_ISOLATED_RETRIES must be at least 1")
+        return v
+    
     @field_validator("CORS_ORIGINS")
     def parse_cors_origins(cls, v):
         return [origin.strip() for origin in v.split(",")] if isinstance(v, str) else v
@@ -65,6 +141,14 @@ class Settings(BaseSettings):
     def parse_pre_authorized_emails(cls, v):
         return [email.strip() for email in v.split(",")] if isinstance(v, str) else v
     
+    @field_validator("DUCKDB_EXTENSIONS")
+    def parse_duckdb_extensions(cls, v):
+        return [extension.strip() for extension in v.split(",") if extension.strip()] if isinstance(v, str) else v
+    
+    @field_validator("ADMIN_EMAILS")
+    def parse_admin_emails(cls, v):
+        return [email.strip() for email in v.split(",")] if isinstance(v, str) else v
+    
     @field_validator("BASE_URL")
     def validate_base_url(cls, v):
         if not v.startswith(("http://", "https://")):
@@ -37,6 +37,27 @@ class Security:
                 abort(401, str(e))
         return decorated
 
+    @staticmethod
+    def require_admin(f):
+        """Decorator to require an authenticated user listed in ADMIN_EMAILS."""
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            auth_header = request.headers.get("Authorization")
+            if not auth_header or not auth_header.startswith("Bearer "):
+                abort(401, "Missing or invalid authorization header")
+            
+            token = auth_header.split(" ")[1]
+            try:
+                result = supabase.auth.get_user(token)
+            except Exception as e:
+                abort(401, str(e))
+            if not result.user:
+                abort(401, "Invalid token")
+            if result.user.email not in settings.ADMIN_EMAILS:
+                abort(403, "Admin access required")
+            return f(*args, **kwargs)
+        return decorated
+
     @staticmethod
     def get_user_id_from_token(token: str) -> str:
         """Get user ID from JWT token."""
@@ -10,22 +10,46 @@ This module handles:
 - Data transformation and processing
 """
 
+from collections import OrderedDict
+from contextlib import contextmanager
 from typing import Dict, Optional, List, Any
 from datetime import datetime, UTC
+from threading import Lock
 from supabase import create_client, Client
+import os
+import shutil
 import uuid
 import logging
+from core.config import settings
 from .utils.validation import (
     validate_user_id,
     validate_warehouse_id,
     validate_name,
+    validate_csv_options,
+    validate_json_options,
+    validate_partitioning,
     STORAGE_PATH
 )
+from .utils.file_formats import TEXT_FORMATS
 from .file_handler import FileHandler
 from .duckdb_handler import DuckDBHandler
+from .ingest_jobs import IngestJob
+from .warehouse_locks import warehouse_locks
 
 logger = logging.getLogger(__name__)
 
+# Dataset record fields returned by reads; the legacy stored preview_data is left out
+# so listings stay small, previews are sampled on request instead
+DATASET_COLUMNS = (
+    "id, user_id, warehouse_id, name, type, description, size, columns, tags, statistics, sort_key, "
+    "primary_key, indexes, text_search, rollups, csv_options, json_options, child_tables, partitioning, "
+    "is_deleted, created_at, updated_at"
+)
+
+# Previews by (dataset id, updated_at, method, rows, stratify_by); a new updated_at is a new version
+_preview_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+_preview_lock = Lock()
+
 class DatasetService:
     def __init__(self, supabase: Client):
         self.supabase = supabase
@@ -34,11 +58,36 @@ class DatasetService:
         self.duckdb_handler = DuckDBHandler()
 
 
+    def _partition_locations(self, warehouse_id: str, dataset_id: str) -> tuple:
+        """Storage folder and local cache directory of a partitioned dataset's Parquet files."""
+        return (
+            f"{self.storage_path}/{warehouse_id}/partitions/{dataset_id}",
+            os.path.join(settings.PARTITION_CACHE_DIRECTORY, warehouse_id, dataset_id)
+        )
+
+    def _upload_partition_files(self, storage_prefix: str, local_dir: str, relative_paths: List[str]) -> None:
+        for relative_path in relative_paths:
+            self.file_handler.upload_file(os.path.join(local_dir, relative_path), f"{storage_prefix}/{relative_path}")
+
+    def sync_partitions(self, user_id: str, warehouse_id: str, bucket_name: str) -> None:
+        """Bring the local copies of a warehouse's partitioned datasets up to date.
+
+        The views of partitioned datasets read Parquet files from the local partition
+        cache; only files added since the last sync are downloaded.
+        """
+        partitioned = [dataset for dataset in self.get_user_datasets(user_id, warehouse_id=warehouse_id) if dataset.get("partitioning")]
+        if not partitioned:
+            return
+        self.file_handler.set_bucket(bucket_name)
+        for dataset in partitioned:
+            storage_prefix, local_dir = self._partition_locations(warehouse_id, dataset["id"])
+            self.file_handler.sync_directory(storage_prefix, local_dir)
+
     def get_user_datasets(self, user_id: str, warehouse_id: Optional[str] = None) -> List[Dict]:
         validate_user_id(user_id)
         
         query = self.supabase.table("user_datasets") \
-            .select("*") \
+            .select(DATASET_COLUMNS) \
             .eq("user_id", user_id) \
             .eq("is_deleted", False)
 
@@ -60,7 +109,7 @@ class DatasetService:
             raise ValueError("Dataset ID is required")
 
         response = self.supabase.table("user_datasets") \
-            .select("*") \
+            .select(DATASET_COLUMNS) \
             .eq("id", dataset_id) \
             .eq("user_id", user_id) \
             .eq("is_deleted", False) \
@@ -72,15 +121,30 @@ class DatasetService:
 
         return response.data
 
-    def create_dataset(self, user_id: str, warehouse_id: str, name: str, file_data: bytes, file_type: str, description: Optional[str] = None, tags: Optional[List[str]] = None) -> Dict:
-        validate_user_id(user_id)
-        validate_warehouse_id(warehouse_id)
-        validate_name(name, "dataset")
+    @contextmanager
+    def _writing_dataset(self, user_id: str, dataset_id: str):
+        """Hold the write lock of a dataset's warehouse and yield the dataset's record.
+
+        The record is read again once the lock is held, so it includes the changes of
+        the writer that held it before.
+        """
+        dataset = self.get_dataset(user_id, dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset with ID {dataset_id} not found or does not belong to user {user_id}")
+
+        with warehouse_locks.hold(dataset["warehouse_id"]):
+            dataset = self.get_dataset(user_id, dataset_id)
+            if not dataset:
+                raise ValueError(f"Dataset with ID {dataset_id} not found or does not belong to user {user_id}")
+            yield dataset
 
+    def _warehouse_storage_path(self, user_id: str, warehouse_id: str) -> str:
+        """Look up where a user's warehouse file is stored and select its bucket."""
         warehouse_response = self.supabase.table("user_warehouses") \
             .select("id, storage_path, bucket") \
             .eq("id", warehouse_id) \
             .eq("user_id", user_id) \
+            .eq("is_deleted", False) \
             .maybe_single() \
             .execute()
 
@@ -97,6 +161,116 @@ class DatasetService:
             raise ValueError(f"Warehouse with ID {warehouse_id} has no bucket configured")
 
         self.file_handler.set_bucket(bucket_name)
+        return warehouse_db_path
+
+    @contextmanager
+    def _warehouse_copy(self, warehouse_db_path: str, upload: bool = True):
+        """Download a warehouse file and yield the path of the local copy, removed afterwards.
+
+        With `upload`, the copy replaces the stored file once the block finishes without an
+        error; writers hold the warehouse's lock around it, see warehouse_locks.
+        """
+        local_warehouse_path = None
+        try:
+            local_warehouse_path = self.file_handler.create_empty_temp_file(".duckdb")
+            logger.info(f"Downloading warehouse file from {warehouse_db_path}")
+            self.file_handler.download_file(warehouse_db_path, local_warehouse_path)
+
+            yield local_warehouse_path
+
+            if upload:
+                logger.info(f"Uploading updated warehouse file to {warehouse_db_path}")
+                self.file_handler.upload_file(local_warehouse_path, warehouse_db_path)
+        finally:
+            self.file_handler.cleanup(local_warehouse_path)
+
+    def _update_dataset_record(self, dataset_id: str, update_data: Dict[str, Any]) -> None:
+        update_response = self.supabase.table("user_datasets") \
+            .update(update_data) \
+            .eq("id", dataset_id) \
+            .execute()
+
+        if not update_response.data or len(update_response.data) == 0:
+            raise ValueError(f"Failed to update metadata for dataset {dataset_id}")
+
+    def get_dataset_preview(self, user_id: str, dataset_id: str, rows: Optional[int] = None, method: str = "random", stratify_by: Optional[str] = None) -> Dict:
+        """Sample preview rows of a dataset.
+
+        Previews are drawn from the warehouse on request (`first`, `random` or `stratified`
+        by a column) and cached until the dataset is next updated.
+        """
+        rows = settings.PREVIEW_ROWS if rows is None else rows
+        if rows <= 0 or rows > settings.PREVIEW_MAX_ROWS:
+            raise ValueError(f"Preview rows must be between 1 and {settings.PREVIEW_MAX_ROWS}")
+        if method not in DuckDBHandler.PREVIEW_METHODS:
+            raise ValueError(f"Invalid preview method. Must be one of: {', '.join(DuckDBHandler.PREVIEW_METHODS)}")
+        if method != "stratified":
+            stratify_by = None
+
+        dataset = self.get_dataset(user_id, dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset with ID {dataset_id} not found or does not belong to user {user_id}")
+
+        preview = {
+            "dataset_id": dataset_id,
+            "method": method,
+            "stratify_by": stratify_by,
+            "version": dataset.get("updated_at")
+        }
+        cache_key = (dataset_id, dataset.get("updated_at"), method, rows, stratify_by)
+        with _preview_lock:
+            if cache_key in _preview_cache:
+                _preview_cache.move_to_end(cache_key)
+                return {**preview, "data": _preview_cache[cache_key], "cached": True}
+
+        warehouse_id = dataset.get("warehouse_id")
+        warehouse_db_path = self._warehouse_storage_path(user_id, warehouse_id)
+
+        try:
+            with self._warehouse_copy(warehouse_db_path, upload=False) as local_warehouse_path:
+                if dataset.get("partitioning"):
+                    self.file_handler.sync_directory(*self._partition_locations(warehouse_id, dataset_id))
+
+                data = self.duckdb_handler.preview_table(local_warehouse_path, dataset["name"], rows, method=method, stratify_by=stratify_by)
+
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Failed to preview dataset {dataset_id}: {e}") from e
+
+        with _preview_lock:
+            _preview_cache[cache_key] = data
+            while len(_preview_cache) > settings.PREVIEW_CACHE_SIZE:
+                _preview_cache.popitem(last=False)
+        return {**preview, "data": data, "cached": False}
+
+    def create_dataset(self, user_id: str, warehouse_id: str, name: str, file_data: bytes, file_type: str, description: Optional[str] = None, tags: Optional[List[str]] = None, sort_key: Optional[List[str]] = None, job: Optional[IngestJob] = None, csv_options: Optional[Dict[str, Any]] = None, json_options: Optional[Dict[str, Any]] = None, partitioning: Optional[Dict[str, Any]] = None, indexes: Optional[List[str]] = None, text_search: Optional[Dict[str, Any]] = None) -> Dict:
+        """Create a dataset from a file, loading it into the warehouse.
+
+        When run as a background ingest `job`, progress is reported on it and a
+        cancellation stops the ingest before the warehouse is uploaded. `csv_options`
+        type a CSV's columns and can quarantine rows that fail to parse; `json_options`
+        flatten nested JSON. Both are kept to load later updates the same way.
+        With `partitioning`, the data is stored as hive-partitioned Parquet files next to
+        the warehouse, which only holds a view over them. `indexes` lists the columns to
+        build point-lookup indexes on, and `text_search` the columns of a full-text
+        search index.
+        """
+        validate_user_id(user_id)
+        validate_warehouse_id(warehouse_id)
+        validate_name(name, "dataset")
+        if csv_options:
+            validate_csv_options(csv_options)
+        if json_options:
+            validate_json_options(json_options)
+        if partitioning:
+            validate_partitioning(partitioning)
+            if sort_key or indexes or text_search:
+                raise ValueError("A partitioned dataset cannot have a sort key, indexes or a text search index")
+            if json_options and json_options.get("split_arrays"):
+                raise ValueError("A partitioned dataset cannot split arrays into child tables")
+
+        warehouse_db_path = self._warehouse_storage_path(user_id, warehouse_id)
 
         dataset_id = str(uuid.uuid4())
         file_size = len(file_data)
@@ -112,7 +286,15 @@ class DatasetService:
             "size": str(file_size),
             "columns": [],
             "tags": tags or [],
-            "preview_data": [],
+            "statistics": {},
+            "sort_key": [],
+            "indexes": [],
+            "text_search": None,
+            "rollups": [],
+            "csv_options": csv_options or {},
+            "json_options": json_options or {},
+            "child_tables": [],
+            "partitioning": None,
             "created_at": now_iso,
             "updated_at": now_iso
         }
@@ -121,198 +303,325 @@ class DatasetService:
         if not insert_response.data or len(insert_response.data) == 0:
             raise ValueError("Failed to create initial dataset record")
 
-        local_warehouse_path = self.file_handler.create_empty_temp_file(".duckdb")
-        self.file_handler.download_file(warehouse_db_path, local_warehouse_path)
-
-        try:
-            local_upload_path = self.file_handler.create_temp_file(file_data, file_type)
-
-            columns, preview_data = self.duckdb_handler.process_data(
-                local_warehouse_path,
-                local_upload_path,
-                name,
-                file_type
-            )
-
-            self.file_handler.upload_file(local_warehouse_path, warehouse_db_path)
-
-            update_data = {
-                "columns": columns,
-                "preview_data": preview_data,
-                "updated_at": datetime.now(UTC).isoformat()
-            }
-            update_response = self.supabase.table("user_datasets") \
-                .update(update_data) \
-                .eq("id", dataset_id) \
-                .execute()
-
-            if not update_response.data or len(update_response.data) == 0:
-                logger.warning(f"Failed to update metadata for dataset {dataset_id} after successful DuckDB processing.")
-                return initial_dataset_data
-
-            return {**initial_dataset_data, **update_data}
+        local_upload_path = None
+        storage_prefix, partition_dir = self._partition_locations(warehouse_id, dataset_id)
 
-        except Exception as e:
+        # Writers of the same warehouse take turns, see warehouse_locks
+        with warehouse_locks.hold(warehouse_id):
             try:
-                self.supabase.table("user_datasets").delete().eq("id", dataset_id).execute()
-            except Exception as del_e:
-                logger.error(f"Failed to delete metadata record for {dataset_id} during error handling: {del_e}")
-            raise ValueError(f"Failed to process and store dataset file in warehouse: {e}") from e
-
-        finally:
-            self.file_handler.cleanup(local_warehouse_path, local_upload_path)
+                if job:
+                    job.set_phase("downloading_warehouse")
+                with self._warehouse_copy(warehouse_db_path) as local_warehouse_path:
+                    local_upload_path = self.file_handler.create_temp_file(file_data, file_type)
+
+                    if partitioning:
+                        processed = self.duckdb_handler.write_partitions(
+                            local_warehouse_path,
+                            local_upload_path,
+                            name,
+                            file_type,
+                            partition_dir,
+                            partitioning,
+                            job=job,
+                            csv_options=csv_options,
+                            json_options=json_options
+                        )
+                        processed["child_tables"] = []
+                    else:
+                        processed = self.duckdb_handler.process_data(
+                            local_warehouse_path,
+                            local_upload_path,
+                            name,
+                            file_type,
+                            sort_key=sort_key,
+                            job=job,
+                            csv_options=csv_options,
+                            json_options=json_options,
+                            indexes=indexes,
+                            text_search=text_search
+                        )
+
+                    # Last point where a cancellation leaves the warehouse untouched
+                    if job:
+                        job.set_phase("uploading_warehouse")
+                    if partitioning:
+                        # Upload the data before the view that reads it
+                        self._upload_partition_files(storage_prefix, partition_dir, processed["written_files"])
+                if job:
+                    job.set_phase("updating_metadata", cancellable=False)
+
+                update_data = {
+                    "columns": processed["columns"],
+                    "statistics": processed["statistics"],
+                    "sort_key": processed["sort_key"],
+                    "indexes": processed.get("indexes", []),
+                    "text_search": processed.get("text_search"),
+                    "child_tables": processed["child_tables"],
+                    "partitioning": processed.get("partitioning"),
+                    "updated_at": datetime.now(UTC).isoformat()
+                }
+                update_response = self.supabase.table("user_datasets") \
+                    .update(update_data) \
+                    .eq("id", dataset_id) \
+                    .execute()
+
+                if not update_response.data or len(update_response.data) == 0:
+                    logger.warning(f"Failed to update metadata for dataset {dataset_id} after successful DuckDB processing.")
+                    return initial_dataset_data
+
+                result = {**initial_dataset_data, **update_data}
+                if csv_options and csv_options.get("rejects"):
+                    result["rejected_rows"] = processed["rejected_rows"]
+                    if processed["rejected_rows"]:
+                        result["rejects_table"] = f"{DuckDBHandler.REJECTS_TABLE_PREFIX}{name}"
+                return result
+
+            except Exception as e:
+                try:
+                    self.supabase.table("user_datasets").delete().eq("id", dataset_id).execute()
+                except Exception as del_e:
+                    logger.error(f"Failed to delete metadata record for {dataset_id} during error handling: {del_e}")
+                if partitioning:
+                    shutil.rmtree(partition_dir, ignore_errors=True)
+                raise ValueError(f"Failed to process and store dataset file in warehouse: {e}") from e
+
+            finally:
+                self.file_handler.cleanup(local_upload_path)
         
-    def update_dataset(self, user_id: str, dataset_id: str, file_data: bytes, file_type: str) -> Dict:
+    def update_dataset(self, user_id: str, dataset_id: str, file_data: bytes, file_type: str, mode: str = "replace", key: Optional[List[str]] = None, csv_options: Optional[Dict[str, Any]] = None) -> Dict:
+        """Update a dataset from a file.
+
+        `replace` rebuilds the table; `append` and `upsert` merge the file's rows into it,
+        upsert matching rows on `key` (or the key stored from a previous upsert).
+        A CSV is read with `csv_options`, or else the options the dataset was loaded with,
+        so its columns get the same types; given options are stored for later updates.
+        """
         validate_user_id(user_id)
 
-        dataset_response = self.supabase.table("user_datasets") \
-            .select("*") \
-            .eq("id", dataset_id) \
-            .eq("user_id", user_id) \
-            .eq("is_deleted", False) \
-            .maybe_single() \
-            .execute()
-        
-        if not dataset_response.data:
-            raise ValueError(f"Dataset with ID {dataset_id} not found or does not belong to user {user_id}")
+        if mode not in ("replace", "append", "upsert"):
+            raise ValueError("Invalid update mode. Must be one of: replace, append, upsert")
+        if csv_options:
+            validate_csv_options(csv_options)
 
-        dataset_data = dataset_response.data
-        warehouse_id = dataset_data.get("warehouse_id")
-        name = dataset_data.get("name")
+        with self._writing_dataset(user_id, dataset_id) as dataset_data:
+            warehouse_id = dataset_data.get("warehouse_id")
+            name = dataset_data.get("name")
 
-        warehouse_response = self.supabase.table("user_warehouses") \
-            .select("id, storage_path, bucket") \
-            .eq("id", warehouse_id) \
-            .eq("user_id", user_id) \
-            .eq("is_deleted", False) \
-            .maybe_single() \
-            .execute()
-        
-        if not warehouse_response.data:
-            raise ValueError(f"Warehouse with ID {warehouse_id} not found or does not belong to user {user_id}")
+            primary_key = key or dataset_data.get("primary_key") or []
+            if mode == "upsert" and not primary_key:
+                raise ValueError("A key is required for mode=upsert")
+            partitioning = dataset_data.get("partitioning")
+            if partitioning and mode == "upsert":
+                raise ValueError("Partitioned datasets can only be replaced or appended to")
+            stored_csv_options = dataset_data.get("csv_options") or {}
+            if not csv_options and TEXT_FORMATS.get(file_type.split(".")[0]) == "csv":
+                csv_options = stored_csv_options
 
-        warehouse_data = warehouse_response.data
-        warehouse_db_path = warehouse_data.get("storage_path")
-        bucket_name = warehouse_data.get("bucket")
-
-        if not warehouse_db_path:
-            raise ValueError(f"Warehouse with ID {warehouse_id} has no path configured")
-        if not bucket_name:
-            raise ValueError(f"Warehouse with ID {warehouse_id} has no bucket configured")
-
-        self.file_handler.set_bucket(bucket_name)
-
-        file_size = len(file_data)
-        now_iso = datetime.now(UTC).isoformat()
+            warehouse_db_path = self._warehouse_storage_path(user_id, warehouse_id)
 
-        local_warehouse_path = None
-        local_upload_path = None
+            file_size = len(file_data)
+            now_iso = datetime.now(UTC).isoformat()
 
-        try:
-            local_warehouse_path = self.file_handler.create_empty_temp_file(".duckdb")
-            local_upload_path = self.file_handler.create_temp_file(file_data, file_type)
+            local_upload_path = None
 
-            logger.info(f"Downloading warehouse file from {warehouse_db_path}")
-            self.file_handler.download_file(warehouse_db_path, local_warehouse_path)
+            try:
+                with self._warehouse_copy(warehouse_db_path) as local_warehouse_path:
+                    local_upload_path = self.file_handler.create_temp_file(file_data, file_type)
+
+                    logger.info(f"Processing dataset with DuckDB at {local_warehouse_path}")
+
+                    if partitioning:
+                        storage_prefix, partition_dir = self._partition_locations(warehouse_id, dataset_id)
+                        if mode == "append":
+                            # New files are written next to the existing ones
+                            self.file_handler.sync_directory(storage_prefix, partition_dir)
+                            previous_files = []
+                        else:
+                            previous_files = self.file_handler.list_files(storage_prefix)
+                        processed = self.duckdb_handler.write_partitions(
+                            local_warehouse_path,
+                            local_upload_path,
+                            name,
+                            file_type,
+                            partition_dir,
+                            partitioning,
+                            append=mode == "append",
+                            previous_statistics=dataset_data.get("statistics"),
+                            csv_options=csv_options or None,
+                            json_options=dataset_data.get("json_options")
+                        )
+                        # Appends only add files; a replace rewrote the directory
+                        self._upload_partition_files(storage_prefix, partition_dir, processed["written_files"])
+                        self.file_handler.remove_files(previous_files)
+                        if mode == "append":
+                            file_size += int(dataset_data.get("size") or 0)
+                            processed["rows_deleted"] = 0
+                    # Keep the clustering chosen when the dataset was created
+                    elif mode == "replace":
+                        processed = self.duckdb_handler.process_data(
+                            local_warehouse_path,
+                            local_upload_path,
+                            name,
+                            file_type,
+                            sort_key=dataset_data.get("sort_key"),
+                            csv_options=csv_options or None,
+                            json_options=dataset_data.get("json_options"),
+                            indexes=dataset_data.get("indexes")
+                        )
+                    else:
+                        processed = self.duckdb_handler.merge_data(
+                            local_warehouse_path,
+                            local_upload_path,
+                            name,
+                            file_type,
+                            mode,
+                            key=primary_key,
+                            sort_key=dataset_data.get("sort_key"),
+                            previous_statistics=dataset_data.get("statistics"),
+                            csv_options=csv_options or None,
+                            json_options=dataset_data.get("json_options"),
+                            indexes=dataset_data.get("indexes")
+                        )
+                        # The stored size tracks all data loaded into the table
+                        file_size += int(dataset_data.get("size") or 0)
+
+                update_data = {
+                    "columns": processed["columns"],
+                    "statistics": processed["statistics"],
+                    "sort_key": processed["sort_key"],
+                    "indexes": processed.get("indexes", []),
+                    "text_search": processed.get("text_search"),
+                    "primary_key": primary_key,
+                    "rollups": processed["rollups"],
+                    "child_tables": processed.get("child_tables", dataset_data.get("child_tables") or []),
+                    "csv_options": csv_options or stored_csv_options,
+                    "size": str(file_size),
+                    "type": file_type,
+                    "updated_at": now_iso
+                }
+                self._update_dataset_record(dataset_id, update_data)
+
+                changes = {"rows_inserted": processed["rows_inserted"], "rows_deleted": processed["rows_deleted"]} if mode != "replace" else {}
+                if csv_options and csv_options.get("rejects"):
+                    changes["rejected_rows"] = processed["rejected_rows"]
+                    if processed["rejected_rows"]:
+                        changes["rejects_table"] = f"{DuckDBHandler.REJECTS_TABLE_PREFIX}{name}"
+                return {**dataset_data, **update_data, **changes}
+
+            except Exception as e:
+                raise ValueError(f"Failed to process and update dataset file in warehouse: {e}") from e
+
+            finally:
+                self.file_handler.cleanup(local_upload_path)
+
+    def update_rollups(self, user_id: str, dataset_id: str, rollups: List[Dict[str, Any]]) -> Dict:
+        """Replace a dataset's rollups and materialize them in its warehouse.
+
+        Matching aggregate queries on the dataset are answered from the rollups, which are
+        kept up to date on every update of the dataset.
+        """
+        validate_user_id(user_id)
 
-            logger.info(f"Processing dataset with DuckDB at {local_warehouse_path}")
+        with self._writing_dataset(user_id, dataset_id) as dataset_data:
+            warehouse_db_path = self._warehouse_storage_path(user_id, dataset_data.get("warehouse_id"))
 
-            columns, preview_data = self.duckdb_handler.process_data(
-                local_warehouse_path,
-                local_upload_path,
-                name,
-                file_type
-            )
+            try:
+                with self._warehouse_copy(warehouse_db_path) as local_warehouse_path:
+                    materialized = self.duckdb_handler.define_rollups(local_warehouse_path, dataset_data.get("name"), rollups)
+
+                update_data = {
+                    "rollups": materialized,
+                    "updated_at": datetime.now(UTC).isoformat()
+                }
+                self._update_dataset_record(dataset_id, update_data)
+                return {**dataset_data, **update_data}
+
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Failed to build rollups for dataset {dataset_id}: {e}") from e
+
+    def update_indexes(self, user_id: str, dataset_id: str, indexes: List[str]) -> Dict:
+        """Replace the columns of a dataset that carry point-lookup indexes.
+
+        The indexes are rebuilt whenever the dataset is replaced or appended to.
+        """
+        validate_user_id(user_id)
 
-            logger.info(f"Uploading updated warehouse file to {warehouse_db_path}")
-            self.file_handler.upload_file(local_warehouse_path, warehouse_db_path)
+        with self._writing_dataset(user_id, dataset_id) as dataset_data:
+            if dataset_data.get("partitioning"):
+                raise ValueError("Partitioned datasets cannot be indexed; filter on their partition column instead")
+            warehouse_db_path = self._warehouse_storage_path(user_id, dataset_data.get("warehouse_id"))
 
-            update_data = {
-                "columns": columns,
-                "preview_data": preview_data,
-                "size": str(file_size),
-                "type": file_type,
-                "updated_at": now_iso
-            }
-            update_response = self.supabase.table("user_datasets") \
-                .update(update_data) \
-                .eq("id", dataset_id) \
-                .execute()
+            try:
+                with self._warehouse_copy(warehouse_db_path) as local_warehouse_path:
+                    built = self.duckdb_handler.define_indexes(local_warehouse_path, dataset_data.get("name"), indexes)
+
+                update_data = {
+                    "indexes": built,
+                    "updated_at": datetime.now(UTC).isoformat()
+                }
+                self._update_dataset_record(dataset_id, update_data)
+                return {**dataset_data, **update_data}
+
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Failed to build indexes for dataset {dataset_id}: {e}") from e
+
+    def update_text_search(self, user_id: str, dataset_id: str, text_search: Dict[str, Any]) -> Dict:
+        """Replace the full-text search index of a dataset; no columns drops it.
+
+        The index is rebuilt whenever the dataset is replaced or appended to.
+        """
+        validate_user_id(user_id)
 
-            if not update_response.data or len(update_response.data) == 0:
-                raise ValueError(f"Failed to update metadata for dataset {dataset_id}")
+        with self._writing_dataset(user_id, dataset_id) as dataset_data:
+            if dataset_data.get("partitioning"):
+                raise ValueError("Partitioned datasets cannot have a full-text search index")
+            warehouse_db_path = self._warehouse_storage_path(user_id, dataset_data.get("warehouse_id"))
 
-            return {**dataset_data, **update_data}
+            try:
+                with self._warehouse_copy(warehouse_db_path) as local_warehouse_path:
+                    built = self.duckdb_handler.define_text_search(local_warehouse_path, dataset_data.get("name"), text_search)
 
-        except Exception as e:
-            raise ValueError(f"Failed to process and update dataset file in warehouse: {e}") from e
+                update_data = {
+                    "text_search": built,
+                    "updated_at": datetime.now(UTC).isoformat()
+                }
+                self._update_dataset_record(dataset_id, update_data)
+                return {**dataset_data, **update_data}
 
-        finally:
-            self.file_handler.cleanup(local_warehouse_path, local_upload_path)
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Failed to build the text search index for dataset {dataset_id}: {e}") from e
 
     def delete_dataset(self, user_id: str, dataset_id: str) -> None:
         validate_user_id(user_id)
 
-        dataset_response = self.supabase.table("user_datasets") \
-            .select("*") \
-            .eq("id", dataset_id) \
-            .eq("user_id", user_id) \
-            .eq("is_deleted", False) \
-            .maybe_single() \
-            .execute()
-        
-        if not dataset_response.data:
-            raise ValueError(f"Dataset with ID {dataset_id} not found or does not belong to user {user_id}")
-
-        dataset_data = dataset_response.data
-        warehouse_id = dataset_data.get("warehouse_id")
-        name = dataset_data.get("name")
-
-        warehouse_response = self.supabase.table("user_warehouses") \
-            .select("id, storage_path, bucket") \
-            .eq("id", warehouse_id) \
-            .eq("user_id", user_id) \
-            .eq("is_deleted", False) \
-            .maybe_single() \
-            .execute()
-        
-        if not warehouse_response.data:
-            raise ValueError(f"Warehouse with ID {warehouse_id} not found or does not belong to user {user_id}")
-
-        warehouse_data = warehouse_response.data
-        warehouse_db_path = warehouse_data.get("storage_path")
-        bucket_name = warehouse_data.get("bucket")
+        with self._writing_dataset(user_id, dataset_id) as dataset_data:
+            warehouse_id = dataset_data.get("warehouse_id")
+            warehouse_db_path = self._warehouse_storage_path(user_id, warehouse_id)
 
-        if not warehouse_db_path:
-            raise ValueError(f"Warehouse with ID {warehouse_id} has no path configured")
-        if not bucket_name:
-            raise ValueError(f"Warehouse with ID {warehouse_id} has no bucket configured")
-
-        self.file_handler.set_bucket(bucket_name)
-        local_warehouse_path = None
-
-        try:
-            local_warehouse_path = self.file_handler.create_empty_temp_file(".duckdb")
-            logger.info(f"Downloading warehouse file from {warehouse_db_path}")
-            self.file_handler.download_file(warehouse_db_path, local_warehouse_path)
-
-            # Delete the table from the warehouse file
-            self.duckdb_handler.delete_table(local_warehouse_path, name)
-
-            logger.info(f"Uploading updated warehouse file to {warehouse_db_path}")
-            self.file_handler.upload_file(local_warehouse_path, warehouse_db_path)
-
-            # Update the dataset record to mark it as deleted
-            update_response = self.supabase.table("user_datasets") \
-                .update({"is_deleted": True}) \
-                .eq("id", dataset_id) \
-                .execute()
-
-            if not update_response.data:
-                raise ValueError(f"Failed to update dataset metadata for {dataset_id}")
-
-        except Exception as e:
-            raise ValueError(f"Failed to delete dataset from warehouse: {e}") from e
-
-        finally:
-            self.file_handler.cleanup(local_warehouse_path)
\ No newline at end of file
+            try:
+                with self._warehouse_copy(warehouse_db_path) as local_warehouse_path:
+                    # Delete the table from the warehouse file
+                    self.duckdb_handler.delete_table(local_warehouse_path, dataset_data.get("name"))
+
+                if dataset_data.get("partitioning"):
+                    storage_prefix, partition_dir = self._partition_locations(warehouse_id, dataset_id)
+                    self.file_handler.remove_files(self.file_handler.list_files(storage_prefix))
+                    shutil.rmtree(partition_dir, ignore_errors=True)
+
+                # Update the dataset record to mark it as deleted
+                update_response = self.supabase.table("user_datasets") \
+                    .update({"is_deleted": True}) \
+                    .eq("id", dataset_id) \
+                    .execute()
+
+                if not update_response.data:
+                    raise ValueError(f"Failed to update dataset metadata for {dataset_id}")
+
+            except Exception as e:
+                raise ValueError(f"Failed to delete dataset from warehouse: {e}") from e
@@ -4,24 +4,119 @@ table management, and data processing.
 """
 
 import duckdb
-from typing import Tuple, List, Dict, Any, Callable
+from typing import Callable, Tuple, List, Dict, Any, Optional
 import logging
 import contextlib
 from contextlib import contextmanager
+import hashlib
+import json
+import os
 import re
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from core.config import settings
+from .query_log import slow_query_log
+from .query_executor import query_executor
+from .duckdb_extensions import extension_config
+from .resource_governor import resource_governor
+from .result_store import ResultHandle, result_store
+from .utils.file_formats import detect_file_format, extract_archive
+from .utils.metrics import parse_single_expression
+from .utils.query_tree import keep_output_names, parse_query, render_query, select_node
+from .utils.nested_json import ROW_ID_COLUMN, child_table_sql, flatten_structs_sql
+from .utils.rollups import TIME_GRAINS, appended_rollup_sql, rewrite_for_rollup, rollup_select_sql, rollup_templates
+from .utils.sampling import rewrite_for_sample, sample_select_sql, stratified_sample_sql
+from .utils.sql import quote_identifier, sql_literal
+from .utils.type_normalization import deduplicate_names, normalize_relation
+from .utils.validation import validate_database_alias
 
 
 logger = logging.getLogger(__name__)
 
+class QueryError(Exception):
+    """Base error for queries stopped by a resource limit."""
+
+class QueryTimeoutError(QueryError):
+    """Raised when a query runs past its wall-clock deadline and is interrupted."""
+
+class QueryMemoryLimitError(QueryError):
+    """Raised when a query needs more memory than the connection's memory_limit allows."""
+
+class ResourcesBusyError(QueryError):
+    """Raised when no DuckDB thread and memory budget frees up in time to open a connection."""
+
+class QueryWorkerCrashedError(QueryError):
+    """Raised when the worker process running a query dies, e.g. past its memory cap."""
+
+class QueryProfile(dict):
+    """DuckDB's JSON profile of one query, filled in when the profiling block exits."""
+
+    def __init__(self, conn=None):
+        super().__init__()
+        self._conn = conn
+
+    def stop(self) -> None:
+        """Stop profiling, so statements run after the profiled query keep its profile."""
+        if self._conn is not None:
+            self._conn.execute("PRAGMA disable_profiling")
+            self._conn = None
+
 class DuckDBHandler:
+    # Columns with at most this many distinct values get their most frequent values stored
+    TOP_VALUES_MAX_CARDINALITY = 50
+    TOP_VALUES_LIMIT = 10
+
+    # Metrics collected for queries of a shape already in the slow query log
+    QUERY_PROFILING_METRICS = {"LATENCY": "true", "ROWS_RETURNED": "true", "CUMULATIVE_ROWS_SCANNED": "true", "RESULT_SET_SIZE": "true"}
+    PROFILING_MODES = ("json", "explain_analyze")
+    MERGE_MODES = ("append", "upsert")
+    # 128-bit integer types, which Parquet result files cannot store exactly
+    WIDE_INTEGER_TYPES = ("hugeint", "uhugeint")
+    # File order of incoming rows, numbered while deduplicating an upsert
+    POSITION_COLUMN = "__position"
+    PREVIEW_METHODS = ("first", "random", "stratified")
+
+    # Catalog of the rollups materialized in a warehouse, read when routing queries
+    ROLLUP_CATALOG_TABLE = "__rollups"
+
+    # Catalog of the reservoir samples kept for large tables, used by approximate queries
+    SAMPLE_CATALOG_TABLE = "__samples"
+    SAMPLE_SEED = 42
+
+    # CSV ingestion options mapped to the read_csv parameters they set
+    CSV_READER_OPTIONS = {"sample_size": "sample_size", "date_format": "dateformat", "timestamp_format": "timestampformat", "rejects": "store_rejects"}
+    # Rows of a CSV that failed to parse are quarantined in this table next to the dataset
+    REJECTS_TABLE_PREFIX = "__rejects_"
+
+    # Point-lookup (ART) indexes are named after their table and column
+    INDEX_PREFIX = "__index_"
+
+    # Catalog of the full-text search indexes built with the fts extension
+    TEXT_SEARCH_CATALOG_TABLE = "__text_search"
+    # Column holding the BM25 relevance of each row returned by a text search
+    SEARCH_SCORE_COLUMN = "search_score"
+
+    # Time grains a partitioned dataset can be split by, as the format of their partition values
+    PARTITION_GRAINS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+    # Catalog of the child tables split from JSON list columns, linked by ROW_ID_COLUMN
+    CHILD_TABLE_CATALOG_TABLE = "__child_tables"
+
+    # Names of DuckDB's aggregate functions, shared by all handlers and loaded once per process
+    _aggregate_functions: Optional[set] = None
+
     def __init__(self):
         self._active_connections = {}
 
-        # Map file types to their corresponding DuckDB read functions
-        self._file_type_readers: Dict[str, Callable[[str], str]] = {
-            'csv': lambda path: f"read_csv_auto('{path}')",
-            'json': lambda path: f"read_json_auto('{path}')",
-            'parquet': lambda path: f"read_parquet('{path}')"
+        # Map file formats to their corresponding DuckDB read functions and default options
+        self._file_type_readers: Dict[str, Tuple[str, Dict[str, Any]]] = {
+            'csv': ("read_csv_auto", {}),
+            'json': ("read_json_auto", {}),
+            'ndjson': ("read_json_auto", {"format": "newline_delimited"}),
+            'parquet': ("read_parquet", {"union_by_name": True}),
+            'xlsx': ("read_xlsx", {})
         }
 
     @staticmethod
@@ -38,15 +133,76 @@ class DuckDBHandler:
         return name
 
     @staticmethod
-    def _convert_datetime_columns(df):
-        """Convert datetime columns to ISO format strings."""
-        for column in df.select_dtypes(include=['datetime64']).columns:
-            df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
-        return df
+    def _fetch_records(relation) -> List[Dict[str, Any]]:
+        """Fetch a relation as a list of dicts with JSON-safe values."""
+        relation = normalize_relation(relation)
+        columns = relation.columns
+        return [dict(zip(columns, row)) for row in relation.fetchall()]
+
+    @staticmethod
+    def query_cache_key(query: str, params: Optional[Dict[str, Any]] = None, approximate: bool = False, attached_warehouses: Optional[Dict[str, str]] = None) -> str:
+        """Stable key for a parameterized query, independent of parameter order.
+
+        `attached_warehouses` maps the aliases the query references to warehouse ids.
+        """
+        payload = {"query": query.strip().rstrip(';'), "params": params or {}}
+        if approximate:
+            payload["approximate"] = True
+        if attached_warehouses:
+            payload["attached_warehouses"] = attached_warehouses
+        payload = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _to_json_value(value: Any) -> Any:
+        """Keep JSON-native scalars as they are and render anything else as a string."""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        return str(value)
+
+    def _compute_column_statistics(self, conn, quoted_table_name: str) -> Dict[str, Any]:
+        """Compute row count and per-column statistics with a single SUMMARIZE pass,
+        plus one extra scan for the top values of low-cardinality columns."""
+        summary = conn.execute(f"SUMMARIZE {quoted_table_name}").fetchall()
+
+        row_count = summary[0][10] if summary else conn.execute(f"SELECT COUNT(*) FROM {quoted_table_name}").fetchone()[0]
+        column_stats = {}
+        low_cardinality_columns = []
+
+        for column_name, column_type, min_value, max_value, approx_unique, avg, std, q25, q50, q75, count, null_percentage in summary:
+            stats = {
+                "null_fraction": round(float(null_percentage or 0) / 100, 4),
+                "approx_distinct": approx_unique,
+                "min": min_value,
+                "max": max_value
+            }
+            if avg is not None:
+                stats["avg"] = avg
+                stats["std"] = std
+            if q50 is not None:
+                stats["quantiles"] = {"q25": q25, "q50": q50, "q75": q75}
+            column_stats[column_name] = stats
+
+            # Nested values (lists, structs, maps) have no meaningful top values
+            is_nested = column_type.endswith("]") or column_type.startswith(("STRUCT", "MAP", "UNION"))
+            if approx_unique is not None and 0 < approx_unique <= self.TOP_VALUES_MAX_CARDINALITY and not is_nested:
+                low_cardinality_columns.append(column_name)
+
+        if low_cardinality_columns:
+            histograms_clause = ', '.join([f'histogram("{col}")' for col in low_cardinality_columns])
+            histograms = conn.execute(f"SELECT {histograms_clause} FROM {quoted_table_name}").fetchone()
+            for column_name, histogram in zip(low_cardinality_columns, histograms):
+                top_values = sorted((histogram or {}).items(), key=lambda item: item[1], reverse=True)[:self.TOP_VALUES_LIMIT]
+                column_stats[column_name]["top_values"] = [
+                    {"value": self._to_json_value(value), "count": frequency} for value, frequency in top_values
+                ]
+
+        return {"row_count": row_count, "columns": column_stats}
 
     @contextmanager
     def get_connection(self, database_path: str, read_only: bool = True):
         conn = None
+        lease = None
         try:
             # Close any existing connections to the same database
             for existing_conn, path in list(self._active_connections.items()):
@@ -57,12 +213,18 @@ class DuckDBHandler:
                 except Exception as e:
                     logger.warning(f"Error closing existing connection: {e}")
 
-            # Create new connection
-            conn = duckdb.connect(database=database_path, read_only=read_only)
+            # Lease threads and memory from the process-wide budget, waiting if it is exhausted
+            lease = resource_governor.acquire()
+            if not lease:
+                raise ResourcesBusyError("The server is busy running other queries, please try again shortly")
+
+            # Create new connection with the leased memory and threads and the shared spill directory
+            os.makedirs(settings.DUCKDB_TEMP_DIRECTORY, exist_ok=True)
+            conn = duckdb.connect(database=database_path, read_only=read_only, config={**lease.connection_config(), **extension_config()})
             self._active_connections[conn] = database_path
 
             # Add logging when opening a connection
-            logger.info(f"Opening DuckDB connection to {database_path} with read_only={read_only}")
+            logger.info(f"Opening DuckDB connection to {database_path} with read_only={read_only}, threads={lease.threads}, memory_limit={lease.memory_bytes}B")
 
             yield conn
         finally:
@@ -75,6 +237,75 @@ class DuckDBHandler:
                     logger.info(f"Closing DuckDB connection to {database_path}")
                 except Exception as e:
                     logger.warning(f"Error closing connection: {e}")
+            if lease:
+                resource_governor.release(lease)
+
+    @staticmethod
+    def _execute_with_params(conn, query: str, params: Optional[Dict[str, Any]] = None):
+        """Run a query, binding `params` to the `$name` parameters it references.
+
+        Values are bound by DuckDB rather than spliced into the SQL text. Connections
+        only live for one request, so there is no prepared statement worth caching.
+        """
+        for key in params or {}:
+            if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", key):
+                raise ValueError(f"Invalid query parameter name: {key}")
+        return conn.sql(query, params=params or None)
+
+    @contextmanager
+    def _profiling(self, conn, metrics: Optional[Dict[str, str]] = None):
+        """Capture DuckDB's JSON profile of the last query run inside the block.
+
+        The yielded QueryProfile is filled once the block exits; call its `stop()` right
+        after the query to profile when the block runs other statements after it.
+        """
+        os.makedirs(settings.DUCKDB_TEMP_DIRECTORY, exist_ok=True)
+        fd, profile_path = tempfile.mkstemp(suffix=".json", dir=settings.DUCKDB_TEMP_DIRECTORY)
+        os.close(fd)
+        profile = QueryProfile(conn)
+        try:
+            if metrics:
+                conn.execute(f"SET custom_profiling_settings='{json.dumps(metrics)}'")
+            conn.execute("SET enable_profiling='json'")
+            conn.execute(f"SET profiling_output='{profile_path}'")
+            yield profile
+            with open(profile_path) as f:
+                content = f.read()
+            if content:
+                profile.update(json.loads(content))
+        finally:
+            os.remove(profile_path)
+
+    @contextmanager
+    def _query_deadline(self, conn, timeout: Optional[float]):
+        """Interrupt the connection if the wrapped query runs longer than `timeout` seconds
+        and translate resource-limit failures into QueryError subclasses."""
+        timed_out = threading.Event()
+
+        def interrupt():
+            timed_out.set()
+            conn.interrupt()
+
+        timer = threading.Timer(timeout, interrupt) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            yield
+        except duckdb.InterruptException as e:
+            if timed_out.is_set():
+                raise QueryTimeoutError(f"Query too expensive: it exceeded the {timeout:g}s time limit and was cancelled") from e
+            raise
+        except duckdb.OutOfMemoryException as e:
+            # Connections get the memory their lease allows, not always DUCKDB_MEMORY_LIMIT
+            try:
+                memory_limit = conn.execute("SELECT current_setting('memory_limit')").fetchone()[0]
+            except duckdb.Error:
+                memory_limit = "connection's"
+            raise QueryMemoryLimitError(f"Query too expensive: it exceeded the {memory_limit} memory limit ({e})") from e
+        finally:
+            if timer:
+                timer.cancel()
 
     def list_tables(self, database_path: str) -> List[str]:
         with self.get_connection(database_path) as conn:
@@ -82,44 +313,1077 @@ class DuckDBHandler:
             tables = conn.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'main'").fetchall()
             return [table[0] for table in tables]
 
-    def process_data(self, database_path: str, data_path: str, table_name: str, file_type: str) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+    def _read_expression(self, file_format: str, paths: List[str], compression: Optional[str] = None, reader_options: Optional[Dict[str, Any]] = None) -> str:
+        """Build the DuckDB table function call that reads the given files."""
+        reader = self._file_type_readers.get(file_format)
+        if not reader:
+            raise ValueError(f"Unsupported file type: {file_format}")
+
+        function_name, default_options = reader
+        options = dict(default_options)
+        if compression:
+            options["compression"] = compression
+        if len(paths) > 1 and file_format in ("csv", "json", "ndjson"):
+            options["union_by_name"] = True
+        options.update(reader_options or {})
+
+        source = sql_literal(paths[0] if len(paths) == 1 else paths)
+        arguments = ''.join([f", {key} = {sql_literal(value)}" for key, value in options.items()])
+        return f"{function_name}({source}{arguments})"
+
+    def _resolve_sort_key(self, columns: List[Dict[str, str]], sort_key: Optional[List[str]]) -> List[str]:
+        """Validate a requested sort key, or default to the first DATE/TIMESTAMP column."""
+        column_names = [col["name"] for col in columns]
+        if sort_key:
+            standardized_key = [self._standardize_column_name(col) for col in sort_key]
+            missing = [col for col in standardized_key if col not in column_names]
+            if missing:
+                raise ValueError(f"Sort key columns not found in dataset: {', '.join(missing)}")
+            return standardized_key
+
+        for col in columns:
+            if col["type"] == "DATE" or col["type"].startswith("TIMESTAMP"):
+                return [col["name"]]
+        return []
+
+    def _csv_reader_options(self, conn, file_format: str, data_paths: List[str], compression: Optional[str], csv_options: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn CSV ingestion options into read_csv parameters.
+
+        Type hints may name columns as in the file or by their standardized name.
+        """
+        if file_format != "csv":
+            raise ValueError("CSV options can only be used with CSV files")
+
+        reader_options = {
+            parameter: csv_options[option] for option, parameter in self.CSV_READER_OPTIONS.items()
+            if csv_options.get(option) not in (None, False)
+        }
+        column_types = csv_options.get("column_types")
+        if column_types:
+            read_expression = self._read_expression(file_format, data_paths, compression, reader_options)
+            original_columns = [col[0] for col in conn.execute(f"DESCRIBE SELECT * FROM {read_expression}").fetchall()]
+            originals = {}
+            for col in original_columns:
+                originals.setdefault(col, col)
+                originals.setdefault(self._standardize_column_name(col), col)
+
+            missing = [name for name in column_types if name not in originals]
+            if missing:
+                raise ValueError(f"Type hint columns not found in file: {', '.join(missing)}")
+            reader_options["types"] = {originals[name]: column_type.strip() for name, column_type in column_types.items()}
+        return reader_options
+
+    def _source_select(self, stack: contextlib.ExitStack, data_path: str, file_type: str, conn, csv_options: Optional[Dict[str, Any]] = None, json_options: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Dict[str, str]]]:
+        """Build a SELECT over an uploaded file with standardized column names.
+
+        `csv_options` sets type hints, the sniffing sample size, date and timestamp formats
+        and whether bad rows are stored as rejects instead of failing the read.
+        `json_options` with `flatten` expands nested structs into top-level columns.
+        Returns the query and the columns (name and type) it produces.
+        """
+        # Detect the real format from the file's magic bytes; compressed files are
+        # decompressed by DuckDB while it reads them
+        file_format, compression = detect_file_format(data_path, file_type)
+        data_paths = [data_path]
+        if file_format == "zip":
+            archive_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=settings.DUCKDB_TEMP_DIRECTORY))
+            file_format, data_paths = extract_archive(data_path, archive_dir)
+        reader_options = self._csv_reader_options(conn, file_format, data_paths, compression, csv_options) if csv_options else None
+        read_expression = self._read_expression(file_format, data_paths, compression, reader_options)
+
+        # Describe the data to get original column names and types without reading it all
+        described_columns = conn.execute(f"DESCRIBE SELECT * FROM {read_expression}").fetchall()
+        original_columns = [col[0] for col in described_columns]
+        
+        # Create standardized column names
+        standardized_columns = [self._standardize_column_name(col) for col in original_columns]
+        select_clause = ', '.join([f'"{col}" as "{standardized_columns[i]}"' 
+                                 for i, col in enumerate(original_columns)])
+        
+        columns = [{"name": name, "type": col[1]} for name, col in zip(standardized_columns, described_columns)]
+        source_query = f"SELECT {select_clause} FROM {read_expression}"
+
+        if json_options and (json_options.get("flatten") or json_options.get("split_arrays")):
+            if file_format not in ("json", "ndjson"):
+                raise ValueError("JSON options can only be used with JSON files")
+            source_query, _ = flatten_structs_sql(conn, source_query, self._standardize_column_name)
+            columns = [{"name": col[0], "type": col[1]} for col in conn.execute(f"DESCRIBE {source_query}").fetchall()]
+        return source_query, columns
+
+    @staticmethod
+    def _table_columns(conn, quoted_table_name: str) -> List[Dict[str, str]]:
+        """List a table's columns; dictionary-encoded text columns are reported as VARCHAR."""
+        columns = []
+        for col in conn.execute(f"PRAGMA table_info({quoted_table_name})").fetchall():
+            if col[2].startswith("ENUM("):
+                columns.append({"name": col[1], "type": "VARCHAR", "encoding": "enum"})
+            else:
+                columns.append({"name": col[1], "type": col[2]})
+        return columns
+
+    @staticmethod
+    def _enum_type(values: List[str]) -> str:
+        """ENUM type of `values`, kept sorted so ordering matches the text."""
+        return f"ENUM({', '.join([sql_literal(value) for value in sorted(values)])})"
+
+    def _low_cardinality_enum_types(self, conn, quoted_table_name: str, text_columns: List[str]) -> Dict[str, str]:
+        """Pick the VARCHAR columns to store as ENUMs and return their ENUM types.
+
+        A column qualifies when its distinct values are at most ENUM_MAX_DISTINCT_RATIO of
+        the rows and ENUM_MAX_VALUES in number. ENUM values compare, sort and cast like the
+        original text, but are stored and grouped on as small integer codes.
+        """
+        if not text_columns:
+            return {}
+
+        counts_clause = ', '.join([f"approx_count_distinct({quote_identifier(col)})" for col in text_columns])
+        row_count, *distinct_counts = conn.execute(f"SELECT count(*), {counts_clause} FROM {quoted_table_name}").fetchone()
+
+        enum_types = {}
+        for column, distinct_count in zip(text_columns, distinct_counts):
+            if not row_count or distinct_count > settings.ENUM_MAX_VALUES or distinct_count > row_count * settings.ENUM_MAX_DISTINCT_RATIO:
+                continue
+            quoted_column = quote_identifier(column)
+            values = [row[0] for row in conn.execute(f"SELECT DISTINCT {quoted_column} FROM {quoted_table_name} WHERE {quoted_column} IS NOT NULL").fetchall()]
+            # The distinct count was an estimate; re-check against the exact one
+            if not values or len(values) > settings.ENUM_MAX_VALUES:
+                continue
+            enum_types[column] = self._enum_type(values)
+        return enum_types
+
+    def _extended_enum_types(self, conn, quoted_table_name: str, incoming_table: str) -> Dict[str, str]:
+        """Types a table's ENUM columns need to accept the values of rows about to be inserted.
+
+        Only columns that must change are returned; those that would outgrow
+        ENUM_MAX_VALUES are turned back into VARCHAR.
+        """
+        extended = {}
+        for col in self._table_columns(conn, quoted_table_name):
+            if col.get("encoding") != "enum":
+                continue
+            quoted_column = quote_identifier(col["name"])
+            current = conn.execute(f"SELECT enum_range({quoted_column}) FROM {quoted_table_name} LIMIT 1").fetchone()
+            values = set(current[0] if current else [])
+            incoming = {row[0] for row in conn.execute(f"SELECT DISTINCT CAST({quoted_column} AS VARCHAR) FROM {incoming_table} WHERE {quoted_column} IS NOT NULL").fetchall()}
+            if incoming <= values:
+                continue
+            extended[col["name"]] = "VARCHAR" if len(values | incoming) > settings.ENUM_MAX_VALUES else self._enum_type(list(values | incoming))
+        return extended
+
+    def _fetch_child_tables(self, conn, table_name: str) -> List[str]:
+        if not self._table_exists(conn, self.CHILD_TABLE_CATALOG_TABLE):
+            return []
+        rows = conn.execute(f"SELECT child_table FROM {quote_identifier(self.CHILD_TABLE_CATALOG_TABLE)} WHERE table_name = ?", [table_name]).fetchall()
+        return [row[0] for row in rows]
+
+    def _replace_child_tables(self, conn, table_name: str, quoted_parent: Optional[str] = None, list_columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Drop a table's child tables and split `list_columns` of `quoted_parent` into new ones.
+
+        The parent must carry ROW_ID_COLUMN. Returns the new child tables' metadata.
+        """
+        catalog = quote_identifier(self.CHILD_TABLE_CATALOG_TABLE)
+        for child_table in self._fetch_child_tables(conn, table_name):
+            conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(child_table)}")
+        if self._table_exists(conn, self.CHILD_TABLE_CATALOG_TABLE):
+            conn.execute(f"DELETE FROM {catalog} WHERE table_name = ?", [table_name])
+        if not list_columns:
+            return []
+
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {catalog} (table_name VARCHAR, child_table VARCHAR, list_column VARCHAR)")
+        child_tables = []
+        for list_column in list_columns:
+            child_table = f"{table_name}__{list_column}"
+            quoted_child = quote_identifier(child_table)
+            conn.execute(f"CREATE OR REPLACE TABLE {quoted_child} AS {child_table_sql(conn, quoted_parent, list_column, self._standardize_column_name)} ORDER BY ALL")
+            conn.execute(f"INSERT INTO {catalog} VALUES (?, ?, ?)", [table_name, child_table, list_column])
+            child_tables.append({
+                "name": child_table,
+                "list_column": list_column,
+                "foreign_key": ROW_ID_COLUMN,
+                "columns": self._table_columns(conn, quoted_child),
+                "row_count": conn.execute(f"SELECT count(*) FROM {quoted_child}").fetchone()[0]
+            })
+        return child_tables
+
+    def _quarantine_rejects(self, conn, table_name: str, store_rejects: bool) -> int:
+        """Keep the rows the CSV reader rejected in the dataset's rejects table.
+
+        Returns the number of rejected rows; the table is dropped when there are none.
+        """
+        rejects_table = quote_identifier(f"{self.REJECTS_TABLE_PREFIX}{table_name}")
+        conn.execute(f"DROP TABLE IF EXISTS {rejects_table}")
+        if not store_rejects:
+            return 0
+
+        rejected_rows = conn.execute("SELECT count(DISTINCT (scan_id, file_id, line)) FROM reject_errors").fetchone()[0]
+        if rejected_rows:
+            conn.execute(
+                f"CREATE TABLE {rejects_table} AS "
+                "SELECT line, column_name, CAST(error_type AS VARCHAR) AS error_type, error_message, csv_line FROM reject_errors ORDER BY line"
+            )
+            logger.warning(f"Quarantined {rejected_rows} rows of {table_name} that failed to parse")
+        return rejected_rows
+
+    def _resolve_indexes(self, columns: List[Dict[str, str]], indexes: Optional[List[str]]) -> List[str]:
+        """Validate the columns to index for point lookups and standardize their names."""
+        column_types = {col["name"]: col["type"] for col in columns}
+        resolved = []
+        for column in indexes or []:
+            column = self._standardize_column_name(column)
+            if column not in column_types:
+                raise ValueError(f"Index column not found in dataset: {column}")
+            if column_types[column].endswith("]") or column_types[column].startswith(("STRUCT", "MAP", "UNION")):
+                raise ValueError(f"Index column {column} has a nested type and cannot be indexed")
+            if column not in resolved:
+                resolved.append(column)
+        return resolved
+
+    def _index_names(self, conn, table_name: str) -> List[str]:
+        rows = conn.execute("SELECT index_name FROM duckdb_indexes() WHERE schema_name = 'main' AND table_name = ?", [table_name]).fetchall()
+        return [row[0] for row in rows]
+
+    def _index_name(self, table_name: str, column: str) -> str:
+        return f"{self.INDEX_PREFIX}{table_name}_{column}"
+
+    def _drop_indexes(self, conn, table_name: str) -> None:
+        for index_name in self._index_names(conn, table_name):
+            conn.execute(f"DROP INDEX {quote_identifier(index_name)}")
+
+    def _create_indexes(self, conn, table_name: str, indexes: List[str]) -> List[str]:
+        """Build a table's ART indexes, one per column.
+
+        Must run in a transaction of its own: on DuckDB 1.2 an index created in the
+        transaction that changed the table's rows or dropped its previous indexes is
+        built from the wrong data, and lookups through it miss or return stale rows.
+        """
+        for column in indexes:
+            index_name = quote_identifier(self._index_name(table_name, column))
+            conn.execute(f"CREATE INDEX {index_name} ON {quote_identifier(table_name)} ({quote_identifier(column)})")
+        return indexes
+
+    def define_indexes(self, database_path: str, table_name: str, indexes: List[str]) -> List[str]:
+        """Replace a table's point-lookup indexes with one ART index per column of `indexes`.
+
+        Equality filters on an indexed column against a constant (`WHERE id = 'C00042'`)
+        are answered from the index instead of scanning the table.
+        """
         try:
             with self.get_connection(database_path, read_only=False) as conn:
+                if not self._table_exists(conn, table_name):
+                    raise ValueError(f"Table {table_name} not found or is a partitioned dataset, which cannot be indexed")
+                resolved = self._resolve_indexes(self._table_columns(conn, quote_identifier(table_name)), indexes)
+                # The warehouse is only uploaded once both transactions committed
+                conn.execute("BEGIN TRANSACTION")
+                self._drop_indexes(conn, table_name)
+                conn.execute("COMMIT")
+                conn.execute("BEGIN TRANSACTION")
+                self._create_indexes(conn, table_name, resolved)
+                conn.execute("COMMIT")
+                return resolved
+        except Exception as e:
+            logger.error(f"Error building indexes with DuckDB: {e}")
+            raise
+
+    def process_data(self, database_path: str, data_path: str, table_name: str, file_type: str, sort_key: Optional[List[str]] = None, job=None, csv_options: Optional[Dict[str, Any]] = None, json_options: Optional[Dict[str, Any]] = None, indexes: Optional[List[str]] = None, text_search: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Load a file into `table_name` and return its columns, statistics and sort key.
+
+        Rows are written ordered by the sort key so DuckDB's per-row-group min/max
+        zone maps can skip row groups for range filters on it. An ingest `job`, when
+        given, is told about each phase and can interrupt the connection to cancel.
+        `csv_options` control how a CSV is typed; with `rejects` set, rows that fail to
+        parse go to the `__rejects_<table>` table instead of failing the ingest.
+        `json_options` flatten nested JSON; with `split_arrays`, list columns move to
+        `<table>__<column>` child tables keyed by the parent's `_row_id`. `indexes` lists
+        the columns to build point-lookup ART indexes on once the table is loaded, and
+        `text_search` the columns of its full-text search index; without it the table
+        keeps the index it had, rebuilt over the new rows.
+        """
+        try:
+            with contextlib.ExitStack() as stack:
+                conn = stack.enter_context(self.get_connection(database_path, read_only=False))
+                if job:
+                    job.attach_connection(conn)
+                    stack.callback(job.detach_connection)
+                    job.set_phase("parsing")
 
                 quoted_table_name = f'"{table_name}"'
 
-                read_function = self._file_type_readers.get(file_type)
-                if not read_function:
-                    raise ValueError(f"Unsupported file type: {file_type}")
+                source_query, source_columns = self._source_select(stack, data_path, file_type, conn, csv_options, json_options)
 
-                # First read the data to get original column names
-                temp_df = conn.execute(f"SELECT * FROM {read_function(data_path)}").fetchdf()
-                original_columns = temp_df.columns.tolist()
-                
-                # Create standardized column names
-                standardized_columns = [self._standardize_column_name(col) for col in original_columns]
+                # Split list columns into child tables, numbering parent rows to link them
+                list_columns = [col["name"] for col in source_columns if col["type"].endswith("[]")] if (json_options or {}).get("split_arrays") else []
+                if list_columns:
+                    parent_table = quote_identifier(f"__parent_{table_name}")
+                    conn.execute(f"CREATE OR REPLACE TEMP TABLE {parent_table} AS SELECT row_number() OVER () AS {quote_identifier(ROW_ID_COLUMN)}, * FROM ({source_query})")
+                    child_tables = self._replace_child_tables(conn, table_name, parent_table, list_columns)
+                    source_query = f"SELECT * EXCLUDE ({', '.join([quote_identifier(col) for col in list_columns])}) FROM {parent_table}"
+                    source_columns = [{"name": ROW_ID_COLUMN, "type": "BIGINT"}] + [col for col in source_columns if col["name"] not in list_columns]
+                else:
+                    child_tables = self._replace_child_tables(conn, table_name)
+
+                resolved_sort_key = self._resolve_sort_key(source_columns, sort_key)
+                resolved_indexes = self._resolve_indexes(source_columns, indexes)
                 
                 # Create the table with standardized column names
-                select_clause = ', '.join([f'"{col}" as "{standardized_columns[i]}"' 
-                                         for i, col in enumerate(original_columns)])
-                
-                conn.execute(f"CREATE OR REPLACE TABLE {quoted_table_name} AS "
-                           f"SELECT {select_clause} FROM {read_function(data_path)}")
+                order_clause = ""
+                if resolved_sort_key:
+                    order_clause = f" ORDER BY {', '.join([quote_identifier(col) for col in resolved_sort_key])}"
+
+                # Stage text data first so low-cardinality columns are written as ENUMs in one pass
+                text_columns = [col["name"] for col in source_columns if col["type"] == "VARCHAR"]
+                if text_columns:
+                    staging_table = quote_identifier(f"__staging_{table_name}")
+                    conn.execute(f"CREATE OR REPLACE TEMP TABLE {staging_table} AS {source_query}")
+                    enum_types = self._low_cardinality_enum_types(conn, staging_table, text_columns)
+                    replace_clause = ', '.join([f"CAST({quote_identifier(col)} AS {enum_type}) AS {quote_identifier(col)}" for col, enum_type in enum_types.items()])
+                    source_query = f"SELECT * REPLACE ({replace_clause}) FROM {staging_table}" if enum_types else f"SELECT * FROM {staging_table}"
 
-                columns_query = conn.execute(f"PRAGMA table_info({quoted_table_name})").fetchall()
-                columns = [{"name": col[1], "type": col[2]} for col in columns_query]
+                conn.execute(f"CREATE OR REPLACE TABLE {quoted_table_name} AS {source_query}{order_clause}")
+                if text_columns:
+                    conn.execute(f"DROP TABLE {staging_table}")
+                if list_columns:
+                    conn.execute(f"DROP TABLE {parent_table}")
+                # Built after the load, which is much faster than maintaining them row by row;
+                # the replaced table took its indexes with it and its rows are committed
+                self._create_indexes(conn, table_name, resolved_indexes)
+                rejected_rows = self._quarantine_rejects(conn, table_name, bool((csv_options or {}).get("rejects")))
+                if job:
+                    job.bytes_parsed = job.bytes_total
+                    job.set_phase("computing_statistics")
 
-                preview_df = conn.execute(f"SELECT * FROM {quoted_table_name} LIMIT 5").fetchdf()
-                # Convert datetime columns to ISO format strings before converting to dict
-                preview_df = self._convert_datetime_columns(preview_df)
-                preview_data = preview_df.to_dict(orient='records')
+                columns = self._table_columns(conn, quoted_table_name)
+                statistics = self._compute_column_statistics(conn, quoted_table_name)
+                if job:
+                    job.rows = statistics["row_count"]
+                rollups = self._refresh_rollups(conn, table_name)
+                text_search = self._refresh_text_search(conn, table_name, text_search)
+                self._refresh_sample(conn, table_name, statistics["row_count"])
 
-                return columns, preview_data
+                return {
+                    "columns": columns,
+                    "statistics": statistics,
+                    "sort_key": resolved_sort_key,
+                    "indexes": resolved_indexes,
+                    "text_search": text_search,
+                    "rollups": rollups,
+                    "rejected_rows": rejected_rows,
+                    "child_tables": child_tables
+                }
 
         except Exception as e:
             logger.error(f"Error processing with DuckDB: {e}")
             raise
 
+    @staticmethod
+    def partition_column(partitioning: Dict[str, Any]) -> str:
+        """Name of the hive partition column of a partitioned dataset."""
+        if partitioning.get("grain"):
+            return f"{partitioning['column']}_{partitioning['grain']}"
+        return partitioning["column"]
+
+    @staticmethod
+    def _list_partition_files(partition_directory: str) -> set:
+        return {
+            os.path.relpath(os.path.join(root, name), partition_directory)
+            for root, _, names in os.walk(partition_directory) for name in names if name.endswith(".parquet")
+        }
+
+    def write_partitions(self, database_path: str, data_path: str, table_name: str, file_type: str, partition_directory: str, partitioning: Dict[str, Any], append: bool = False, previous_statistics: Optional[Dict[str, Any]] = None, job=None, csv_options: Optional[Dict[str, Any]] = None, json_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Store a file as hive-partitioned Parquet under `partition_directory`, exposed as a view.
+
+        `partitioning` names the column to partition by and optionally a time `grain` (day,
+        month or year) its values are truncated to. Queries filtering on the partition column
+        only read the matching partitions. With `append`, rows are written as new files next
+        to the existing ones, and statistics are merged from the new rows like `merge_data`.
+        Returns the usual dataset metadata plus the new files, relative to the directory.
+        """
+        try:
+            with contextlib.ExitStack() as stack:
+                conn = stack.enter_context(self.get_connection(database_path, read_only=False))
+                if job:
+                    job.attach_connection(conn)
+                    stack.callback(job.detach_connection)
+                    job.set_phase("parsing")
+
+                quoted_table_name = quote_identifier(table_name)
+                incoming_table = quote_identifier(f"__incoming_{table_name}")
+                source_query, source_columns = self._source_select(stack, data_path, file_type, conn, csv_options, json_options)
+
+                column = self._standardize_column_name(partitioning["column"])
+                column_types = {col["name"]: col["type"] for col in source_columns}
+                if column not in column_types:
+                    raise ValueError(f"Partition column not found in dataset: {column}")
+                grain = partitioning.get("grain")
+                partition_column = self.partition_column({"column": column, "grain": grain})
+                if grain:
+                    if column_types[column] != "DATE" and not column_types[column].startswith("TIMESTAMP"):
+                        raise ValueError(f"Partition column {column} must be a DATE or TIMESTAMP to partition by {grain}")
+                    source_query = f"SELECT *, strftime({quote_identifier(column)}, '{self.PARTITION_GRAINS[grain]}') AS {quote_identifier(partition_column)} FROM ({source_query})"
+
+                # Stage the rows once; they are both written out and summarized
+                conn.execute(f"CREATE OR REPLACE TEMP TABLE {incoming_table} AS {source_query}")
+                rejected_rows = self._quarantine_rejects(conn, table_name, bool((csv_options or {}).get("rejects")))
+
+                os.makedirs(partition_directory, exist_ok=True)
+                existing_files = self._list_partition_files(partition_directory)
+                write_mode = "APPEND" if append else "OVERWRITE"
+                inserted_rows = conn.execute(
+                    f"COPY {incoming_table} TO {sql_literal(partition_directory)} "
+                    f"(FORMAT parquet, PARTITION_BY ({quote_identifier(partition_column)}), FILENAME_PATTERN 'part_{{uuid}}', {write_mode})"
+                ).fetchone()[0]
+                written_files = sorted(self._list_partition_files(partition_directory) - existing_files)
+
+                if self._table_exists(conn, table_name):
+                    conn.execute(f"DROP TABLE {quoted_table_name}")
+                parquet_glob = sql_literal(os.path.join(partition_directory, "**", "*.parquet"))
+                conn.execute(f"CREATE OR REPLACE VIEW {quoted_table_name} AS SELECT * FROM read_parquet({parquet_glob}, hive_partitioning = true)")
+                if job:
+                    job.bytes_parsed = job.bytes_total
+                    job.set_phase("computing_statistics")
+
+                columns = self._table_columns(conn, quoted_table_name)
+                if append and previous_statistics and previous_statistics.get("columns"):
+                    delta_statistics = self._compute_column_statistics(conn, incoming_table)
+                    statistics = self._merge_column_statistics(conn, columns, previous_statistics, delta_statistics, 0)
+                else:
+                    statistics = self._compute_column_statistics(conn, quoted_table_name)
+
+                conn.execute(f"DROP TABLE {incoming_table}")
+                if job:
+                    job.rows = statistics["row_count"]
+                rollups = self._refresh_rollups(conn, table_name)
+                self._refresh_text_search(conn, table_name, {"columns": []})
+                self._refresh_sample(conn, table_name, statistics["row_count"])
+
+                return {
+                    "columns": columns,
+                    "statistics": statistics,
+                    "sort_key": [],
+                    "rollups": rollups,
+                    "partitioning": {"column": column, "grain": grain, "partition_column": partition_column},
+                    "written_files": written_files,
+                    "rejected_rows": rejected_rows,
+                    "rows_inserted": inserted_rows
+                }
+
+        except Exception as e:
+            logger.error(f"Error writing partitions with DuckDB: {e}")
+            raise
+
+    def _merge_column_statistics(self, conn, columns: List[Dict[str, str]], previous: Dict[str, Any], delta: Dict[str, Any], deleted_rows: int) -> Dict[str, Any]:
+        """Combine stored statistics with the statistics of newly added rows.
+
+        Row counts, null fractions, min/max, averages and top values are merged; distinct
+        counts, std and quantiles keep their previous values, so the result is marked
+        approximate until the next full refresh.
+        """
+        previous_rows = previous.get("row_count") or 0
+        delta_rows = delta.get("row_count") or 0
+        total_rows = previous_rows + delta_rows
+        previous_columns = previous.get("columns", {})
+        delta_columns = delta.get("columns", {})
+
+        # Merge min/max with each column's real type in a single scan-free query
+        bound_expressions = []
+        for col in columns:
+            previous_stats = previous_columns.get(col["name"], {})
+            delta_stats = delta_columns.get(col["name"], {})
+            for bound, function in (("min", "least"), ("max", "greatest")):
+                values = ', '.join([f"TRY_CAST({sql_literal(stats.get(bound))} AS {col['type']})" for stats in (previous_stats, delta_stats)])
+                bound_expressions.append(f"CAST({function}({values}) AS VARCHAR)")
+        bounds = conn.execute(f"SELECT {', '.join(bound_expressions)}").fetchone() if bound_expressions else []
+
+        merged_columns = {}
+        for index, col in enumerate(columns):
+            previous_stats = previous_columns.get(col["name"])
+            delta_stats = delta_columns.get(col["name"])
+            if not previous_stats or not delta_stats:
+                merged_columns[col["name"]] = previous_stats or delta_stats or {}
+                continue
+
+            stats = dict(previous_stats)
+            previous_nulls = previous_stats.get("null_fraction", 0) * previous_rows
+            delta_nulls = delta_stats.get("null_fraction", 0) * delta_rows
+            stats["null_fraction"] = round((previous_nulls + delta_nulls) / total_rows, 4) if total_rows else 0.0
+            stats["approx_distinct"] = max(previous_stats.get("approx_distinct") or 0, delta_stats.get("approx_distinct") or 0)
+            stats["min"], stats["max"] = bounds[2 * index], bounds[2 * index + 1]
+
+            if previous_stats.get("avg") is not None and delta_stats.get("avg") is not None:
+                previous_values = previous_rows - previous_nulls
+                delta_values = delta_rows - delta_nulls
+                if previous_values + delta_values:
+                    stats["avg"] = str((float(previous_stats["avg"]) * previous_values + float(delta_stats["avg"]) * delta_values) / (previous_values + delta_values))
+
+            if "top_values" in previous_stats or "top_values" in delta_stats:
+                counts = {}
+                for item in previous_stats.get("top_values", []) + delta_stats.get("top_values", []):
+                    counts[item["value"]] = counts.get(item["value"], 0) + item["count"]
+                top_values = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:self.TOP_VALUES_LIMIT]
+                stats["top_values"] = [{"value": value, "count": frequency} for value, frequency in top_values]
+
+            merged_columns[col["name"]] = stats
+
+        return {"row_count": total_rows - deleted_rows, "columns": merged_columns, "approximate": True}
+
+    def merge_data(self, database_path: str, data_path: str, table_name: str, file_type: str, mode: str, key: Optional[List[str]] = None, sort_key: Optional[List[str]] = None, previous_statistics: Optional[Dict[str, Any]] = None, csv_options: Optional[Dict[str, Any]] = None, json_options: Optional[Dict[str, Any]] = None, indexes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Add a file's rows to an existing table without rewriting it.
+
+        `append` inserts every row; `upsert` first deletes the rows whose `key` matches an
+        incoming row, then inserts; of several incoming rows with the same key the last one
+        in the file wins. Statistics, and rollups when no rows were deleted, are updated
+        from the incoming rows only, so the cost is proportional to the size of the delta.
+        `csv_options` and `json_options` read the file the way the table was loaded when it
+        was created; as with a replace, the rejects table then holds the rows of this file
+        that failed to parse.
+        The ART indexes on `indexes` take in the new rows, and are only rebuilt, after the
+        rows are committed, when ENUM columns had to be altered to hold new values. The
+        full-text search index and the reservoir sample are rebuilt over the whole table.
+        """
+        if mode not in self.MERGE_MODES:
+            raise ValueError(f"Invalid update mode. Must be one of: {', '.join(self.MERGE_MODES)}")
+        if (json_options or {}).get("split_arrays"):
+            raise ValueError("Datasets with arrays split into child tables can only be updated with mode=replace")
+
+        try:
+            with contextlib.ExitStack() as stack:
+                conn = stack.enter_context(self.get_connection(database_path, read_only=False))
+
+                quoted_table_name = f'"{table_name}"'
+                incoming_table = quote_identifier(f"__incoming_{table_name}")
+
+                source_query, source_columns = self._source_select(stack, data_path, file_type, conn, csv_options, json_options)
+                columns = self._table_columns(conn, quoted_table_name)
+                column_names = [col["name"] for col in columns]
+
+                new_columns = [col["name"] for col in source_columns if col["name"] not in column_names]
+                if new_columns:
+                    raise ValueError(f"Incoming file has columns not present in the dataset: {', '.join(new_columns)}. Use mode=replace to change the schema")
+
+                key_columns = [self._standardize_column_name(col) for col in (key or [])]
+                if mode == "upsert":
+                    if not key_columns:
+                        raise ValueError("A key is required for mode=upsert")
+                    missing = [col for col in key_columns if col not in column_names or col not in [c["name"] for c in source_columns]]
+                    if missing:
+                        raise ValueError(f"Key columns not found in dataset or incoming file: {', '.join(missing)}")
+                    quoted_key = ', '.join([quote_identifier(col) for col in key_columns])
+                    # Keep a single incoming row per key, the last one in file order
+                    position = quote_identifier(self.POSITION_COLUMN)
+                    source_query = (
+                        f"SELECT * EXCLUDE ({position}) FROM (SELECT *, row_number() OVER () AS {position} FROM ({source_query})) "
+                        f"QUALIFY row_number() OVER (PARTITION BY {quoted_key} ORDER BY {position} DESC) = 1"
+                    )
+
+                conn.execute("BEGIN TRANSACTION")
+                conn.execute(f"CREATE TEMP TABLE {incoming_table} AS {source_query}")
+                rejected_rows = self._quarantine_rejects(conn, table_name, bool((csv_options or {}).get("rejects")))
+
+                # ENUM columns must know every value before rows holding it are inserted.
+                # Indexed columns cannot be altered, so then the indexes are dropped, which
+                # DuckDB only honours once committed; the warehouse is only uploaded once
+                # the merge is done. Otherwise rows go in with the indexes in place.
+                resolved_indexes = self._resolve_indexes(columns, indexes)
+                enum_types = self._extended_enum_types(conn, quoted_table_name, incoming_table)
+                index_names = sorted([self._index_name(table_name, col) for col in resolved_indexes])
+                rebuild_indexes = bool(enum_types) or sorted(self._index_names(conn, table_name)) != index_names
+                if rebuild_indexes:
+                    self._drop_indexes(conn, table_name)
+                    conn.execute("COMMIT")
+                    conn.execute("BEGIN TRANSACTION")
+                for column, column_type in enum_types.items():
+                    conn.execute(f"ALTER TABLE {quoted_table_name} ALTER COLUMN {quote_identifier(column)} SET DATA TYPE {column_type}")
+
+                deleted_rows = 0
+                if mode == "upsert":
+                    match_clause = ' AND '.join([f"{quoted_table_name}.{quote_identifier(col)} = {incoming_table}.{quote_identifier(col)}" for col in key_columns])
+                    deleted_rows = conn.execute(f"DELETE FROM {quoted_table_name} USING {incoming_table} WHERE {match_clause}").fetchone()[0]
+
+                # Appended rows keep the clustering order within their own row groups
+                order_clause = ""
+                if sort_key:
+                    order_clause = f" ORDER BY {', '.join([quote_identifier(col) for col in sort_key])}"
+                inserted_rows = conn.execute(f"INSERT INTO {quoted_table_name} BY NAME SELECT * FROM {incoming_table}{order_clause}").fetchone()[0]
+                columns = self._table_columns(conn, quoted_table_name)
+
+                delta_statistics = self._compute_column_statistics(conn, incoming_table)
+                if previous_statistics and previous_statistics.get("columns"):
+                    statistics = self._merge_column_statistics(conn, columns, previous_statistics, delta_statistics, deleted_rows)
+                else:
+                    statistics = self._compute_column_statistics(conn, quoted_table_name)
+
+                # Rollups take in the new rows unless some were deleted, which partial
+                # aggregates cannot take back out
+                rollups = self._append_to_rollups(conn, table_name, incoming_table) if not deleted_rows else self._refresh_rollups(conn, table_name)
+                conn.execute(f"DROP TABLE {incoming_table}")
+                # The fts index and the reservoir sample cannot be updated in place, so
+                # these two are rebuilt over the whole table
+                text_search = self._refresh_text_search(conn, table_name)
+                self._refresh_sample(conn, table_name, statistics["row_count"])
+                conn.execute("COMMIT")
+
+                # Indexes see the merged rows only from a new transaction, see _create_indexes
+                if rebuild_indexes:
+                    conn.execute("BEGIN TRANSACTION")
+                    self._create_indexes(conn, table_name, resolved_indexes)
+                    conn.execute("COMMIT")
+
+                return {
+                    "columns": columns,
+                    "statistics": statistics,
+                    "sort_key": sort_key or [],
+                    "indexes": resolved_indexes,
+                    "text_search": text_search,
+                    "rollups": rollups,
+                    "rows_inserted": inserted_rows,
+                    "rows_deleted": deleted_rows,
+                    "rejected_rows": rejected_rows
+                }
+
+        except Exception as e:
+            logger.error(f"Error merging data with DuckDB: {e}")
+            raise
+
+    def _validate_rollups(self, columns: List[Dict[str, str]], rollups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Check rollup definitions against a table's columns and standardize their names."""
+        column_types = {col["name"]: col["type"] for col in columns}
+        validated = []
+        for rollup in rollups:
+            name = rollup.get("name")
+            if not isinstance(name, str) or not re.fullmatch(r"[A-Za-z0-9_]+", name):
+                raise ValueError("Each rollup needs a name made of letters, digits and underscores")
+            if name in [existing["name"] for existing in validated]:
+                raise ValueError(f"Duplicate rollup name: {name}")
+
+            dimensions = [self._standardize_column_name(col) for col in rollup.get("dimensions") or []]
+            measures = [self._standardize_column_name(col) for col in rollup.get("measures") or []]
+            time_column = self._standardize_column_name(rollup["time_column"]) if rollup.get("time_column") else None
+            time_grain = rollup.get("time_grain")
+
+            missing = [col for col in dimensions + measures + ([time_column] if time_column else []) if col not in column_types]
+            if missing:
+                raise ValueError(f"Rollup {name} references columns not found in dataset: {', '.join(missing)}")
+            if time_column:
+                if time_grain not in TIME_GRAINS:
+                    raise ValueError(f"Rollup {name} needs a time_grain, one of: {', '.join(TIME_GRAINS)}")
+                if not (column_types[time_column] == "DATE" or column_types[time_column].startswith("TIMESTAMP")):
+                    raise ValueError(f"Rollup {name} time column {time_column} is not a DATE or TIMESTAMP column")
+            if not dimensions and not time_column:
+                raise ValueError(f"Rollup {name} needs at least one dimension or a time column")
+
+            validated.append({
+                "name": name,
+                "dimensions": dimensions,
+                "measures": measures,
+                "time_column": time_column,
+                "time_grain": time_grain if time_column else None
+            })
+        return validated
+
+    def _table_exists(self, conn, table_name: str) -> bool:
+        return conn.execute(
+            "SELECT count(*) FROM duckdb_tables() WHERE schema_name = 'main' AND table_name = ?", [table_name]
+        ).fetchone()[0] > 0
+
+    def _rollup_catalog_exists(self, conn) -> bool:
+        return self._table_exists(conn, self.ROLLUP_CATALOG_TABLE)
+
+    def _fetch_rollups(self, conn, table_name: str) -> List[Dict[str, Any]]:
+        """Read a table's rollup definitions from the catalog, smallest rollup first."""
+        relation = conn.sql(
+            f"SELECT table_name, name, rollup_table, dimensions, measures, time_column, time_grain "
+            f"FROM {quote_identifier(self.ROLLUP_CATALOG_TABLE)} WHERE lower(table_name) = lower({sql_literal(table_name)}) ORDER BY row_count"
+        )
+        return [dict(zip(relation.columns, row)) for row in relation.fetchall()]
+
+    def _refresh_rollups(self, conn, table_name: str, rollups: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Rebuild a table's rollups and record them in the warehouse's rollup catalog.
+
+        Without `rollups` the definitions already in the catalog are refreshed; ones that
+        reference columns the table no longer has are dropped.
+        """
+        if not rollups and not self._rollup_catalog_exists(conn):
+            return []
+
+        catalog = quote_identifier(self.ROLLUP_CATALOG_TABLE)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {catalog} (
+                table_name VARCHAR, name VARCHAR, rollup_table VARCHAR, dimensions VARCHAR[], measures VARCHAR[],
+                time_column VARCHAR, time_grain VARCHAR, row_count BIGINT, refreshed_at TIMESTAMP
+            )
+        """)
+
+        existing = self._fetch_rollups(conn, table_name)
+        quoted_table_name = quote_identifier(table_name)
+        columns = self._table_columns(conn, quoted_table_name)
+
+        if rollups is None:
+            rollups = []
+            for rollup in existing:
+                try:
+                    rollups += self._validate_rollups(columns, [rollup])
+                except ValueError as e:
+                    logger.warning(f"Dropping rollup {rollup['name']} of {table_name}: {e}")
+        else:
+            rollups = self._validate_rollups(columns, rollups)
+
+        for rollup in existing:
+            conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(rollup['rollup_table'])}")
+        conn.execute(f"DELETE FROM {catalog} WHERE table_name = {sql_literal(table_name)}")
+
+        refreshed = []
+        for rollup in rollups:
+            rollup_table = f"__rollup_{table_name}_{rollup['name']}"
+            conn.execute(f"CREATE TABLE {quote_identifier(rollup_table)} AS {rollup_select_sql(quoted_table_name, rollup)}")
+            row_count = conn.execute(f"SELECT count(*) FROM {quote_identifier(rollup_table)}").fetchone()[0]
+            conn.execute(
+                f"INSERT INTO {catalog} VALUES (?, ?, ?, ?, ?, ?, ?, ?, now())",
+                [table_name, rollup["name"], rollup_table, rollup["dimensions"], rollup["measures"], rollup["time_column"], rollup["time_grain"], row_count]
+            )
+            refreshed.append({**rollup, "row_count": row_count})
+        return refreshed
+
+    def _append_to_rollups(self, conn, table_name: str, appended_table: str) -> List[Dict[str, Any]]:
+        """Fold the rows of `appended_table`, just appended to a table, into its rollups.
+
+        Only valid when no rows were deleted; the cost follows the size of the rollups and
+        the appended rows instead of the table.
+        """
+        if not self._rollup_catalog_exists(conn):
+            return []
+
+        catalog = quote_identifier(self.ROLLUP_CATALOG_TABLE)
+        refreshed = []
+        for rollup in self._fetch_rollups(conn, table_name):
+            quoted_rollup_table = quote_identifier(rollup["rollup_table"])
+            conn.execute(f"CREATE OR REPLACE TABLE {quoted_rollup_table} AS {appended_rollup_sql(quoted_rollup_table, appended_table, rollup)}")
+            row_count = conn.execute(f"SELECT count(*) FROM {quoted_rollup_table}").fetchone()[0]
+            conn.execute(f"UPDATE {catalog} SET row_count = ?, refreshed_at = now() WHERE table_name = ? AND name = ?", [row_count, rollup["table_name"], rollup["name"]])
+            refreshed.append({key: rollup[key] for key in ("name", "dimensions", "measures", "time_column", "time_grain")} | {"row_count": row_count})
+        return refreshed
+
+    @staticmethod
+    def _text_search_schema(table_name: str) -> str:
+        """Schema the fts extension keeps a table's index and its match_bm25 macro in."""
+        return f"fts_main_{table_name}"
+
+    def _validate_text_search(self, columns: List[Dict[str, str]], text_search: Dict[str, Any]) -> Dict[str, Any]:
+        """Check a full-text search definition against a table's columns and standardize its names."""
+        column_types = {col["name"]: col["type"] for col in columns}
+        search_columns = []
+        for column in text_search.get("columns") or []:
+            column = self._standardize_column_name(column)
+            if column not in column_types:
+                raise ValueError(f"Text search column not found in dataset: {column}")
+            if column_types[column] != "VARCHAR":
+                raise ValueError(f"Text search column {column} is not a text column")
+            if column not in search_columns:
+                search_columns.append(column)
+
+        # Rows are identified by their row id unless the dataset has a unique id column
+        id_column = "rowid"
+        if text_search.get("id_column"):
+            id_column = self._standardize_column_name(text_search["id_column"])
+            if id_column not in column_types:
+                raise ValueError(f"Text search id column not found in dataset: {id_column}")
+        return {"columns": search_columns, "id_column": id_column}
+
+    def _fetch_text_search(self, conn, table_name: str) -> Optional[Dict[str, Any]]:
+        if not self._table_exists(conn, self.TEXT_SEARCH_CATALOG_TABLE):
+            return None
+        row = conn.execute(
+            f"SELECT id_column, columns FROM {quote_identifier(self.TEXT_SEARCH_CATALOG_TABLE)} WHERE lower(table_name) = lower(?)", [table_name]
+        ).fetchone()
+        return {"columns": row[1], "id_column": row[0]} if row else None
+
+    def _refresh_text_search(self, conn, table_name: str, text_search: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Rebuild a table's full-text search index and record it in the catalog.
+
+        Without `text_search` the definition already in the catalog is rebuilt, since the
+        fts index does not follow changes to the table; one that references columns the
+        table no longer has is dropped. A definition without columns drops the index.
+        """
+        existing = self._fetch_text_search(conn, table_name)
+        if text_search is None:
+            if not existing:
+                return None
+            try:
+                text_search = self._validate_text_search(self._table_columns(conn, quote_identifier(table_name)), existing)
+            except ValueError as e:
+                logger.warning(f"Dropping the text search index of {table_name}: {e}")
+                text_search = {"columns": []}
+        elif text_search.get("columns"):
+            text_search = self._validate_text_search(self._table_columns(conn, quote_identifier(table_name)), text_search)
+
+        schema_exists = conn.execute("SELECT count(*) FROM duckdb_schemas() WHERE schema_name = ?", [self._text_search_schema(table_name)]).fetchone()[0] > 0
+        if schema_exists or text_search.get("columns"):
+            try:
+                conn.load_extension("fts")
+            except duckdb.Error as e:
+                raise ValueError(f"Full-text search is not available: {e}") from e
+        if schema_exists:
+            conn.execute(f"PRAGMA drop_fts_index({sql_literal(table_name)})")
+        if existing:
+            conn.execute(f"DELETE FROM {quote_identifier(self.TEXT_SEARCH_CATALOG_TABLE)} WHERE lower(table_name) = lower(?)", [table_name])
+        if not text_search.get("columns"):
+            return None
+
+        arguments = ', '.join([sql_literal(table_name), sql_literal(text_search["id_column"])] + [sql_literal(col) for col in text_search["columns"]])
+        conn.execute(f"PRAGMA create_fts_index({arguments}, stemmer = 'porter', stopwords = 'english', strip_accents = 1, lower = 1, overwrite = 1)")
+
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(self.TEXT_SEARCH_CATALOG_TABLE)} (table_name VARCHAR, id_column VARCHAR, columns VARCHAR[], refreshed_at TIMESTAMP)")
+        conn.execute(f"INSERT INTO {quote_identifier(self.TEXT_SEARCH_CATALOG_TABLE)} VALUES (?, ?, ?, now())", [table_name, text_search["id_column"], text_search["columns"]])
+        return text_search
+
+    def define_text_search(self, database_path: str, table_name: str, text_search: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Replace a table's full-text search index with one over `text_search["columns"]`.
+
+        Rows are identified by `id_column` when given (it must be unique), otherwise by
+        their row id. The index is rebuilt whenever the table is loaded or merged into.
+        """
+        try:
+            with self.get_connection(database_path, read_only=False) as conn:
+                if not self._table_exists(conn, table_name):
+                    raise ValueError(f"Table {table_name} not found or is a partitioned dataset, which cannot be searched")
+                conn.execute("BEGIN TRANSACTION")
+                refreshed = self._refresh_text_search(conn, table_name, text_search)
+                conn.execute("COMMIT")
+                return refreshed
+        except Exception as e:
+            logger.error(f"Error building text search index with DuckDB: {e}")
+            raise
+
+    def search_text(self, database_path: str, table_name: str, query: str, columns: Optional[List[str]] = None, match_all: bool = False, limit: int = 20, warehouse_id: Optional[str] = None, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Rank a table's rows against keywords with its full-text search index.
+
+        Keywords are stemmed, so "refunds" finds "refunded". Rows come back best match
+        first with their BM25 relevance in SEARCH_SCORE_COLUMN. `columns` narrows the
+        search to some of the indexed columns, and `match_all` requires every keyword.
+        """
+        with self.get_connection(database_path) as conn:
+            text_search = self._fetch_text_search(conn, table_name)
+        if not text_search:
+            raise ValueError(f"Table {table_name} has no full-text search index")
+
+        fields = [self._standardize_column_name(col) for col in columns or []]
+        unknown = [col for col in fields if col not in text_search["columns"]]
+        if unknown:
+            raise ValueError(f"Columns are not in the text search index: {', '.join(unknown)}. Indexed columns: {', '.join(text_search['columns'])}")
+
+        fields_argument = f", fields := {sql_literal(','.join(fields))}" if fields else ""
+        score = f"{quote_identifier(self._text_search_schema(table_name))}.match_bm25({quote_identifier(text_search['id_column'])}, {sql_literal(query)}{fields_argument}, conjunctive := {int(match_all)})"
+        search_query = (
+            f"SELECT * FROM (SELECT *, {score} AS {quote_identifier(self.SEARCH_SCORE_COLUMN)} FROM {quote_identifier(table_name)}) "
+            f"WHERE {quote_identifier(self.SEARCH_SCORE_COLUMN)} IS NOT NULL ORDER BY {quote_identifier(self.SEARCH_SCORE_COLUMN)} DESC"
+        )
+        return self.execute_query(database_path, search_query, limit=limit, warehouse_id=warehouse_id, source=source)
+
+    def preview_table(self, database_path: str, table_name: str, rows: int, method: str = "random", stratify_by: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Draw `rows` preview rows from a table.
+
+        `first` returns the first rows as stored, `random` a uniform reservoir sample and
+        `stratified` random rows spread evenly over the values of the `stratify_by` column.
+        """
+        if method not in self.PREVIEW_METHODS:
+            raise ValueError(f"Invalid preview method. Must be one of: {', '.join(self.PREVIEW_METHODS)}")
+        if method == "stratified" and not stratify_by:
+            raise ValueError("A stratify_by column is required for stratified previews")
+
+        quoted_table_name = quote_identifier(table_name)
+        with self.get_connection(database_path) as conn:
+            # Partitioned datasets are views
+            exists = conn.execute(
+                "SELECT count(*) FROM information_schema.tables WHERE table_schema = 'main' AND table_name = ?", [table_name]
+            ).fetchone()[0]
+            if not exists:
+                raise ValueError(f"Table {table_name} not found")
+
+            if method == "first":
+                return self._fetch_records(conn.sql(f"SELECT * FROM {quoted_table_name} LIMIT {int(rows)}"))
+            if method == "random":
+                return self._fetch_records(conn.sql(sample_select_sql(quoted_table_name, rows, self.SAMPLE_SEED)))
+
+            column = self._standardize_column_name(stratify_by)
+            columns = {col["name"]: col["type"] for col in self._table_columns(conn, quoted_table_name)}
+            if column not in columns:
+                raise ValueError(f"Column {stratify_by} not found in table {table_name}")
+            if columns[column].endswith("]") or columns[column].startswith(("STRUCT", "MAP", "UNION")):
+                raise ValueError(f"Column {stratify_by} has a nested type and cannot be used to stratify a preview")
+            return self._fetch_records(conn.sql(stratified_sample_sql(quoted_table_name, quote_identifier(column), rows)))
+
+    def check_semantic_model(self, database_path: str, model: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Check a semantic model against a warehouse, raising ValueError on the first problem.
+
+        Metric expressions must aggregate their table, dimension expressions must not, and
+        a metric's time column must be a date or timestamp column of its table.
+        """
+        with self.get_connection(database_path) as conn:
+            tables = {
+                row[0]: row[1] for row in conn.execute(
+                    "SELECT table_name, table_type FROM information_schema.tables WHERE table_schema = 'main'"
+                ).fetchall()
+            }
+            for kind, definitions in (("metric", model["metrics"]), ("dimension", model["dimensions"])):
+                for definition in definitions:
+                    if definition["table"] not in tables:
+                        raise ValueError(f"Table {definition['table']} of the {kind} {definition['name']} not found")
+                    quoted_table_name = quote_identifier(definition["table"])
+                    expression = definition["expression"]
+                    parse_single_expression(conn, expression)
+                    # Binding the expression grouped by nothing (or by itself) tells aggregates apart
+                    check_sql = (
+                        f"SELECT ({expression}) FROM {quoted_table_name} GROUP BY () LIMIT 0" if kind == "metric"
+                        else f"SELECT ({expression}) FROM {quoted_table_name} GROUP BY ({expression}) LIMIT 0"
+                    )
+                    try:
+                        conn.execute(check_sql)
+                    except duckdb.Error as e:
+                        requirement = "an aggregate" if kind == "metric" else "a non-aggregate"
+                        raise ValueError(f"The {kind} {definition['name']} must be {requirement} expression over {definition['table']}: {e}")
+
+                    if definition.get("time_column"):
+                        columns = {col["name"]: col["type"] for col in self._table_columns(conn, quoted_table_name)}
+                        time_type = columns.get(definition["time_column"])
+                        if not time_type or not time_type.startswith(("DATE", "TIMESTAMP")):
+                            raise ValueError(f"Time column {definition['time_column']} of the metric {definition['name']} must be a date or timestamp column of {definition['table']}")
+
+    def define_rollups(self, database_path: str, table_name: str, rollups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Replace a table's rollups with `rollups` and materialize them.
+
+        Each rollup groups the table by its `dimensions` and, optionally, its `time_column`
+        truncated to `time_grain`, keeping the sum, count, min and max of each of its `measures`.
+        """
+        try:
+            with self.get_connection(database_path, read_only=False) as conn:
+                conn.execute("BEGIN TRANSACTION")
+                refreshed = self._refresh_rollups(conn, table_name, rollups)
+                conn.execute("COMMIT")
+                return refreshed
+        except Exception as e:
+            logger.error(f"Error building rollups with DuckDB: {e}")
+            raise
+
+    def _refresh_sample(self, conn, table_name: str, row_count: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Redraw the reservoir sample of a table, or drop it if the table is small enough to scan.
+
+        Pass `row_count=None` to drop the sample unconditionally.
+        """
+        catalog = quote_identifier(self.SAMPLE_CATALOG_TABLE)
+        sample_table = f"__sample_{table_name}"
+        needs_sample = row_count is not None and row_count > settings.SAMPLE_TABLE_ROWS
+        if not needs_sample and not self._table_exists(conn, self.SAMPLE_CATALOG_TABLE):
+            return None
+
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {catalog} (table_name VARCHAR, sample_table VARCHAR, sample_rows BIGINT, total_rows BIGINT, refreshed_at TIMESTAMP)")
+        conn.execute(f"DELETE FROM {catalog} WHERE table_name = ?", [table_name])
+        conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(sample_table)}")
+        if not needs_sample:
+            return None
+
+        conn.execute(f"CREATE TABLE {quote_identifier(sample_table)} AS {sample_select_sql(quote_identifier(table_name), settings.SAMPLE_TABLE_ROWS, self.SAMPLE_SEED)}")
+        sample_rows = conn.execute(f"SELECT count(*) FROM {quote_identifier(sample_table)}").fetchone()[0]
+        conn.execute(f"INSERT INTO {catalog} VALUES (?, ?, ?, ?, now())", [table_name, sample_table, sample_rows, row_count])
+        return {"sample_table": sample_table, "sample_rows": sample_rows, "total_rows": row_count}
+
+    def _plan_approximate_query(self, conn, query: str, params: Optional[Dict[str, Any]] = None) -> Optional[Tuple[str, Dict[str, str], Dict[str, Any]]]:
+        """Rewrite a query to run on its table's sample; returns None when it should run exactly."""
+        if not self._table_exists(conn, self.SAMPLE_CATALOG_TABLE):
+            return None
+        tree = parse_query(conn, query)
+        node = select_node(tree)
+        from_table = (node or {}).get("from_table") or {}
+        if from_table.get("type") != "BASE_TABLE":
+            return None
+
+        relation = conn.sql(
+            f"SELECT table_name, sample_table, sample_rows, total_rows FROM {quote_identifier(self.SAMPLE_CATALOG_TABLE)} "
+            f"WHERE lower(table_name) = lower({sql_literal(from_table['table_name'])})"
+        )
+        samples = [dict(zip(relation.columns, row)) for row in relation.fetchall()]
+        if not samples:
+            return None
+
+        planned = rewrite_for_sample(conn, tree, samples[0], params)
+        if not planned:
+            return None
+        rewritten, margin_columns = planned
+        return render_query(conn, rewritten), margin_columns, samples[0]
+
+    def execute_approximate_query(self, database_path: str, query: str, timeout: Optional[float] = None, limit: Optional[int] = None, params: Optional[Dict[str, Any]] = None, warehouse_id: Optional[str] = None, source: Optional[str] = None, attachments: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Run a query on the reservoir sample of its table when it has one.
+
+        SUM and COUNT results are scaled to the full table and come with 95% confidence
+        margins in `error_bounds` (one dict per row). Queries over small tables, or that a
+        sample cannot answer, run exactly and are returned with `approximate` False.
+        Only tables of the warehouse itself are sampled, not those of `attachments`.
+        """
+        try:
+            with self.get_connection(database_path) as conn:
+                plan = self._plan_approximate_query(conn, query, params)
+        except duckdb.Error as e:
+            logger.warning(f"Running query exactly, it could not be planned on a sample: {e}")
+            plan = None
+
+        if not plan:
+            records = self.execute_query(database_path, query, timeout=timeout, limit=limit, params=params, warehouse_id=warehouse_id, source=source, attachments=attachments)
+            return {"data": records, "approximate": False}
+
+        sampled_query, margin_columns, sample = plan
+        records = self.execute_query(database_path, sampled_query, timeout=timeout, limit=limit, params=params, warehouse_id=warehouse_id, source=source, attachments=attachments)
+        error_bounds = [{column: record.pop(margin_column, None) for column, margin_column in margin_columns.items()} for record in records]
+        return {
+            "data": records,
+            "approximate": True,
+            "sample": {
+                "sample_rows": sample["sample_rows"],
+                "total_rows": sample["total_rows"],
+                "sampling_fraction": round(sample["sample_rows"] / sample["total_rows"], 6)
+            },
+            "confidence": 0.95 if margin_columns else None,
+            "error_bounds": error_bounds if margin_columns else None
+        }
+
+    @classmethod
+    def load_aggregate_functions(cls, conn) -> None:
+        """Cache the names of DuckDB's aggregate functions, used to recognize aggregate queries."""
+        functions = conn.execute("SELECT DISTINCT function_name FROM duckdb_functions() WHERE function_type = 'aggregate'").fetchall()
+        cls._aggregate_functions = {function[0].lower() for function in functions}
+
+    def _route_to_rollup(self, conn, query: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Rewrite an aggregate query to read from the smallest rollup that can answer it.
+
+        Returns the query unchanged when no rollup matches or it cannot be analyzed.
+        """
+        try:
+            return self._rewrite_with_rollups(conn, query, params)
+        except (duckdb.Error, KeyError, TypeError) as e:
+            logger.warning(f"Skipping rollup routing: {e}")
+            return query
+
+    def _rewrite_with_rollups(self, conn, query: str, params: Optional[Dict[str, Any]] = None) -> str:
+        if not self._rollup_catalog_exists(conn):
+            return query
+
+        tree = parse_query(conn, query)
+        node = select_node(tree)
+        if not node:
+            return query
+        from_table = node.get("from_table") or {}
+        if from_table.get("type") != "BASE_TABLE":
+            return query
+
+        rollups = self._fetch_rollups(conn, from_table["table_name"])
+        if not rollups:
+            return query
+        if DuckDBHandler._aggregate_functions is None:
+            self.load_aggregate_functions(conn)
+
+        for rollup in rollups:
+            rewritten = rewrite_for_rollup(tree, rollup, self._aggregate_functions, rollup_templates(conn, rollup))
+            if rewritten:
+                keep_output_names(conn, tree, rewritten, params)
+                logger.info(f"Answering query from rollup {rollup['rollup_table']}")
+                return render_query(conn, rewritten)
+        return query
 
     def delete_table(self, database_path: str, table_name: str) -> None:
         try:
@@ -130,11 +1394,16 @@ class DuckDBHandler:
             with self.get_connection(database_path, read_only=False) as conn:
                 quoted_table_name = f'"{table_name}"'
 
-                # Check if table exists
-                table_exists = conn.execute(f"SELECT COUNT(*) FROM information_schema.tables WHERE table_name = '{table_name}'").fetchone()[0] > 0
+                # Check if table exists; partitioned datasets are views over their Parquet files
+                table_type = conn.execute("SELECT table_type FROM information_schema.tables WHERE table_schema = 'main' AND table_name = ?", [table_name]).fetchone()
 
-                if table_exists:
-                    conn.execute(f"DROP TABLE {quoted_table_name}")
+                if table_type:
+                    self._refresh_rollups(conn, table_name, [])
+                    self._refresh_sample(conn, table_name, None)
+                    self._refresh_text_search(conn, table_name, {"columns": []})
+                    self._quarantine_rejects(conn, table_name, False)
+                    self._replace_child_tables(conn, table_name)
+                    conn.execute(f"DROP {'VIEW' if table_type[0] == 'VIEW' else 'TABLE'} {quoted_table_name}")
                     # Log tables after deletion
                     updated_tables = self.list_tables(database_path)
                     logger.info(f"Tables in DuckDB file after deletion: {updated_tables}")
@@ -145,18 +1414,259 @@ class DuckDBHandler:
             logger.error(f"Error deleting table from DuckDB: {e}")
             raise
 
-    def execute_query(self, database_path: str, query: str) -> List[Dict[str, Any]]:
+    def _attach_databases(self, conn, attachments: Dict[str, str]) -> None:
+        """ATTACH other warehouse files read-only, each under its alias."""
+        for alias, path in attachments.items():
+            validate_database_alias(alias)
+            conn.execute(f"ATTACH {sql_literal(path)} AS {quote_identifier(alias)} (READ_ONLY)")
+
+    def _run_query(self, database_path: str, query: str, consume: Callable[[Any, Any, QueryProfile], Tuple[Any, int]], timeout: Optional[float] = None, params: Optional[Dict[str, Any]] = None, warehouse_id: Optional[str] = None, source: Optional[str] = None, attachments: Optional[Dict[str, str]] = None, profile: Optional[bool] = None) -> Any:
+        """Run a query and hand its relation to `consume`, returning what it returns.
+
+        `consume(conn, relation, profile)` runs inside the query deadline and returns the
+        result and its row count; the relation is None for statements without a result set.
+        It calls `profile.stop()` before running statements of its own after the query.
+        Queries are timed by the wall clock; DuckDB's profile, which adds the rows scanned
+        and result size to slow query log entries, is only collected with `profile`, by
+        default when queries of the same shape were slow before.
+        """
+        timeout = settings.DUCKDB_QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+        if profile is None:
+            profile = slow_query_log.is_slow_shape(query)
         try:
             with self.get_connection(database_path) as conn:
-                result_df = conn.execute(query).fetchdf()
+                if attachments:
+                    self._attach_databases(conn, attachments)
+                with (self._profiling(conn, self.QUERY_PROFILING_METRICS) if profile else contextlib.nullcontext(QueryProfile())) as query_profile:
+                    started_at = time.perf_counter()
+                    # Aggregates a rollup can answer are read from it instead of the base table
+                    routed_query = self._route_to_rollup(conn, query, params)
+                    with self._query_deadline(conn, timeout):
+                        relation = self._execute_with_params(conn, routed_query, params)
+                        result, rows = consume(conn, relation, query_profile)
+                    duration = time.perf_counter() - started_at
 
-                # Converte automaticamente colunas de data para string ISO
-                for col in result_df.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]']).columns:
-                    result_df[col] = result_df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
+                if duration >= settings.SLOW_QUERY_THRESHOLD_SECONDS:
+                    slow_query_log.record(
+                        query,
+                        duration,
+                        rows=rows,
+                        rows_scanned=query_profile.get("cumulative_rows_scanned"),
+                        result_bytes=query_profile.get("result_set_size"),
+                        warehouse_id=warehouse_id,
+                        source=source
+                    )
 
-                # Converte o DataFrame em lista de dicionários
-                return result_df.to_dict(orient='records')
+                return result
 
+        except (QueryError, ValueError) as e:
+            logger.warning(f"Query rejected on DuckDB: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error executing query on DuckDB: {str(e)}")
             raise Exception(str(e))
+
+    def _run_in_worker(self, method_name: str, **kwargs) -> Any:
+        """Run a query method in the worker pool under a budget leased in this process."""
+        with resource_governor.lease() as lease:
+            if not lease:
+                raise ResourcesBusyError("The server is busy running other queries, please try again shortly")
+            try:
+                return query_executor.run(method_name, lease.threads, lease.memory_bytes, **kwargs)
+            except BrokenProcessPool as e:
+                raise QueryWorkerCrashedError("Query too expensive: the worker process running it crashed, most likely by running out of memory") from e
+
+    def execute_query(self, database_path: str, query: str, timeout: Optional[float] = None, limit: Optional[int] = None, params: Optional[Dict[str, Any]] = None, warehouse_id: Optional[str] = None, source: Optional[str] = None, attachments: Optional[Dict[str, str]] = None, profile: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Run a query and return its rows as dicts.
+
+        When `limit` is given it is pushed down into the query plan, so DuckDB stops
+        producing rows once the limit is reached instead of materializing everything.
+        Queries with `params` reference them as `$name`; their values are bound, never spliced.
+        Queries slower than SLOW_QUERY_THRESHOLD_SECONDS are recorded in the slow query
+        log along with the `warehouse_id` and the calling `source`.
+        `attachments` maps aliases to other warehouse files, attached read-only so the
+        query can join across warehouses as `alias.table`.
+        With QUERY_EXECUTOR set to "process" the query runs in a worker process.
+        """
+        if query_executor.enabled:
+            # Workers don't keep the slow query log, so whether to profile is decided here
+            profile = slow_query_log.is_slow_shape(query) if profile is None else profile
+            return self._run_in_worker("execute_query", database_path=database_path, query=query, timeout=timeout, limit=limit, params=params, warehouse_id=warehouse_id, source=source, attachments=attachments, profile=profile)
+
+        def fetch(conn, relation, query_profile):
+            # Statements without a result set (e.g. DDL) have already run
+            if relation is None:
+                return [], 0
+            if limit is not None:
+                relation = relation.limit(limit)
+            # Types are normalized inside DuckDB so rows come out JSON-ready
+            records = self._fetch_records(relation)
+            return records, len(records)
+
+        return self._run_query(database_path, query, fetch, timeout=timeout, params=params, warehouse_id=warehouse_id, source=source, attachments=attachments, profile=profile)
+
+    def execute_query_to_result(self, database_path: str, query: str, user_id: str, spill_rows: Optional[int] = None, page_rows: Optional[int] = None, timeout: Optional[float] = None, params: Optional[Dict[str, Any]] = None, warehouse_id: Optional[str] = None, source: Optional[str] = None, attachments: Optional[Dict[str, str]] = None, keep_result: bool = True) -> Dict[str, Any]:
+        """Run a query, returning up to `spill_rows` rows inline in `data`.
+
+        Larger results return their first `page_rows` rows with `truncated` set. With
+        `keep_result` the query's whole result is written once to a Parquet file, which
+        the rows and row count are read back from; large results keep the file as a
+        `result` handle (row count, columns and expiry) to page through, download, export
+        or chart later. Without it only `spill_rows` + 1 rows are fetched, which tells
+        whether the result fits, and `row_count` of a larger result is None.
+        In a query worker process the file is written there and registered here.
+        """
+        spill_rows = settings.RESULT_SPILL_ROWS if spill_rows is None else spill_rows
+        page_rows = settings.RESULT_PAGE_ROWS if page_rows is None else page_rows
+
+        arguments = {"database_path": database_path, "query": query, "spill_rows": spill_rows, "page_rows": page_rows, "keep_result": keep_result, "timeout": timeout, "params": params, "warehouse_id": warehouse_id, "source": source, "attachments": attachments}
+        if query_executor.enabled:
+            spilled = self._run_in_worker("_query_to_parquet", **arguments, profile=slow_query_log.is_slow_shape(query))
+        else:
+            spilled = self._query_to_parquet(**arguments)
+        if "path" not in spilled:
+            return spilled
+
+        # Handles live in this process, whichever process wrote the file
+        handle = result_store.register(user_id, spilled["path"], spilled["row_count"], spilled["columns"], warehouse_id=warehouse_id)
+        return {"data": spilled["data"], "row_count": spilled["row_count"], "truncated": True, "result": handle.to_dict()}
+
+    def _query_to_parquet(self, database_path: str, query: str, spill_rows: int, page_rows: int, keep_result: bool = True, timeout: Optional[float] = None, params: Optional[Dict[str, Any]] = None, warehouse_id: Optional[str] = None, source: Optional[str] = None, attachments: Optional[Dict[str, str]] = None, profile: Optional[bool] = None) -> Dict[str, Any]:
+        """Fetch a query's first rows, writing its whole result to a new result file when it is kept.
+
+        Returns the rows inline when there are at most `spill_rows`, otherwise the first
+        `page_rows` rows, with the file's `path` and `columns` for the caller to register
+        when `keep_result` is set. A kept query runs once: its rows and row count are read
+        back from the file, which is removed again when the rows fit inline.
+        """
+        def spill(conn, relation, query_profile):
+            if relation is None:
+                return {"data": [], "row_count": 0}, 0
+            if not keep_result:
+                # One row past the cap tells whether the result fits, without producing all of it
+                records = self._fetch_records(relation.limit(spill_rows + 1))
+                if len(records) <= spill_rows:
+                    return {"data": records, "row_count": len(records)}, len(records)
+                return {"data": records[:page_rows], "row_count": None, "truncated": True}, len(records)
+
+            stored, columns = self._result_file_relation(relation)
+            path = result_store.new_path()
+            try:
+                stored.write_parquet(path)
+                query_profile.stop()
+                # Parquet footers hold the row count, so this does not scan the file
+                row_count = conn.execute(f"SELECT count(*) FROM read_parquet({sql_literal(path)})").fetchone()[0]
+                result = self._read_result_file(conn, path, columns)
+                if row_count <= spill_rows:
+                    records = self._fetch_records(result)
+                    os.remove(path)
+                    return {"data": records, "row_count": row_count}, row_count
+                records = self._fetch_records(result.limit(page_rows))
+            except Exception:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise
+            return {"data": records, "row_count": row_count, "path": path, "columns": columns}, row_count
+
+        return self._run_query(database_path, query, spill, timeout=timeout, params=params, warehouse_id=warehouse_id, source=source, attachments=attachments, profile=profile)
+
+    @staticmethod
+    def _result_file_relation(relation) -> Tuple[Any, List[Dict[str, str]]]:
+        """Project a query's relation into the columns its result file stores, and list them.
+
+        Repeated column names get a suffix, ENUMs are stored as plain text and 128-bit
+        integers, which Parquet would round to DOUBLE, as exact text read back by
+        `_read_result_file`.
+        """
+        names = deduplicate_names(relation.columns)
+        columns = [{"name": name, "type": "VARCHAR" if column_type.id == "enum" else str(column_type)} for name, column_type in zip(names, relation.types)]
+        if names == relation.columns and not any(column_type.id in DuckDBHandler.WIDE_INTEGER_TYPES for column_type in relation.types):
+            return relation, columns
+
+        projection = ', '.join([
+            f"{f'CAST(#{position} AS VARCHAR)' if column_type.id in DuckDBHandler.WIDE_INTEGER_TYPES else f'#{position}'} AS {quote_identifier(name)}"
+            for position, (name, column_type) in enumerate(zip(names, relation.types), start=1)
+        ])
+        return relation.project(projection), columns
+
+    @staticmethod
+    def _read_result_file(conn, path: str, columns: List[Dict[str, str]]):
+        """Relation over a result file with its columns in their query's types."""
+        casts = [
+            f"CAST({quote_identifier(col['name'])} AS {col['type']}) AS {quote_identifier(col['name'])}"
+            for col in columns if col["type"].lower() in DuckDBHandler.WIDE_INTEGER_TYPES
+        ]
+        replace_clause = f" REPLACE ({', '.join(casts)})" if casts else ""
+        return conn.sql(f"SELECT *{replace_clause} FROM read_parquet({sql_literal(path)})")
+
+    def read_result(self, handle: ResultHandle, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Read rows of a spilled result, `limit` rows from `offset` on, without re-running its query."""
+        with self.get_connection(":memory:", read_only=False) as conn:
+            relation = self._read_result_file(conn, handle.path, handle.columns)
+            if limit is not None:
+                relation = relation.limit(limit, offset)
+            elif offset:
+                relation = relation.limit(handle.row_count, offset)
+            return self._fetch_records(relation)
+
+    def export_result(self, handle: ResultHandle, destination: str, file_format: str = "csv") -> int:
+        """Write a spilled result to `destination` as CSV or Parquet; returns the row count."""
+        if file_format not in ("csv", "parquet"):
+            raise ValueError("Invalid export format. Must be one of: csv, parquet")
+        with self.get_connection(":memory:", read_only=False) as conn:
+            options = "FORMAT csv, HEADER true" if file_format == "csv" else "FORMAT parquet"
+            return conn.execute(f"COPY (SELECT * FROM read_parquet({sql_literal(handle.path)})) TO {sql_literal(destination)} ({options})").fetchone()[0]
+
+    def profile_query(self, database_path: str, query: str, mode: str = "json", params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run a query with profiling and return its profile instead of its rows.
+
+        `json` returns DuckDB's full JSON profile (per-operator timings and cardinalities),
+        `explain_analyze` returns the rendered EXPLAIN ANALYZE plan.
+        """
+        if mode not in self.PROFILING_MODES:
+            raise ValueError(f"Invalid profiling mode. Must be one of: {', '.join(self.PROFILING_MODES)}")
+
+        timeout = settings.DUCKDB_QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+        try:
+            with self.get_connection(database_path) as conn:
+                if mode == "explain_analyze":
+                    if params:
+                        raise ValueError("Parameterized queries can only be profiled in json mode")
+                    with self._query_deadline(conn, timeout):
+                        plan = conn.execute(f"EXPLAIN ANALYZE {query.strip().rstrip(';')}").fetchone()[1]
+                    return {"mode": mode, "plan": plan}
+
+                with self._profiling(conn) as profile:
+                    with self._query_deadline(conn, timeout):
+                        relation = self._execute_with_params(conn, query, params)
+                        if relation is not None:
+                            relation.fetchall()
+                return {"mode": mode, "profile": profile}
+
+        except (QueryError, ValueError) as e:
+            logger.warning(f"Query rejected on DuckDB: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Error profiling query on DuckDB: {str(e)}")
+            raise Exception(str(e))
+
+    def estimate_row_count(self, database_path: str, query: str, params: Optional[Dict[str, Any]] = None, attachments: Optional[Dict[str, str]] = None) -> Optional[int]:
+        """Return the optimizer's cardinality estimate for a query without running it."""
+        try:
+            with self.get_connection(database_path) as conn:
+                if attachments:
+                    self._attach_databases(conn, attachments)
+                plan = conn.execute(f"EXPLAIN (FORMAT JSON) {query.strip().rstrip(';')}", params or None).fetchone()[1]
+
+            nodes = json.loads(plan)
+            while nodes:
+                node = nodes[0]
+                estimate = node.get("extra_info", {}).get("Estimated Cardinality")
+                if estimate is not None:
+                    return int(estimate)
+                nodes = node.get("children", [])
+            return None
+
+        except Exception as e:
+            logger.warning(f"Could not estimate row count on DuckDB: {str(e)}")
+            return None
@@ -85,6 +85,59 @@ class FileHandler:
         except Exception as e:
             raise IOError(f"Failed to upload file: {str(e)}")
 
+    def list_files(self, prefix: str) -> List[str]:
+        """List the storage paths of all files under a folder, recursively."""
+        if not self._bucket_name:
+            raise ValueError("Bucket name must be set before performing storage operations")
+
+        try:
+            paths = []
+            offset = 0
+            while True:
+                entries = supabase.storage.from_(self._bucket_name).list(prefix, {"limit": 1000, "offset": offset})
+                for entry in entries:
+                    path = f"{prefix}/{entry['name']}"
+                    # Folders have no object id
+                    if entry.get("id") is None:
+                        paths += self.list_files(path)
+                    else:
+                        paths.append(path)
+                if len(entries) < 1000:
+                    return paths
+                offset += len(entries)
+        except Exception as e:
+            raise IOError(f"Failed to list files: {str(e)}")
+
+    def remove_files(self, storage_paths: List[str]) -> None:
+        if not storage_paths:
+            return
+        try:
+            supabase.storage.from_(self._bucket_name).remove(storage_paths)
+        except Exception as e:
+            raise IOError(f"Failed to remove files: {str(e)}")
+
+    def sync_directory(self, prefix: str, local_dir: str) -> List[str]:
+        """Mirror a storage folder into a local directory, downloading only missing files.
+
+        Local files no longer in storage are removed. Returns the downloaded paths,
+        relative to the folder.
+        """
+        remote = {os.path.relpath(path, prefix) for path in self.list_files(prefix)}
+        os.makedirs(local_dir, exist_ok=True)
+        local = {
+            os.path.relpath(os.path.join(root, name), local_dir)
+            for root, _, names in os.walk(local_dir) for name in names
+        }
+
+        downloaded = []
+        for relative_path in sorted(remote - local):
+            local_path = os.path.join(local_dir, relative_path)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            self.download_file(f"{prefix}/{relative_path}", local_path)
+            downloaded.append(relative_path)
+        self.cleanup(*[os.path.join(local_dir, relative_path) for relative_path in local - remote])
+        return downloaded
+
     def cleanup(self, *file_paths: str) -> None:
         for path in file_paths:
             if path and os.path.exists(path):
@@ -0,0 +1,170 @@
+"""
+Background ingest jobs.
+This module runs dataset ingests on a bounded pool of worker threads so uploads don't
+hold an HTTP request open while the warehouse is downloaded, parsed and uploaded again.
+Jobs report their phase and progress, and can be cancelled while queued or running.
+Job state lives in the API process, like the slow query log.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Optional
+import logging
+import uuid
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class IngestCancelledError(Exception):
+    """Raised inside a job when it has been cancelled."""
+
+class IngestQueueFullError(Exception):
+    """Raised when too many ingest jobs are already waiting or running."""
+
+class IngestJob:
+    FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+    def __init__(self, user_id: str, kind: str, bytes_total: int):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.kind = kind
+        self.status = "queued"
+        self.phase = "queued"
+        self.bytes_total = bytes_total
+        self.bytes_parsed = 0
+        self.rows = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now(UTC).isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_requested = Event()
+        self._connection = None
+        self._lock = Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_requested.is_set()
+
+    def set_phase(self, phase: str, cancellable: bool = True) -> None:
+        """Move to the next phase, stopping here if the job was cancelled.
+
+        Phases past the point where a cancellation could be undone pass `cancellable=False`.
+        """
+        if cancellable:
+            self.check_cancelled()
+        self.phase = phase
+        logger.info(f"Ingest job {self.id} entered phase {phase}")
+
+    def check_cancelled(self) -> None:
+        if self.cancel_requested:
+            raise IngestCancelledError(f"Ingest job {self.id} was cancelled")
+
+    def attach_connection(self, conn) -> None:
+        """Register the DuckDB connection doing the work, so cancelling can interrupt it."""
+        with self._lock:
+            self._connection = conn
+        self.check_cancelled()
+
+    def detach_connection(self) -> None:
+        with self._lock:
+            self._connection = None
+
+    def cancel(self) -> bool:
+        """Request cancellation; returns False if the job has already finished."""
+        if self.status in self.FINISHED_STATUSES:
+            return False
+        self._cancel_requested.set()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.interrupt()
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "phase": self.phase,
+            "bytes_total": self.bytes_total,
+            "bytes_parsed": self.bytes_parsed,
+            "rows": self.rows,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class IngestJobQueue:
+    def __init__(self, max_workers: int, max_pending: int, history_size: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._max_pending = max_pending
+        self._history_size = history_size
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = Lock()
+
+    def submit(self, user_id: str, kind: str, bytes_total: int, work: Callable[[IngestJob], Any]) -> IngestJob:
+        """Queue `work(job)` to run on a worker; its return value becomes the job's result."""
+        job = IngestJob(user_id, kind, bytes_total)
+        with self._lock:
+            pending = sum(1 for existing in self._jobs.values() if existing.status in ("queued", "running"))
+            if pending >= self._max_pending:
+                raise IngestQueueFullError("Too many ingest jobs are in progress. Please try again later.")
+            self._jobs[job.id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: str, user_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if not job or job.user_id != user_id:
+            return None
+        return job
+
+    def cancel(self, job_id: str, user_id: str) -> Optional[IngestJob]:
+        job = self.get(job_id, user_id)
+        if job and job.cancel() and job.status == "queued":
+            # Queued jobs are skipped by the worker, so finish them right away
+            self._finish(job, "cancelled")
+        return job
+
+    def _run(self, job: IngestJob, work: Callable[[IngestJob], Any]) -> None:
+        if job.cancel_requested:
+            return
+        job.status = "running"
+        job.started_at = datetime.now(UTC).isoformat()
+        try:
+            job.check_cancelled()
+            job.result = work(job)
+            job.bytes_parsed = job.bytes_total
+            self._finish(job, "succeeded")
+        except Exception as e:
+            if job.cancel_requested:
+                self._finish(job, "cancelled")
+            else:
+                logger.error(f"Ingest job {job.id} failed: {e}")
+                job.error = str(e)
+                self._finish(job, "failed")
+        finally:
+            job.detach_connection()
+
+    def _finish(self, job: IngestJob, status: str) -> None:
+        job.status = status
+        job.phase = "done"
+        job.finished_at = datetime.now(UTC).isoformat()
+        logger.info(f"Ingest job {job.id} {status}")
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond the history size."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in IngestJob.FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(self._jobs) - self._history_size)]:
+            del self._jobs[job_id]
+
+# Process-wide ingest job queue
+ingest_jobs = IngestJobQueue(settings.INGEST_WORKERS, settings.INGEST_MAX_PENDING_JOBS, settings.INGEST_JOB_HISTORY_SIZE)
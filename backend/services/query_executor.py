@@ -0,0 +1,144 @@
+"""
+Process-pool query executor.
+With QUERY_EXECUTOR set to "process", warehouse queries run in a pool of worker processes
+instead of the Flask request thread, so a query that exhausts memory or crashes DuckDB
+takes down a worker rather than the API process and every chat streaming from it.
+A dead worker breaks the whole pool and fails every query on it, without telling which
+one killed it. Those queries each run again in a process of their own, where only the
+query that crashes again fails; at most QUERY_WORKER_MAX_ISOLATED_RETRIES of those run at
+once. Workers are capped at QUERY_WORKER_MEMORY_LIMIT of address space and replaced after
+QUERY_WORKER_MAX_TASKS queries. The API process still leases each query's threads and
+memory from its resource governor and hands that budget to the worker running it.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+from typing import Any, Dict, Optional
+import multiprocessing
+import logging
+from core.config import settings
+from .query_log import slow_query_log
+from .resource_governor import parse_memory_size, resource_governor
+
+logger = logging.getLogger(__name__)
+
+# Set in worker processes, which always run queries inline
+_in_worker = False
+
+def _initialize_worker(memory_limit_bytes: Optional[int]) -> None:
+    global _in_worker
+    _in_worker = True
+    if memory_limit_bytes:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+        except (ImportError, ValueError, OSError) as e:
+            logger.warning(f"Could not cap query worker memory: {e}")
+
+def _run_task(method_name: str, threads: int, memory_bytes: int, kwargs: Dict[str, Any]):
+    """Run a DuckDBHandler method in a worker; returns its result and the slow queries it logged."""
+    from .duckdb_handler import DuckDBHandler
+    with resource_governor.adopt(threads, memory_bytes):
+        result = getattr(DuckDBHandler(), method_name)(**kwargs)
+    return result, slow_query_log.drain()
+
+class QueryExecutor:
+    def __init__(self, processes: int, max_tasks: int, memory_limit: Optional[str], max_isolated_retries: int):
+        self.processes = processes
+        self.max_tasks = max_tasks
+        self.memory_limit_bytes = parse_memory_size(memory_limit) if memory_limit else None
+        self.max_isolated_retries = max_isolated_retries
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+        # A pool crash fails all its queries at once; their retries take turns for a process
+        self._isolated_slots = BoundedSemaphore(max_isolated_retries)
+        self._counters = {"completed": 0, "failed": 0, "retried": 0, "crashed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.QUERY_EXECUTOR == "process" and not _in_worker
+
+    def _create_pool(self, processes: int) -> ProcessPoolExecutor:
+        # Workers start from a clean server process, not a fork of the threaded API process
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=_initialize_worker,
+            initargs=(self.memory_limit_bytes,),
+            max_tasks_per_child=self.max_tasks
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._create_pool(self.processes)
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        # Queries still queued on it fail with BrokenProcessPool and run again on their own
+        pool.shutdown(wait=False)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _run_isolated(self, method_name: str, threads: int, memory_bytes: int, kwargs: Dict[str, Any]):
+        """Run a task in a process of its own, so that crashing it fails no other query."""
+        with self._isolated_slots:
+            pool = self._create_pool(1)
+            try:
+                return pool.submit(_run_task, method_name, threads, memory_bytes, kwargs).result()
+            finally:
+                pool.shutdown(wait=False)
+
+    def run(self, method_name: str, threads: int, memory_bytes: int, **kwargs) -> Any:
+        """Run `DuckDBHandler.<method_name>(**kwargs)` in a worker with the given budget.
+
+        When a worker dies, the pool is replaced and every query it failed runs again in
+        a process of its own. Raises BrokenProcessPool only for a query that crashes that
+        process too.
+        """
+        pool = self._get_pool()
+        try:
+            try:
+                result, slow_queries = pool.submit(_run_task, method_name, threads, memory_bytes, kwargs).result()
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                self._count("retried")
+                logger.warning(f"A query worker died, running {method_name} again in a process of its own")
+                result, slow_queries = self._run_isolated(method_name, threads, memory_bytes, kwargs)
+        except BrokenProcessPool:
+            self._count("crashed")
+            logger.error(f"A query worker died running {method_name} in a process of its own")
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+
+        self._count("completed")
+        for entry in slow_queries:
+            slow_query_log.add(entry)
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            running = self._pool is not None
+            counters = dict(self._counters)
+        return {
+            "mode": settings.QUERY_EXECUTOR,
+            "processes": self.processes,
+            "max_tasks_per_process": self.max_tasks,
+            "max_isolated_retries": self.max_isolated_retries,
+            "memory_limit_bytes": self.memory_limit_bytes,
+            "running": running,
+            "queries": counters
+        }
+
+# Process-wide executor shared by every DuckDBHandler
+query_executor = QueryExecutor(settings.QUERY_WORKER_PROCESSES, settings.QUERY_WORKER_MAX_TASKS, settings.QUERY_WORKER_MEMORY_LIMIT, settings.QUERY_WORKER_MAX_ISOLATED_RETRIES)
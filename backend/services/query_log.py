@@ -0,0 +1,101 @@
+"""
+Slow query log.
+This module keeps an in-process record of warehouse queries that ran longer than
+the configured threshold, so the hottest query shapes can be inspected through the admin API.
+"""
+
+from collections import deque
+from datetime import datetime, UTC
+from threading import Lock
+from typing import Dict, List, Optional
+import logging
+from core.config import settings
+from .utils.sql import fingerprint_query
+
+logger = logging.getLogger(__name__)
+
+class SlowQueryLog:
+    def __init__(self, max_entries: int):
+        self._entries = deque(maxlen=max_entries)
+        self._lock = Lock()
+
+    def record(self, query: str, duration: float, rows: int, rows_scanned: Optional[int] = None, result_bytes: Optional[int] = None, warehouse_id: Optional[str] = None, source: Optional[str] = None) -> Dict:
+        normalized_query, fingerprint = fingerprint_query(query)
+        entry = {
+            "fingerprint": fingerprint,
+            "normalized_query": normalized_query,
+            "query": query,
+            "warehouse_id": warehouse_id,
+            "source": source,
+            "duration": round(duration, 4),
+            "rows": rows,
+            "rows_scanned": rows_scanned,
+            "result_bytes": result_bytes,
+            "created_at": datetime.now(UTC).isoformat()
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+        logger.warning(f"Slow query ({duration:.3f}s) on warehouse {warehouse_id} from {source}: {normalized_query}")
+        return entry
+
+    def is_slow_shape(self, query: str) -> bool:
+        """Whether queries of the same shape as `query` were logged as slow recently."""
+        _, fingerprint = fingerprint_query(query)
+        with self._lock:
+            return any(entry["fingerprint"] == fingerprint for entry in self._entries)
+
+    def add(self, entry: Dict) -> None:
+        """Keep an entry recorded by another process, such as a query worker."""
+        with self._lock:
+            self._entries.append(entry)
+
+    def drain(self) -> List[Dict]:
+        """Remove and return all entries, oldest first."""
+        with self._lock:
+            entries = list(self._entries)
+            self._entries.clear()
+        return entries
+
+    def get_entries(self, limit: int = 100, warehouse_id: Optional[str] = None) -> List[Dict]:
+        """Return the most recent slow queries, newest first."""
+        with self._lock:
+            entries = list(self._entries)
+        if warehouse_id:
+            entries = [entry for entry in entries if entry["warehouse_id"] == warehouse_id]
+        return entries[::-1][:limit]
+
+    def get_hottest(self, limit: int = 20) -> List[Dict]:
+        """Aggregate slow queries by fingerprint, ordered by total time spent."""
+        with self._lock:
+            entries = list(self._entries)
+
+        shapes = {}
+        for entry in entries:
+            shape = shapes.setdefault(entry["fingerprint"], {
+                "fingerprint": entry["fingerprint"],
+                "normalized_query": entry["normalized_query"],
+                "count": 0,
+                "total_duration": 0.0,
+                "max_duration": 0.0,
+                "warehouses": set(),
+                "sources": set(),
+                "last_seen": None
+            })
+            shape["count"] += 1
+            shape["total_duration"] += entry["duration"]
+            shape["max_duration"] = max(shape["max_duration"], entry["duration"])
+            shape["warehouses"].add(entry["warehouse_id"])
+            shape["sources"].add(entry["source"])
+            shape["last_seen"] = entry["created_at"]
+
+        hottest = sorted(shapes.values(), key=lambda shape: shape["total_duration"], reverse=True)[:limit]
+        for shape in hottest:
+            shape["avg_duration"] = round(shape["total_duration"] / shape["count"], 4)
+            shape["total_duration"] = round(shape["total_duration"], 4)
+            shape["warehouses"] = sorted([w for w in shape["warehouses"] if w])
+            shape["sources"] = sorted([s for s in shape["sources"] if s])
+        return hottest
+
+# Process-wide slow query log
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_LOG_SIZE)
@@ -0,0 +1,189 @@
+"""
+Process-wide DuckDB resource governor.
+Every DuckDB connection is its own database instance that would otherwise assume it has
+the whole machine. The governor caps the threads and memory handed out across all open
+connections: each connection leases a budget before opening and returns it on close.
+When the process is busy, new connections get a smaller budget instead of oversubscribing,
+and once even the minimum budget is taken they wait for one to be released.
+"""
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+import logging
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SIZE_UNITS = {
+    "b": 1, "bytes": 1,
+    "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+    "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4
+}
+
+def parse_memory_size(value: str) -> int:
+    """Parse a DuckDB memory size such as "1GB" or "512MiB" into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([A-Za-z]*)\s*", str(value))
+    if not match or match.group(2).lower() not in _SIZE_UNITS | {"": 1}:
+        raise ValueError(f"Invalid memory size '{value}'")
+    return int(float(match.group(1)) * _SIZE_UNITS.get(match.group(2).lower(), 1))
+
+class ResourceLease:
+    """The threads and memory one connection may use."""
+
+    def __init__(self, threads: int, memory_bytes: int, degraded: bool):
+        self.threads = threads
+        self.memory_bytes = memory_bytes
+        self.degraded = degraded
+        # Nested connections opened by the same thread share the lease
+        self.depth = 1
+
+    def connection_config(self) -> Dict[str, str]:
+        """DuckDB config applying this lease to a new connection."""
+        config = {
+            "threads": self.threads,
+            "memory_limit": f"{self.memory_bytes}B",
+            "temp_directory": settings.DUCKDB_TEMP_DIRECTORY
+        }
+        if settings.DUCKDB_MAX_TEMP_DIRECTORY_SIZE:
+            config["max_temp_directory_size"] = settings.DUCKDB_MAX_TEMP_DIRECTORY_SIZE
+        return config
+
+class ResourceGovernor:
+    def __init__(self, max_threads: int, max_memory: str, connection_threads: int, connection_memory: str, min_memory: str):
+        self.max_threads = max_threads
+        self.max_memory_bytes = parse_memory_size(max_memory)
+        self.connection_threads = min(connection_threads, max_threads)
+        self.connection_memory_bytes = min(parse_memory_size(connection_memory), self.max_memory_bytes)
+        self.min_memory_bytes = min(parse_memory_size(min_memory), self.connection_memory_bytes)
+
+        self._threads_in_use = 0
+        self._memory_in_use = 0
+        self._active_leases = 0
+        self._waiting = 0
+        self._counters = {"granted": 0, "degraded": 0, "timed_out": 0}
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def _try_reserve(self) -> Optional[ResourceLease]:
+        """Reserve the largest budget available right now, down to the minimum."""
+        free_threads = self.max_threads - self._threads_in_use
+        free_memory = self.max_memory_bytes - self._memory_in_use
+        if free_threads < 1 or free_memory < self.min_memory_bytes:
+            return None
+
+        threads = min(self.connection_threads, free_threads)
+        memory_bytes = min(self.connection_memory_bytes, free_memory)
+        lease = ResourceLease(threads, memory_bytes, degraded=threads < self.connection_threads or memory_bytes < self.connection_memory_bytes)
+
+        self._threads_in_use += threads
+        self._memory_in_use += memory_bytes
+        self._active_leases += 1
+        self._counters["granted"] += 1
+        if lease.degraded:
+            self._counters["degraded"] += 1
+        return lease
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[ResourceLease]:
+        """Lease a connection budget, waiting up to `timeout` seconds for one to free up.
+
+        Returns None when the wait times out.
+        """
+        current = getattr(self._local, "lease", None)
+        if current:
+            current.depth += 1
+            return current
+
+        timeout = settings.DUCKDB_RESOURCE_WAIT_SECONDS if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            lease = self._try_reserve()
+            if not lease:
+                self._waiting += 1
+                try:
+                    while not lease:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._counters["timed_out"] += 1
+                            return None
+                        self._condition.wait(remaining)
+                        lease = self._try_reserve()
+                finally:
+                    self._waiting -= 1
+
+        if lease.degraded:
+            logger.info(f"DuckDB resources are busy, opening connection with {lease.threads} threads and {lease.memory_bytes} bytes of memory")
+        self._local.lease = lease
+        return lease
+
+    def release(self, lease: ResourceLease) -> None:
+        lease.depth -= 1
+        if lease.depth > 0:
+            return
+        self._local.lease = None
+        with self._condition:
+            self._threads_in_use -= lease.threads
+            self._memory_in_use -= lease.memory_bytes
+            self._active_leases -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def adopt(self, threads: int, memory_bytes: int):
+        """Run the block under a budget leased by another process's governor.
+
+        Query worker processes use it so the connections they open stay within the lease
+        the API process took for the query, instead of leasing from their own budget.
+        """
+        lease = ResourceLease(threads, memory_bytes, degraded=False)
+        self._local.lease = lease
+        try:
+            yield lease
+        finally:
+            self._local.lease = None
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Hold a connection budget for the duration of the block; yields None on timeout."""
+        lease = self.acquire(timeout)
+        try:
+            yield lease
+        finally:
+            if lease:
+                self.release(lease)
+
+    @staticmethod
+    def _spill_bytes() -> int:
+        total = 0
+        for root, _, files in os.walk(settings.DUCKDB_TEMP_DIRECTORY):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    # Spill files come and go while queries run
+                    continue
+        return total
+
+    def get_usage(self) -> Dict:
+        """Current budget usage across all open DuckDB connections."""
+        with self._condition:
+            usage = {
+                "threads": {"limit": self.max_threads, "in_use": self._threads_in_use, "per_connection": self.connection_threads},
+                "memory": {"limit_bytes": self.max_memory_bytes, "in_use_bytes": self._memory_in_use, "per_connection_bytes": self.connection_memory_bytes, "min_per_connection_bytes": self.min_memory_bytes},
+                "active_connections": self._active_leases,
+                "waiting_connections": self._waiting,
+                "leases": dict(self._counters)
+            }
+        usage["spill"] = {"directory": settings.DUCKDB_TEMP_DIRECTORY, "bytes": self._spill_bytes(), "limit": settings.DUCKDB_MAX_TEMP_DIRECTORY_SIZE}
+        return usage
+
+# Process-wide governor shared by every DuckDBHandler
+resource_governor = ResourceGovernor(
+    max_threads=settings.DUCKDB_MAX_TOTAL_THREADS,
+    max_memory=settings.DUCKDB_MAX_TOTAL_MEMORY,
+    connection_threads=settings.DUCKDB_THREADS,
+    connection_memory=settings.DUCKDB_MEMORY_LIMIT,
+    min_memory=settings.DUCKDB_MIN_MEMORY_LIMIT
+)
@@ -0,0 +1,103 @@
+"""
+Spilled query results.
+Results too large to return in one response are written once to a Parquet file in the
+result directory and referenced by a handle holding their row count, columns and expiry.
+Callers page through a handle, download it, or export and chart it without running the
+query again. Handles live in the API process, like the ingest jobs, and their files are
+removed when they expire or when too many handles are open.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, UTC
+from threading import Lock
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import uuid
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ResultHandle:
+    def __init__(self, user_id: str, path: str, row_count: int, columns: List[Dict[str, str]], warehouse_id: Optional[str] = None, ttl_seconds: int = 3600):
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        self.user_id = user_id
+        self.warehouse_id = warehouse_id
+        self.path = path
+        self.row_count = row_count
+        self.columns = columns
+        self.size_bytes = os.path.getsize(path)
+        now = datetime.now(UTC)
+        self.created_at = now.isoformat()
+        self.expires_at = (now + timedelta(seconds=ttl_seconds)).isoformat()
+
+    @property
+    def expired(self) -> bool:
+        return datetime.now(UTC).isoformat() >= self.expires_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "warehouse_id": self.warehouse_id,
+            "row_count": self.row_count,
+            "columns": self.columns,
+            "size_bytes": self.size_bytes,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at
+        }
+
+class ResultStore:
+    def __init__(self, directory: str, ttl_seconds: int, max_handles: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_handles = max_handles
+        self._handles: "OrderedDict[str, ResultHandle]" = OrderedDict()
+        self._lock = Lock()
+
+    def new_path(self) -> str:
+        """Path for the Parquet file of a new result."""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{uuid.uuid4()}.parquet")
+
+    def register(self, user_id: str, path: str, row_count: int, columns: List[Dict[str, str]], warehouse_id: Optional[str] = None) -> ResultHandle:
+        """Keep a written result file, returning the handle to fetch it with."""
+        handle = ResultHandle(user_id, path, row_count, columns, warehouse_id=warehouse_id, ttl_seconds=self.ttl_seconds)
+        with self._lock:
+            self._handles[handle.id] = handle
+            self._prune()
+        logger.info(f"Spilled a result of {row_count} rows ({handle.size_bytes} bytes) to {path}")
+        return handle
+
+    def get(self, result_id: str, user_id: str) -> Optional[ResultHandle]:
+        """Return a user's result, or None if it does not exist or has expired."""
+        with self._lock:
+            self._prune()
+            handle = self._handles.get(result_id)
+        if not handle or handle.user_id != user_id:
+            return None
+        return handle
+
+    def delete(self, result_id: str, user_id: str) -> bool:
+        with self._lock:
+            handle = self._handles.get(result_id)
+            if not handle or handle.user_id != user_id:
+                return False
+            self._remove(handle)
+        return True
+
+    def _remove(self, handle: ResultHandle) -> None:
+        self._handles.pop(handle.id, None)
+        try:
+            os.remove(handle.path)
+        except OSError as e:
+            logger.warning(f"Could not remove result file {handle.path}: {e}")
+
+    def _prune(self) -> None:
+        """Drop expired results, then the oldest ones beyond the handle limit."""
+        for handle in [handle for handle in self._handles.values() if handle.expired]:
+            self._remove(handle)
+        while len(self._handles) > self.max_handles:
+            self._remove(next(iter(self._handles.values())))
+
+# Process-wide store shared by the query API and the agent tools
+result_store = ResultStore(settings.RESULT_DIRECTORY, settings.RESULT_TTL_SECONDS, settings.RESULT_MAX_HANDLES)
@@ -0,0 +1,107 @@
+"""
+File format detection for dataset uploads.
+This module identifies an uploaded file's format and compression from its magic bytes,
+falling back to the declared extension only for plain text files, and unpacks
+multi-file zip archives so their members can be read by DuckDB.
+"""
+
+import gzip
+import os
+import shutil
+import zipfile
+from typing import List, Optional, Tuple
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZIP_MAGIC = b"PK\x03\x04"
+PARQUET_MAGIC = b"PAR1"
+
+# Compression suffixes that may follow the real extension, e.g. "sales.csv.gz"
+COMPRESSION_EXTENSIONS = {"gz": "gzip", "gzip": "gzip", "zst": "zstd", "zstd": "zstd"}
+
+# Declared extensions mapped to the format used to read them
+TEXT_FORMATS = {"csv": "csv", "tsv": "csv", "txt": "csv", "json": "json", "ndjson": "ndjson", "jsonl": "ndjson"}
+
+ARCHIVE_MEMBER_FORMATS = {"csv": "csv", "tsv": "csv", "parquet": "parquet", "json": "json", "ndjson": "ndjson", "jsonl": "ndjson"}
+
+SNIFF_SIZE = 4096
+
+def parse_file_type(filename: str) -> str:
+    """Get the file type from a filename, keeping compression suffixes (e.g. "csv.gz")."""
+    parts = os.path.basename(filename).lower().split(".")[1:]
+    if len(parts) >= 2 and parts[-1] in COMPRESSION_EXTENSIONS:
+        return ".".join(parts[-2:])
+    return parts[-1] if parts else ""
+
+def _sniff_text_format(head: bytes) -> str:
+    """Tell JSON (documents or newline-delimited) apart from delimited text."""
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    return "json" if text.startswith((b"[", b"{")) else "csv"
+
+def detect_file_format(path: str, file_type: str) -> Tuple[str, Optional[str]]:
+    """Return the (format, compression) of a file.
+
+    Format is one of csv, json, ndjson, parquet, xlsx or zip; compression is
+    gzip, zstd or None.
+    """
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_SIZE)
+
+    declared_parts = (file_type or "").lower().split(".")
+    declared_format = TEXT_FORMATS.get(declared_parts[0])
+
+    if head.startswith(PARQUET_MAGIC):
+        return "parquet", None
+
+    if head.startswith(ZIP_MAGIC):
+        with zipfile.ZipFile(path) as archive:
+            names = archive.namelist()
+        if "[Content_Types].xml" in names and any(name.startswith("xl/") for name in names):
+            return "xlsx", None
+        return "zip", None
+
+    if head.startswith(GZIP_MAGIC):
+        if declared_format:
+            return declared_format, "gzip"
+        # Only decompress the first few KB to sniff the payload
+        with gzip.open(path, "rb") as f:
+            return _sniff_text_format(f.read(SNIFF_SIZE)), "gzip"
+
+    if head.startswith(ZSTD_MAGIC):
+        return declared_format or "csv", "zstd"
+
+    if declared_format:
+        return declared_format, None
+    return _sniff_text_format(head), None
+
+def extract_archive(path: str, destination: str) -> Tuple[str, List[str]]:
+    """Stream the data members of a zip archive into `destination`.
+
+    Returns the members' common format and their extracted paths.
+    """
+    extracted_paths = []
+    member_formats = set()
+
+    with zipfile.ZipFile(path) as archive:
+        for index, member in enumerate(archive.infolist()):
+            name = os.path.basename(member.filename)
+            if member.is_dir() or not name or name.startswith(".") or member.filename.startswith("__MACOSX/"):
+                continue
+
+            member_format = ARCHIVE_MEMBER_FORMATS.get(parse_file_type(name).split(".")[0])
+            if not member_format:
+                continue
+            member_formats.add(member_format)
+
+            # Prefix with the member index so equal names in different folders don't collide
+            member_path = os.path.join(destination, f"{index}_{name}")
+            with archive.open(member) as source, open(member_path, "wb") as target:
+                shutil.copyfileobj(source, target)
+            extracted_paths.append(member_path)
+
+    if not extracted_paths:
+        raise ValueError("Zip archive does not contain any CSV, JSON or Parquet files")
+    if len(member_formats) > 1:
+        raise ValueError(f"Zip archive mixes file formats ({', '.join(sorted(member_formats))}); upload one format per archive")
+
+    return member_formats.pop(), extracted_paths
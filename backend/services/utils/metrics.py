@@ -0,0 +1,173 @@
+"""
+Semantic metrics layer.
+A warehouse's semantic model names business metrics (aggregate SQL expressions over a
+table, e.g. revenue = SUM(amount)) and the dimensions they can be broken down by. A
+metric query picks metrics, dimensions, an optional time grain and filters by name and
+is compiled to one aggregate SELECT, which the query engine routes to a rollup when one
+can answer it.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from .query_tree import parse_query, select_node
+from .rollups import TIME_GRAINS
+from .sql import quote_identifier
+
+NAME_PATTERN = r"[a-z_][a-z0-9_]*"
+
+# Filter operators mapped to the SQL they compile to; `value` is a query parameter
+FILTER_OPERATORS = {
+    "=": "{expression} = {value}",
+    "!=": "{expression} <> {value}",
+    ">": "{expression} > {value}",
+    ">=": "{expression} >= {value}",
+    "<": "{expression} < {value}",
+    "<=": "{expression} <= {value}",
+    "in": "list_contains({value}, {expression})",
+    "not_in": "NOT list_contains({value}, {expression})"
+}
+
+def _validate_definition(definition: Any, kind: str) -> Dict[str, Any]:
+    if not isinstance(definition, dict):
+        raise ValueError(f"Each {kind} must be an object with a name, table and expression")
+    unknown = [key for key in definition if key not in ("name", "table", "expression", "description", "time_column")]
+    if unknown or (kind == "dimension" and "time_column" in definition):
+        raise ValueError(f"Unknown {kind} fields: {', '.join(unknown or ['time_column'])}")
+    name = definition.get("name")
+    if not isinstance(name, str) or not re.fullmatch(NAME_PATTERN, name):
+        raise ValueError(f"Invalid {kind} name '{name}': use lowercase letters, digits and underscores, not starting with a digit")
+    for field in ("table", "expression"):
+        if not isinstance(definition.get(field), str) or not definition[field].strip():
+            raise ValueError(f"The {kind} {name} requires a {field}")
+    for field in ("description", "time_column"):
+        if definition.get(field) is not None and not isinstance(definition[field], str):
+            raise ValueError(f"The {field} of the {kind} {name} must be a string")
+    return {key: value.strip() if isinstance(value, str) else value for key, value in definition.items()}
+
+def validate_semantic_model(model: Any) -> Dict[str, List[Dict[str, Any]]]:
+    """Check the shape of a semantic model and return it normalized.
+
+    Whether the tables, columns and expressions exist is checked against the warehouse
+    by DuckDBHandler.check_semantic_model.
+    """
+    if not isinstance(model, dict):
+        raise ValueError("The semantic model must be an object with metrics and dimensions")
+    unknown = [key for key in model if key not in ("metrics", "dimensions")]
+    if unknown:
+        raise ValueError(f"Unknown semantic model fields: {', '.join(unknown)}. Must be one of: metrics, dimensions")
+
+    normalized = {}
+    for kind, key in (("metric", "metrics"), ("dimension", "dimensions")):
+        definitions = model.get(key) or []
+        if not isinstance(definitions, list):
+            raise ValueError(f"{key} must be a list")
+        normalized[key] = [_validate_definition(definition, kind) for definition in definitions]
+
+    names = [definition["name"] for definition in normalized["metrics"] + normalized["dimensions"]]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Metric and dimension names must be unique: {', '.join(duplicates)}")
+    return normalized
+
+def parse_single_expression(conn, expression: str) -> Dict[str, Any]:
+    """Parse a definition's expression, rejecting anything but one unaliased SQL expression."""
+    node = select_node(parse_query(conn, f"SELECT {expression}"))
+    if not node or len(node["select_list"]) != 1 or node["select_list"][0].get("alias") or node.get("from_table", {}).get("type") != "EMPTY":
+        raise ValueError(f"'{expression}' is not a single SQL expression")
+    return node["select_list"][0]
+
+def _lookup(definitions: List[Dict[str, Any]], names: List[str], kind: str) -> List[Dict[str, Any]]:
+    by_name = {definition["name"]: definition for definition in definitions}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        available = ', '.join(by_name) or 'none'
+        raise ValueError(f"Unknown {kind}s: {', '.join(unknown)}. Available {kind}s: {available}")
+    return [by_name[name] for name in names]
+
+def compile_metric_query(
+    model: Dict[str, List[Dict[str, Any]]],
+    metrics: List[str],
+    dimensions: Optional[List[str]] = None,
+    time_grain: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    filters: Optional[List[Dict[str, Any]]] = None,
+    order_by: Optional[str] = None,
+    descending: bool = True
+) -> Tuple[str, Dict[str, Any]]:
+    """Compile a metric query to SQL and its `$parameters`.
+
+    All metrics and dimensions must come from the same table. `time_grain` groups by the
+    metrics' time column truncated to that grain; `start` (inclusive) and `end`
+    (exclusive) are dates bounding it. `filters` are {dimension, operator, value}
+    conditions. Rows are ordered by `order_by` (a selected metric or dimension), or by
+    the time period and then the dimensions.
+    """
+    if not metrics:
+        raise ValueError("At least one metric is required")
+    metric_definitions = _lookup(model.get("metrics") or [], metrics, "metric")
+    dimension_definitions = _lookup(model.get("dimensions") or [], dimensions or [], "dimension")
+    filters = filters or []
+    filter_definitions = _lookup(model.get("dimensions") or [], [item.get("dimension") for item in filters], "dimension")
+
+    tables = {definition["table"] for definition in metric_definitions + dimension_definitions + filter_definitions}
+    if len(tables) > 1:
+        raise ValueError(f"Metrics and dimensions of one query must come from the same table, got: {', '.join(sorted(tables))}")
+    table = tables.pop()
+
+    time_column = None
+    if time_grain or start or end:
+        time_columns = {definition.get("time_column") for definition in metric_definitions}
+        if len(time_columns) != 1 or None in time_columns:
+            raise ValueError("Time grains and date ranges need metrics sharing one time_column")
+        time_column = quote_identifier(time_columns.pop())
+    if time_grain and time_grain not in TIME_GRAINS:
+        raise ValueError(f"Invalid time grain: {time_grain}. Must be one of: {', '.join(TIME_GRAINS)}")
+
+    output_names = ([time_grain] if time_grain else []) + [definition["name"] for definition in dimension_definitions + metric_definitions]
+    if len(set(output_names)) != len(output_names):
+        raise ValueError("Dimensions must not repeat or be named after the time grain")
+
+    group_expressions = []
+    select_list = []
+    if time_grain:
+        group_expressions.append(f"date_trunc('{time_grain}', {time_column})")
+        select_list.append(f"{group_expressions[-1]} AS {quote_identifier(time_grain)}")
+    for definition in dimension_definitions:
+        group_expressions.append(f"({definition['expression']})")
+        select_list.append(f"{group_expressions[-1]} AS {quote_identifier(definition['name'])}")
+    for definition in metric_definitions:
+        select_list.append(f"({definition['expression']}) AS {quote_identifier(definition['name'])}")
+
+    params = {}
+    conditions = []
+    # Day-truncated bounds are exact for dates and still let day-grain rollups answer
+    if start:
+        params["period_start"] = start
+        conditions.append(f"date_trunc('day', {time_column}) >= CAST($period_start AS DATE)")
+    if end:
+        params["period_end"] = end
+        conditions.append(f"date_trunc('day', {time_column}) < CAST($period_end AS DATE)")
+    for index, (item, definition) in enumerate(zip(filters, filter_definitions)):
+        operator = item.get("operator", "=")
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Invalid filter operator: {operator}. Must be one of: {', '.join(FILTER_OPERATORS)}")
+        value = item.get("value")
+        if operator in ("in", "not_in") and not isinstance(value, list):
+            raise ValueError(f"The {operator} filter on {definition['name']} needs a list of values")
+        params[f"filter_{index}"] = value
+        conditions.append(FILTER_OPERATORS[operator].format(expression=f"({definition['expression']})", value=f"$filter_{index}"))
+
+    if order_by:
+        if order_by not in output_names:
+            raise ValueError(f"Can only order by a selected metric or dimension: {', '.join(output_names)}")
+        order_clause = f" ORDER BY {quote_identifier(order_by)} {'DESC' if descending else 'ASC'} NULLS LAST"
+    elif group_expressions:
+        order_clause = f" ORDER BY {', '.join(str(position) for position in range(1, len(group_expressions) + 1))}"
+    else:
+        order_clause = ""
+
+    where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    group_clause = f" GROUP BY {', '.join(group_expressions)}" if group_expressions else ""
+    query = f"SELECT {', '.join(select_list)} FROM {quote_identifier(table)}{where_clause}{group_clause}{order_clause}"
+    return query, params
@@ -0,0 +1,70 @@
+"""
+Nested JSON flattening at ingest.
+Struct columns read from JSON are expanded into one top-level column per leaf field, named
+by joining the field path with underscores (`address.city` becomes `address_city`). List
+columns can be split into child tables holding one row per element, linked to the parent
+row through a generated row id.
+"""
+
+from typing import Callable, List, Tuple
+from .sql import quote_identifier, sql_literal
+
+ROW_ID_COLUMN = "_row_id"
+POSITION_COLUMN = "position"
+VALUE_COLUMN = "value"
+
+def _leaf_fields(expression: str, path: List[str], column_type) -> List[Tuple[str, List[str]]]:
+    """Expand a (possibly nested) struct expression into its leaf field expressions and paths."""
+    if column_type.id != "struct":
+        return [(expression, path)]
+    leaves = []
+    for field_name, field_type in column_type.children:
+        leaves += _leaf_fields(f"struct_extract({expression}, {sql_literal(field_name)})", path + [field_name], field_type)
+    return leaves
+
+def _unique_name(name: str, taken: set) -> str:
+    unique_name, suffix = name, 2
+    while unique_name in taken:
+        unique_name = f"{name}_{suffix}"
+        suffix += 1
+    taken.add(unique_name)
+    return unique_name
+
+def flatten_structs_sql(conn, select_sql: str, standardize: Callable[[str], str]) -> Tuple[str, List[str]]:
+    """Wrap a query so its struct columns come out as flat top-level columns.
+
+    Returns the query and the names of its list columns, which stay nested.
+    """
+    relation = conn.sql(select_sql)
+    taken = set()
+    projections = []
+    list_columns = []
+    for column, column_type in zip(relation.columns, relation.types):
+        for expression, path in _leaf_fields(quote_identifier(column), [column], column_type):
+            name = _unique_name(standardize("_".join(path)), taken)
+            projections.append(f"{expression} AS {quote_identifier(name)}")
+        if column_type.id == "list":
+            list_columns.append(standardize(column))
+    return f"SELECT {', '.join(projections)} FROM ({select_sql})", list_columns
+
+def child_table_sql(conn, quoted_parent: str, list_column: str, standardize: Callable[[str], str]) -> str:
+    """Build the query turning a parent's list column into one row per element.
+
+    Rows carry the parent's row id and the element's 1-based position; struct elements
+    are flattened into their fields, other elements land in a `value` column.
+    """
+    quoted_column = quote_identifier(list_column)
+    elements_sql = (
+        f"SELECT {quote_identifier(ROW_ID_COLUMN)}, generate_subscripts({quoted_column}, 1) AS {quote_identifier(POSITION_COLUMN)}, "
+        f"unnest({quoted_column}) AS {quote_identifier(VALUE_COLUMN)} FROM {quoted_parent}"
+    )
+    element_type = conn.sql(elements_sql).types[2]
+    if element_type.id != "struct":
+        return elements_sql
+
+    taken = {ROW_ID_COLUMN, POSITION_COLUMN}
+    projections = [quote_identifier(ROW_ID_COLUMN), quote_identifier(POSITION_COLUMN)]
+    for expression, path in _leaf_fields(quote_identifier(VALUE_COLUMN), [], element_type):
+        name = _unique_name(standardize("_".join(path)), taken)
+        projections.append(f"{expression} AS {quote_identifier(name)}")
+    return f"SELECT {', '.join(projections)} FROM ({elements_sql})"
@@ -0,0 +1,89 @@
+"""
+Parsed query trees.
+Helpers around DuckDB's json_serialize_sql and json_deserialize_sql, used to inspect
+and rewrite queries structurally instead of with string manipulation.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Set
+
+def parse_query(conn, query: str) -> Dict[str, Any]:
+    """Parse a query into DuckDB's JSON tree; non-SELECT statements come back with "error" set."""
+    return json.loads(conn.execute("SELECT json_serialize_sql(?)", [query]).fetchone()[0])
+
+def render_query(conn, tree: Dict[str, Any]) -> str:
+    """Render a parsed tree back to SQL."""
+    return conn.execute("SELECT json_deserialize_sql(?)", [json.dumps(tree)]).fetchone()[0]
+
+def select_node(tree: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the SELECT node of a single-statement query, or None."""
+    statements = tree.get("statements") or []
+    if tree.get("error") or len(statements) != 1:
+        return None
+    node = statements[0]["node"]
+    return node if node.get("type") == "SELECT_NODE" else None
+
+def replace_select_node(tree: Dict[str, Any], node: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of a single-statement tree with its SELECT node replaced."""
+    return {**tree, "statements": [{**tree["statements"][0], "node": node}]}
+
+def parse_expressions(conn, expressions: List[str]) -> List[Dict[str, Any]]:
+    """Parse SQL expressions into their JSON trees, in one round trip."""
+    tree = parse_query(conn, f"SELECT {', '.join(expressions)}")
+    return select_node(tree)["select_list"]
+
+def render_expressions(conn, expressions: List[Dict[str, Any]]) -> List[str]:
+    """Render parsed expressions back to SQL, which is also how DuckDB names unaliased columns."""
+    if not expressions:
+        return []
+    trees = [json.dumps({
+        "error": False,
+        "statements": [{
+            "node": {
+                "type": "SELECT_NODE", "modifiers": [], "cte_map": {"map": []}, "select_list": [{**expression, "alias": ""}],
+                "from_table": {"type": "EMPTY", "alias": "", "sample": None, "query_location": 0},
+                "where_clause": None, "group_expressions": [], "group_sets": [], "aggregate_handling": "STANDARD_HANDLING",
+                "having": None, "sample": None, "qualify": None
+            },
+            "named_param_map": []
+        }]
+    }) for expression in expressions]
+    placeholders = ', '.join(["json_deserialize_sql(?)"] * len(trees))
+    rendered = conn.execute(f"SELECT {placeholders}", trees).fetchone()
+    return [text[len("SELECT "):] for text in rendered]
+
+def output_names(conn, tree: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Column names the select list of a parsed query produces, one per expression.
+
+    The names come from DuckDB binding the query, so they are the ones the query's own
+    result has: `t.amount` is named `amount`, with the column's case from the catalog.
+    `params` are the values of its `$name` parameters. Star expressions expand to
+    several columns and get an empty name.
+    """
+    node = select_node(tree)
+    named = [expression for expression in node["select_list"] if expression.get("class") != "STAR"]
+    columns = []
+    if named:
+        query = render_query(conn, replace_select_node(tree, {**node, "select_list": named}))
+        columns = conn.sql(query, params=params or None).columns
+    columns = iter(columns)
+    return ["" if expression.get("class") == "STAR" else next(columns) for expression in node["select_list"]]
+
+def keep_output_names(conn, original: Dict[str, Any], rewritten: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> None:
+    """Alias the rewritten select list with the original column names, in place."""
+    rewritten_list = select_node(rewritten)["select_list"]
+    for index, name in enumerate(output_names(conn, original, params)):
+        if name:
+            rewritten_list[index]["alias"] = name
+
+def has_aggregate(expression: Any, aggregate_functions: Set[str]) -> bool:
+    """Whether a parsed expression (or list of them) calls an aggregate function."""
+    if isinstance(expression, list):
+        return any(has_aggregate(item, aggregate_functions) for item in expression)
+    if not isinstance(expression, dict):
+        return False
+    if expression.get("class") == "FUNCTION":
+        function_name = expression["function_name"].lower()
+        if function_name in aggregate_functions or function_name == "count_star":
+            return True
+    return any(has_aggregate(value, aggregate_functions) for value in expression.values())
@@ -0,0 +1,217 @@
+"""
+Rollup materialization and query routing.
+A rollup pre-aggregates a dataset by a set of dimensions and an optional time grain,
+storing the sum, count, min and max of each measure. Aggregate queries over the base
+table whose grouping, filters and aggregates can be answered from those partial
+aggregates are rewritten, on DuckDB's parsed query tree, to read the rollup instead.
+"""
+
+import copy
+from typing import Any, Dict, List, Optional, Set
+from .query_tree import has_aggregate, parse_expressions, replace_select_node, select_node
+from .sql import quote_identifier
+
+TIME_GRAINS = ("day", "week", "month", "quarter", "year")
+
+# Grains a rollup at a given grain can be re-truncated to without losing correctness
+_COMPATIBLE_GRAINS = {
+    "day": {"day", "week", "month", "quarter", "year"},
+    "week": {"week"},
+    "month": {"month", "quarter", "year"},
+    "quarter": {"quarter", "year"},
+    "year": {"year"}
+}
+
+ROW_COUNT_COLUMN = "__rows"
+
+# Aggregates over a measure mapped to the expression that answers them from a rollup
+_AGGREGATE_REWRITES = {
+    "sum": "sum({sum})",
+    "count": "CAST(sum({count}) AS BIGINT)",
+    "min": "min({min})",
+    "max": "max({max})",
+    "avg": "CAST(sum({sum}) AS DOUBLE) / sum({count})"
+}
+
+_ALLOWED_EXPRESSION_CLASSES = {"COLUMN_REF", "CONSTANT", "FUNCTION", "OPERATOR", "COMPARISON", "CONJUNCTION", "CASE", "CAST", "BETWEEN", "PARAMETER"}
+
+class NotRoutable(Exception):
+    """Raised when a query cannot be answered from a rollup."""
+
+def measure_column(aggregate: str, column: str) -> str:
+    """Name of the rollup column holding `aggregate` of a measure."""
+    return f"{aggregate}_{column}"
+
+def rollup_select_sql(quoted_table_name: str, rollup: Dict[str, Any]) -> str:
+    """Build the aggregate query that materializes a rollup."""
+    group_columns = [quote_identifier(col) for col in rollup["dimensions"]]
+    select_columns = list(group_columns)
+    if rollup.get("time_column"):
+        time_column = quote_identifier(rollup["time_column"])
+        truncated = f"date_trunc('{rollup['time_grain']}', {time_column})"
+        select_columns.append(f"{truncated} AS {time_column}")
+        # GROUP BY binds the name to the base column before the alias
+        group_columns.append(truncated)
+
+    for column in rollup["measures"]:
+        quoted_column = quote_identifier(column)
+        for aggregate in ("sum", "count", "min", "max"):
+            select_columns.append(f"{aggregate}({quoted_column}) AS {quote_identifier(measure_column(aggregate, column))}")
+    select_columns.append(f"count(*) AS {quote_identifier(ROW_COUNT_COLUMN)}")
+
+    group_clause = f" GROUP BY {', '.join(group_columns)}" if group_columns else ""
+    return f"SELECT {', '.join(select_columns)} FROM {quoted_table_name}{group_clause}"
+
+def appended_rollup_sql(quoted_rollup_table: str, quoted_appended_table: str, rollup: Dict[str, Any]) -> str:
+    """Build the query folding the rollup of newly appended rows into an existing rollup.
+
+    Partial sums and counts add up and minimums and maximums combine, so the result
+    equals a rebuild over the whole table as long as no rows were deleted.
+    """
+    group_columns = [quote_identifier(col) for col in rollup["dimensions"]]
+    if rollup.get("time_column"):
+        group_columns.append(quote_identifier(rollup["time_column"]))
+
+    select_columns = list(group_columns)
+    for column in rollup["measures"]:
+        for aggregate, merge in (("sum", "sum({column})"), ("count", "CAST(sum({column}) AS BIGINT)"), ("min", "min({column})"), ("max", "max({column})")):
+            quoted_column = quote_identifier(measure_column(aggregate, column))
+            select_columns.append(f"{merge.format(column=quoted_column)} AS {quoted_column}")
+    select_columns.append(f"CAST(sum({quote_identifier(ROW_COUNT_COLUMN)}) AS BIGINT) AS {quote_identifier(ROW_COUNT_COLUMN)}")
+
+    group_clause = f" GROUP BY {', '.join(group_columns)}" if group_columns else ""
+    return (
+        f"SELECT {', '.join(select_columns)} FROM ("
+        f"SELECT * FROM {quoted_rollup_table} UNION ALL BY NAME {rollup_select_sql(quoted_appended_table, rollup)}"
+        f"){group_clause}"
+    )
+
+class _RollupRewriter:
+    """Rewrites the expressions of a parsed SELECT so they read from a rollup."""
+
+    def __init__(self, rollup: Dict[str, Any], table_names: Set[str], select_aliases: Set[str], aggregate_functions: Set[str], templates: Dict[str, Dict[str, Any]]):
+        self.rollup = rollup
+        # Identifiers are case-insensitive in DuckDB
+        self.dimensions = {col.lower() for col in rollup["dimensions"]}
+        self.measures = {col.lower() for col in rollup["measures"]}
+        self.time_column = (rollup.get("time_column") or "").lower() or None
+        self.table_names = table_names
+        self.select_aliases = select_aliases
+        self.aggregate_functions = aggregate_functions
+        self.templates = templates
+
+    def _column_name(self, expression: Dict[str, Any]) -> str:
+        names = expression["column_names"]
+        if len(names) == 2 and names[0].lower() in self.table_names:
+            return names[1].lower()
+        if len(names) != 1:
+            raise NotRoutable("qualified column reference")
+        return names[0].lower()
+
+    def _is_time_column(self, expression: Dict[str, Any]) -> bool:
+        return expression.get("class") == "COLUMN_REF" and self.time_column is not None and self._column_name(expression) == self.time_column
+
+    def rewrite(self, expression: Any) -> Any:
+        if isinstance(expression, list):
+            return [self.rewrite(item) for item in expression]
+        if not isinstance(expression, dict):
+            return expression
+        if "class" not in expression:
+            return {key: self.rewrite(value) for key, value in expression.items()}
+
+        expression_class = expression["class"]
+        if expression_class not in _ALLOWED_EXPRESSION_CLASSES:
+            raise NotRoutable(f"unsupported expression {expression_class}")
+
+        if expression_class == "COLUMN_REF":
+            name = self._column_name(expression)
+            if name in self.dimensions:
+                return {**expression, "column_names": [name]}
+            if name in self.select_aliases and len(expression["column_names"]) == 1:
+                return expression
+            # Measures are only available aggregated and the time column only truncated
+            raise NotRoutable(f"column {name} is not a rollup dimension")
+
+        if expression_class == "FUNCTION":
+            function_name = expression["function_name"].lower()
+            children = expression.get("children", [])
+
+            if function_name == "date_trunc" and len(children) == 2 and self._is_time_column(children[1]):
+                part = children[0]
+                if part.get("class") != "CONSTANT" or str(part["value"].get("value", "")).lower() not in _COMPATIBLE_GRAINS[self.rollup["time_grain"]]:
+                    raise NotRoutable("time grain is finer than the rollup")
+                return {**expression, "children": [part, {**children[1], "column_names": [self.time_column]}]}
+
+            if function_name in self.aggregate_functions or function_name == "count_star":
+                return self._rewrite_aggregate(expression, function_name, children)
+
+        return {key: self.rewrite(value) for key, value in expression.items()}
+
+    def _rewrite_aggregate(self, expression: Dict[str, Any], function_name: str, children: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if expression.get("distinct") or expression.get("filter") or (expression.get("order_bys") or {}).get("orders"):
+            raise NotRoutable("aggregate modifiers")
+
+        if function_name == "count_star":
+            template = self.templates["count_star"]
+        elif function_name in _AGGREGATE_REWRITES and len(children) == 1 and children[0].get("class") == "COLUMN_REF":
+            column = self._column_name(children[0])
+            if column not in self.measures:
+                raise NotRoutable(f"column {column} is not a rollup measure")
+            template = self.templates[f"{function_name}:{column}"]
+        else:
+            raise NotRoutable(f"aggregate {function_name} cannot be answered from a rollup")
+
+        rewritten = copy.deepcopy(template)
+        rewritten["alias"] = expression.get("alias", "")
+        return rewritten
+
+def _is_routable_shape(node: Dict[str, Any]) -> bool:
+    from_table = node.get("from_table") or {}
+    return (
+        not node.get("cte_map", {}).get("map")
+        and from_table.get("type") == "BASE_TABLE"
+        and not from_table.get("sample")
+        and not from_table.get("column_name_alias")
+        and from_table.get("schema_name") in ("", "main")
+        and not from_table.get("catalog_name")
+        and not node.get("sample")
+        and not node.get("qualify")
+        and node.get("aggregate_handling") in ("STANDARD_HANDLING", "FORCE_AGGREGATES")
+    )
+
+def rollup_templates(conn, rollup: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Parse the replacement aggregate expressions for a rollup's measures."""
+    expressions = {"count_star": f"CAST(sum({quote_identifier(ROW_COUNT_COLUMN)}) AS BIGINT)"}
+    for column in rollup["measures"]:
+        columns = {aggregate: quote_identifier(measure_column(aggregate, column)) for aggregate in ("sum", "count", "min", "max")}
+        for function_name, template in _AGGREGATE_REWRITES.items():
+            expressions[f"{function_name}:{column.lower()}"] = template.format(**columns)
+
+    keys = list(expressions)
+    return dict(zip(keys, parse_expressions(conn, [expressions[key] for key in keys])))
+
+def rewrite_for_rollup(tree: Dict[str, Any], rollup: Dict[str, Any], aggregate_functions: Set[str], templates: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return a copy of a parsed query reading from `rollup`, or None if it cannot."""
+    node = select_node(tree)
+    if not node or not _is_routable_shape(node):
+        return None
+
+    from_table = node["from_table"]
+    if from_table["table_name"].lower() != rollup["table_name"].lower():
+        return None
+    if not node.get("group_expressions") and not has_aggregate(node["select_list"], aggregate_functions):
+        return None
+
+    table_names = {(from_table.get("alias") or from_table["table_name"]).lower()}
+    select_aliases = {expression["alias"].lower() for expression in node["select_list"] if expression.get("alias")}
+    rewriter = _RollupRewriter(rollup, table_names, select_aliases, aggregate_functions, templates)
+
+    try:
+        rewritten = dict(node)
+        for key in ("select_list", "where_clause", "group_expressions", "having", "modifiers"):
+            rewritten[key] = rewriter.rewrite(node.get(key))
+    except NotRoutable:
+        return None
+
+    rewritten["from_table"] = {**from_table, "table_name": rollup["rollup_table"], "schema_name": ""}
+    return replace_select_node(tree, rewritten)
@@ -0,0 +1,163 @@
+"""
+Approximate queries over reservoir samples.
+A query over a dataset's table is rewritten to read the dataset's fixed-size uniform
+sample instead. SUM and COUNT aggregates are scaled up by the inverse sampling fraction,
+and for those selected directly a 95% confidence margin is computed in the same query
+from the sample variance.
+Dataset previews draw their random and stratified samples with the helpers below as well.
+"""
+
+import copy
+from typing import Any, Dict, Optional, Tuple
+from .query_tree import output_names, parse_expressions, render_expressions, replace_select_node, select_node
+
+Z_95 = 1.96
+
+MARGIN_SUFFIX = "__margin"
+
+# Aggregates whose value grows with the number of rows and must be scaled
+_SCALED_AGGREGATES = {
+    "sum": "CAST(__aggregate * {scale} AS DOUBLE)",
+    "count": "CAST(round(__aggregate * {scale}) AS BIGINT)",
+    "count_star": "CAST(round(__aggregate * {scale}) AS BIGINT)"
+}
+
+_UNSUPPORTED_CLASSES = {"SUBQUERY", "WINDOW"}
+
+class NotApproximable(Exception):
+    """Raised when a query cannot be answered from a sample."""
+
+def sample_select_sql(quoted_table_name: str, rows: int, seed: int) -> str:
+    """Build the query that draws a uniform reservoir sample of a table."""
+    return f"SELECT * FROM {quoted_table_name} USING SAMPLE reservoir({int(rows)} ROWS) REPEATABLE ({int(seed)})"
+
+def stratified_sample_sql(quoted_table_name: str, quoted_column: str, rows: int) -> str:
+    """Build the query drawing `rows` random rows spread evenly over the values of a column.
+
+    Every value gets its turn before any value gets a second row, so rare values show up
+    next to frequent ones. Each group keeps only its `rows` lowest random keys, which is a
+    single aggregation pass instead of a sort of the whole table.
+    """
+    rows = int(rows)
+    return (
+        f"SELECT unnest(__row) FROM ("
+        f"SELECT __stratum, unnest(__rows) AS __row, generate_subscripts(__rows, 1) AS __position FROM ("
+        f"SELECT {quoted_column} AS __stratum, min_by(__table, random(), {rows}) AS __rows FROM {quoted_table_name} AS __table GROUP BY {quoted_column}"
+        f")) ORDER BY __position, __stratum NULLS LAST LIMIT {rows}"
+    )
+
+def _margin_sql(function_name: str, aggregate_sql: str, argument_sql: Optional[str], sample_rows: int, total_rows: int) -> str:
+    """Half-width of the 95% confidence interval of a scaled COUNT or SUM."""
+    n = sample_rows
+    if function_name in ("count", "count_star"):
+        share = f"(CAST({aggregate_sql} AS DOUBLE) / {n})"
+        return f"{Z_95} * {total_rows} * sqrt({share} * (1 - {share}) / {n})"
+    value = f"CAST({argument_sql} AS DOUBLE)"
+    mean = f"(CAST({aggregate_sql} AS DOUBLE) / {n})"
+    return f"{Z_95} * {total_rows} * sqrt(greatest(sum({value} * {value}) / {n} - {mean} * {mean}, 0) / {n})"
+
+class _AggregateScaler:
+    """Wraps SUM and COUNT calls of a parsed SELECT so they estimate totals over the full table."""
+
+    def __init__(self, templates: Dict[str, Dict[str, Any]]):
+        self.templates = templates
+
+    def scale(self, expression: Any) -> Any:
+        if isinstance(expression, list):
+            return [self.scale(item) for item in expression]
+        if not isinstance(expression, dict):
+            return expression
+        if expression.get("class") in _UNSUPPORTED_CLASSES:
+            raise NotApproximable(f"unsupported expression {expression['class']}")
+
+        if expression.get("class") == "FUNCTION" and expression["function_name"].lower() in _SCALED_AGGREGATES:
+            if expression.get("distinct"):
+                raise NotApproximable("distinct counts cannot be scaled from a sample")
+            return self._wrap(expression)
+
+        return {key: self.scale(value) for key, value in expression.items()}
+
+    def _wrap(self, expression: Dict[str, Any]) -> Dict[str, Any]:
+        wrapped = copy.deepcopy(self.templates[expression["function_name"].lower()])
+        # Put the aggregate where the template's placeholder column is
+        self._replace_placeholder(wrapped, {**expression, "alias": ""})
+        wrapped["alias"] = expression.get("alias", "")
+        return wrapped
+
+    def _replace_placeholder(self, expression: Any, replacement: Dict[str, Any]) -> bool:
+        if isinstance(expression, list):
+            for index, item in enumerate(expression):
+                if isinstance(item, dict) and item.get("class") == "COLUMN_REF" and item["column_names"] == ["__aggregate"]:
+                    expression[index] = replacement
+                    return True
+                if self._replace_placeholder(item, replacement):
+                    return True
+            return False
+        if isinstance(expression, dict):
+            for key, value in expression.items():
+                if isinstance(value, dict) and value.get("class") == "COLUMN_REF" and value["column_names"] == ["__aggregate"]:
+                    expression[key] = replacement
+                    return True
+                if self._replace_placeholder(value, replacement):
+                    return True
+        return False
+
+def rewrite_for_sample(conn, tree: Dict[str, Any], sample: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+    """Rewrite a parsed query to read from `sample` and scale its aggregates.
+
+    Returns the rewritten tree and a mapping of output column to its margin column,
+    or None when the query cannot be answered from the sample. `params` are the values
+    of the query's `$name` parameters, needed to name its columns.
+    """
+    node = select_node(tree)
+    if not node or node.get("cte_map", {}).get("map") or node.get("sample"):
+        return None
+    from_table = node.get("from_table") or {}
+    if from_table.get("type") != "BASE_TABLE" or from_table.get("sample") or from_table.get("catalog_name") or from_table.get("schema_name") not in ("", "main"):
+        return None
+    if from_table["table_name"].lower() != sample["table_name"].lower():
+        return None
+
+    scale = sample["total_rows"] / sample["sample_rows"]
+    templates = dict(zip(_SCALED_AGGREGATES, parse_expressions(conn, [template.format(scale=repr(scale)) for template in _SCALED_AGGREGATES.values()])))
+    scaler = _AggregateScaler(templates)
+
+    try:
+        rewritten = dict(node)
+        for key in ("select_list", "having", "modifiers"):
+            rewritten[key] = scaler.scale(node.get(key))
+        # Filters and grouping only see sample rows; they just need to be supported
+        for key in ("where_clause", "group_expressions", "qualify"):
+            scaler.scale(node.get(key))
+    except NotApproximable:
+        return None
+
+    # Keep qualified references like "sales.amount" working against the sample table
+    rewritten["from_table"] = {**from_table, "table_name": sample["sample_table"], "schema_name": "", "alias": from_table.get("alias") or from_table["table_name"]}
+
+    # Scaled aggregates and the sample table would change the column names, so keep
+    # the ones the exact query has
+    names = output_names(conn, tree, params)
+    for expression, name in zip(rewritten["select_list"], names):
+        if name:
+            expression["alias"] = name
+
+    # Margins for the SUM and COUNT aggregates that are selected as-is
+    direct = [
+        (name, expression) for name, expression in zip(names, node["select_list"])
+        if expression.get("class") == "FUNCTION" and expression["function_name"].lower() in _SCALED_AGGREGATES and not expression.get("filter")
+    ]
+    margin_columns = {}
+    if direct:
+        aggregate_sqls = render_expressions(conn, [expression for _, expression in direct])
+        sums = [expression["children"][0] for _, expression in direct if expression["function_name"].lower() == "sum"]
+        argument_sqls = iter(render_expressions(conn, sums))
+        margins = [
+            _margin_sql(function_name, aggregate_sql, next(argument_sqls) if function_name == "sum" else None, sample["sample_rows"], sample["total_rows"])
+            for function_name, aggregate_sql in zip([expression["function_name"].lower() for _, expression in direct], aggregate_sqls)
+        ]
+        for (name, _), margin_expression in zip(direct, parse_expressions(conn, margins)):
+            margin_columns[name] = f"{name}{MARGIN_SUFFIX}"
+            rewritten["select_list"] = rewritten["select_list"] + [{**margin_expression, "alias": margin_columns[name]}]
+
+    return replace_select_node(tree, rewritten), margin_columns
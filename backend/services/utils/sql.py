@@ -0,0 +1,43 @@
+"""
+SQL text helpers.
+This module contains helpers to safely build DuckDB SQL text from identifiers and values.
+"""
+
+import hashlib
+import math
+import re
+from typing import Any, Tuple
+
+def quote_identifier(name: str) -> str:
+    """Quote an identifier for use in DuckDB SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+def sql_literal(value: Any) -> str:
+    """Render a JSON-compatible Python value as a DuckDB SQL literal."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else "NULL"
+    if isinstance(value, str):
+        if "\x00" in value:
+            raise ValueError("Query parameter values cannot contain NUL characters")
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join([sql_literal(item) for item in value]) + "]"
+    if isinstance(value, dict):
+        return "{" + ", ".join([f"{sql_literal(str(key))}: {sql_literal(item)}" for key, item in value.items()]) + "}"
+    raise ValueError(f"Unsupported query parameter type: {type(value).__name__}")
+
+def fingerprint_query(query: str) -> Tuple[str, str]:
+    """Reduce a query to its shape by replacing literals with `?`.
+
+    Returns the normalized query text and a short hash identifying it.
+    """
+    normalized = re.sub(r"'(?:[^']|'')*'", "?", query)
+    normalized = re.sub(r"\b\d+(?:\.\d+)?\b", "?", normalized)
+    normalized = re.sub(r"\s+", " ", normalized).strip().rstrip(";").strip().lower()
+    return normalized, hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,85 @@
+"""
+Type normalization for query results.
+This module rewrites the projection of a DuckDB relation, based on its result schema,
+so every column comes out as a JSON-native value (string, number, boolean or null).
+The conversion runs vectorized inside DuckDB instead of cell by cell in Python.
+Columns are projected by position, and repeated column names get a numeric suffix, so
+results like `SELECT a.id, b.id` keep every column.
+"""
+
+from typing import Dict, List
+from .sql import quote_identifier
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TIMESTAMP_TZ_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+DATE_FORMAT = "%Y-%m-%d"
+
+# 128-bit integers (e.g. the SUM of an integer column) come out as numbers when they fit
+# in a BIGINT, and as strings only when they would overflow one
+_INTEGER_OR_TEXT = "UNION(n BIGINT, s VARCHAR)"
+_WIDE_INTEGER_EXPRESSION = (
+    f"CASE WHEN TRY_CAST({{column}} AS BIGINT) IS NOT NULL THEN CAST(CAST({{column}} AS BIGINT) AS {_INTEGER_OR_TEXT}) "
+    f"ELSE CAST(CAST({{column}} AS VARCHAR) AS {_INTEGER_OR_TEXT}) END"
+)
+
+# DuckDB type ids mapped to the expression template that makes them JSON-safe
+_TYPE_EXPRESSIONS: Dict[str, str] = {
+    "timestamp": f"strftime({{column}}, '{TIMESTAMP_FORMAT}')",
+    "timestamp_s": f"strftime({{column}}, '{TIMESTAMP_FORMAT}')",
+    "timestamp_ms": f"strftime({{column}}, '{TIMESTAMP_FORMAT}')",
+    "timestamp_ns": f"strftime({{column}}, '{TIMESTAMP_FORMAT}')",
+    "timestamp with time zone": f"strftime({{column}}, '{TIMESTAMP_TZ_FORMAT}')",
+    "date": f"strftime({{column}}, '{DATE_FORMAT}')",
+    "time": "CAST({column} AS VARCHAR)",
+    "time with time zone": "CAST({column} AS VARCHAR)",
+    "interval": "CAST({column} AS VARCHAR)",
+    "uuid": "CAST({column} AS VARCHAR)",
+    "bit": "CAST({column} AS VARCHAR)",
+    "enum": "CAST({column} AS VARCHAR)",
+    "hugeint": _WIDE_INTEGER_EXPRESSION,
+    "uhugeint": _WIDE_INTEGER_EXPRESSION,
+    "varint": "CAST({column} AS VARCHAR)",
+    "decimal": "CAST({column} AS DOUBLE)",
+    "double": "CASE WHEN isfinite({column}) THEN {column} END",
+    "float": "CASE WHEN isfinite({column}) THEN {column} END",
+    "blob": "to_base64({column})",
+    "list": "CAST(to_json({column}) AS VARCHAR)",
+    "array": "CAST(to_json({column}) AS VARCHAR)",
+    "struct": "CAST(to_json({column}) AS VARCHAR)",
+    "map": "CAST(to_json({column}) AS VARCHAR)",
+    "union": "CAST(to_json({column}) AS VARCHAR)"
+}
+
+def json_safe_expression(column: str, type_id: str) -> str:
+    """Return the SQL expression that makes the `column` reference a JSON-safe value."""
+    template = _TYPE_EXPRESSIONS.get(type_id)
+    if not template:
+        return column
+    return template.format(column=column)
+
+def deduplicate_names(names: List[str]) -> List[str]:
+    """Rename repeated column names to `<name>_1`, `<name>_2`, ... keeping the first as is."""
+    taken = set(names)
+    seen = set()
+    unique_names = []
+    for name in names:
+        unique_name = name
+        suffix = 0
+        while unique_name in seen or (unique_name != name and unique_name in taken):
+            suffix += 1
+            unique_name = f"{name}_{suffix}"
+        seen.add(unique_name)
+        unique_names.append(unique_name)
+    return unique_names
+
+def normalize_relation(relation):
+    """Rewrite a relation's projection so its rows are JSON-ready and its columns uniquely named."""
+    names = deduplicate_names(relation.columns)
+    if names == relation.columns and not any(column_type.id in _TYPE_EXPRESSIONS for column_type in relation.types):
+        return relation
+
+    projection = ', '.join([
+        f"{json_safe_expression(f'#{position}', column_type.id)} AS {quote_identifier(name)}"
+        for position, (name, column_type) in enumerate(zip(names, relation.types), start=1)
+    ])
+    return relation.project(projection)
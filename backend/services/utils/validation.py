@@ -3,10 +3,17 @@ Common validation utilities for services.
 This module contains shared validation functions and constants used across different services.
 """
 
+import re
+
 # Common constants
 MAX_NAME_LENGTH = 255
 BUCKET_NAME = "uploads"
 STORAGE_PATH = "warehouses"
+RESERVED_DATABASE_ALIASES = {"main", "memory", "system", "temp"}
+JSON_OPTIONS = ("flatten", "split_arrays")
+PARTITION_GRAINS = ("day", "month", "year")
+CSV_OPTIONS = ("column_types", "sample_size", "date_format", "timestamp_format", "rejects")
+COLUMN_TYPE_PATTERN = r"[A-Za-z][A-Za-z0-9_ ]*(\(\s*\d+\s*(,\s*\d+\s*)?\))?(\[\])?"
 
 def validate_user_id(user_id: str) -> None:
     """Validate user_id is not empty."""
@@ -36,6 +43,57 @@ def validate_name(name: str, entity_type: str = "entity") -> None:
     if len(name) > MAX_NAME_LENGTH:
         raise ValueError(f"{entity_type.capitalize()} name cannot exceed {MAX_NAME_LENGTH} characters")
 
+def validate_database_alias(alias: str) -> None:
+    """Validate an alias a warehouse is attached under in a query."""
+    if not isinstance(alias, str) or not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", alias):
+        raise ValueError(f"Invalid warehouse alias '{alias}': use letters, digits and underscores, not starting with a digit")
+    if alias.lower() in RESERVED_DATABASE_ALIASES:
+        raise ValueError(f"Warehouse alias '{alias}' is reserved")
+
+def validate_csv_options(options: dict) -> None:
+    """Validate the typed ingestion options for a CSV upload."""
+    unknown = [key for key in options if key not in CSV_OPTIONS]
+    if unknown:
+        raise ValueError(f"Unknown CSV options: {', '.join(unknown)}. Must be one of: {', '.join(CSV_OPTIONS)}")
+
+    column_types = options.get("column_types")
+    if column_types is not None:
+        if not isinstance(column_types, dict) or not all(isinstance(name, str) and isinstance(column_type, str) for name, column_type in column_types.items()):
+            raise ValueError("Column types must be an object mapping column names to DuckDB types")
+        invalid = [column_type for column_type in column_types.values() if not re.fullmatch(COLUMN_TYPE_PATTERN, column_type.strip())]
+        if invalid:
+            raise ValueError(f"Invalid column types: {', '.join(invalid)}")
+
+    sample_size = options.get("sample_size")
+    if sample_size is not None and (isinstance(sample_size, bool) or not isinstance(sample_size, int) or (sample_size < 1 and sample_size != -1)):
+        raise ValueError("Sample size must be a positive number of rows, or -1 to sniff the whole file")
+
+    for key in ("date_format", "timestamp_format"):
+        if options.get(key) is not None and (not isinstance(options[key], str) or "%" not in options[key]):
+            raise ValueError(f"{key.replace('_', ' ').capitalize()} must be a strftime-style format such as %Y-%m-%d")
+
+    if options.get("rejects") is not None and not isinstance(options["rejects"], bool):
+        raise ValueError("Rejects must be a boolean")
+
+def validate_json_options(options: dict) -> None:
+    """Validate the nested JSON flattening options for a JSON upload."""
+    unknown = [key for key in options if key not in JSON_OPTIONS]
+    if unknown:
+        raise ValueError(f"Unknown JSON options: {', '.join(unknown)}. Must be one of: {', '.join(JSON_OPTIONS)}")
+    if not all(isinstance(value, bool) for value in options.values()):
+        raise ValueError("JSON options must be booleans")
+
+def validate_partitioning(partitioning: dict) -> None:
+    """Validate the column and optional time grain a dataset is partitioned by."""
+    unknown = [key for key in partitioning if key not in ("column", "grain")]
+    if unknown:
+        raise ValueError(f"Unknown partitioning options: {', '.join(unknown)}. Must be one of: column, grain")
+    if not isinstance(partitioning.get("column"), str) or not partitioning["column"].strip():
+        raise ValueError("Partitioning requires a column")
+    grain = partitioning.get("grain")
+    if grain is not None and grain not in PARTITION_GRAINS:
+        raise ValueError(f"Invalid partition grain: {grain}. Must be one of: {', '.join(PARTITION_GRAINS)}")
+
 def validate_bucket_exists(supabase_client) -> None:
     """Validate that the storage bucket exists and is accessible."""
     try:
@@ -0,0 +1,27 @@
+"""
+Per-warehouse write locks.
+Every change to a warehouse downloads its DuckDB file, modifies it and uploads it again,
+so two changes running at once would each upload their own copy and the last one would
+drop the other's work. Operations that write to a warehouse hold its lock to take turns.
+Locks live in the API process, like the ingest jobs.
+"""
+
+from contextlib import contextmanager
+from threading import Lock, RLock
+from typing import Dict
+
+class WarehouseLocks:
+    def __init__(self):
+        self._locks: Dict[str, RLock] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def hold(self, warehouse_id: str):
+        """Hold the write lock of a warehouse for the duration of the block."""
+        with self._lock:
+            lock = self._locks.setdefault(warehouse_id, RLock())
+        with lock:
+            yield
+
+# Process-wide locks shared by dataset ingests, updates and warehouse changes
+warehouse_locks = WarehouseLocks()
@@ -5,10 +5,13 @@ This module handles the business logic for warehouse operations, including:
 - Interacting with Supabase storage for warehouse persistence
 - Managing warehouse metadata in the database
 - Coordinating dataset storage within warehouses
+- Defining and querying the warehouse's semantic metrics layer
 """
 
-from typing import Dict, Optional, List
+from collections import OrderedDict
+from typing import Any, Dict, Optional, List
 from datetime import datetime, UTC
+from threading import Lock
 from supabase import create_client, Client
 import os
 import uuid
@@ -19,12 +22,23 @@ from .utils.validation import (
     validate_warehouse_id,
     validate_name,
     validate_bucket_exists,
+    validate_database_alias,
     BUCKET_NAME,
     STORAGE_PATH,
     MAX_NAME_LENGTH
 )
+from .utils.metrics import compile_metric_query, validate_semantic_model
+from core.config import settings
 
 from services.datasets_service import DatasetService
+from services.file_handler import FileHandler
+from services.duckdb_handler import DuckDBHandler
+from services.warehouse_locks import warehouse_locks
+
+# Metric query results by warehouse, dataset versions and compiled query; any dataset
+# update or semantic model change produces a new key
+_metric_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_metric_lock = Lock()
 
 class WarehouseService:
     def __init__(self, supabase: Client):
@@ -138,21 +152,26 @@ class WarehouseService:
 
         warehouse = self.get_warehouse(user_id, warehouse_id)
 
-        try:
-            # Delete the warehouse file from storage
-            self.supabase.storage.from_(self.bucket_name).remove([warehouse["storage_path"]])
-        except Exception as e:
-            raise ValueError(f"Failed to delete warehouse file: {str(e)}")
+        # Wait for changes in progress, so none of them uploads the file again afterwards
+        with warehouse_locks.hold(warehouse_id):
+            try:
+                # Delete the warehouse file and the Parquet files of its partitioned datasets from storage
+                self.supabase.storage.from_(self.bucket_name).remove([warehouse["storage_path"]])
+                file_handler = FileHandler()
+                file_handler.set_bucket(self.bucket_name)
+                file_handler.remove_files(file_handler.list_files(f"{self.storage_path}/{warehouse_id}/partitions"))
+            except Exception as e:
+                raise ValueError(f"Failed to delete warehouse file: {str(e)}")
 
-        # Update the warehouse record to mark it as deleted
-        response = self.supabase.table("user_warehouses") \
-            .update({"is_deleted": True}) \
-            .eq("id", warehouse_id) \
-            .eq("user_id", user_id) \
-            .execute()
+            # Update the warehouse record to mark it as deleted
+            response = self.supabase.table("user_warehouses") \
+                .update({"is_deleted": True}) \
+                .eq("id", warehouse_id) \
+                .eq("user_id", user_id) \
+                .execute()
 
-        if not response.data:
-            raise ValueError(f"Failed to update warehouse with ID {warehouse_id}")
+            if not response.data:
+                raise ValueError(f"Failed to update warehouse with ID {warehouse_id}")
 
     def get_all_warehouses(self, user_id: str, q: Optional[str] = None) -> List[Dict]:
         validate_user_id(user_id)
@@ -169,6 +188,40 @@ class WarehouseService:
         response = query.execute()
         return response.data
     
+    def sync_partitions(self, user_id: str, warehouse: Dict) -> None:
+        """Fetch the Parquet files a downloaded warehouse's partitioned datasets read."""
+        self.dataset_service.sync_partitions(user_id, warehouse["id"], warehouse["bucket"])
+
+    def download_attached_warehouses(self, user_id: str, attachments: List[Dict[str, str]]) -> Dict[str, str]:
+        """Download the warehouses to attach to a query, after checking the user owns each one.
+
+        `attachments` lists {"alias", "warehouse_id"} pairs. Returns the local file of each
+        alias; the caller removes the files when done.
+        """
+        validate_user_id(user_id)
+
+        aliases = [attachment.get("alias") for attachment in attachments]
+        for alias in aliases:
+            validate_database_alias(alias)
+        if len({alias.lower() for alias in aliases}) != len(aliases):
+            raise ValueError("Warehouse aliases must be unique")
+
+        file_handler = FileHandler()
+        local_paths = {}
+        try:
+            for attachment in attachments:
+                warehouse = self.get_warehouse(user_id, attachment.get("warehouse_id"))
+                file_handler.set_bucket(warehouse["bucket"])
+                local_path = file_handler.create_empty_temp_file(".duckdb")
+                local_paths[attachment["alias"]] = local_path
+                file_handler.download_file(warehouse["storage_path"], local_path)
+                self.sync_partitions(user_id, warehouse)
+        except Exception:
+            file_handler.cleanup(*local_paths.values())
+            raise
+
+        return local_paths
+
     def get_warehouse_schema(self, user_id: str, warehouse_id: str) -> Dict:
         validate_user_id(user_id)
         validate_warehouse_id(warehouse_id)
@@ -186,13 +239,132 @@ class WarehouseService:
         for dataset in datasets:
             tables[dataset["name"]] = {
                 "description": dataset.get("description", ""),
-                "columns": dataset.get("columns", [])
+                "columns": dataset.get("columns", []),
+                "row_count": (dataset.get("statistics") or {}).get("row_count"),
+                "column_statistics": (dataset.get("statistics") or {}).get("columns", {}),
+                "sort_key": dataset.get("sort_key") or [],
+                # Equality filters on these columns are point lookups instead of scans
+                "indexes": dataset.get("indexes") or []
             }
+            # Keyword search goes through the full-text index instead of ILIKE scans
+            if dataset.get("text_search"):
+                tables[dataset["name"]]["text_search_columns"] = dataset["text_search"]["columns"]
+                tables[dataset["name"]]["text_search_id_column"] = dataset["text_search"]["id_column"]
+            # Filters on the partition column only read the matching Parquet files
+            if dataset.get("partitioning"):
+                tables[dataset["name"]]["partition_column"] = dataset["partitioning"]["partition_column"]
+            # Arrays split out of nested JSON are tables of their own, joined on the parent's row id
+            for child_table in dataset.get("child_tables") or []:
+                tables[child_table["name"]] = {
+                    "description": f"Elements of the {child_table['list_column']} array of {dataset['name']}; join on {child_table['foreign_key']}",
+                    "columns": child_table["columns"],
+                    "row_count": child_table["row_count"],
+                    "parent_table": dataset["name"],
+                    "foreign_key": child_table["foreign_key"]
+                }
         
+        # Named metrics are answered by query_metrics instead of hand-written SQL
+        model = warehouse.get("semantic_model") or {}
+        metrics = [
+            {key: metric[key] for key in ("name", "table", "description", "time_column") if metric.get(key)}
+            for metric in model.get("metrics") or []
+        ]
+        dimensions = [
+            {key: dimension[key] for key in ("name", "table", "description") if dimension.get(key)}
+            for dimension in model.get("dimensions") or []
+        ]
+
         # Return complete schema including warehouse metadata
         return {
             "id": warehouse["id"],
             "name": warehouse["name"],
             "description": warehouse["description"],
-            "tables": tables
+            "tables": tables,
+            "metrics": metrics,
+            "dimensions": dimensions
+        }
+
+    def update_semantic_model(self, user_id: str, warehouse_id: str, model: Dict[str, Any]) -> Dict:
+        """Replace the metric and dimension definitions of a warehouse.
+
+        Every definition is checked against the warehouse's tables before it is stored.
+        """
+        validate_user_id(user_id)
+        validate_warehouse_id(warehouse_id)
+        model = validate_semantic_model(model)
+
+        warehouse = self.get_warehouse(user_id, warehouse_id)
+
+        # Hold the write lock so no dataset the model references is dropped while it is checked
+        with warehouse_locks.hold(warehouse_id):
+            file_handler = FileHandler()
+            file_handler.set_bucket(warehouse["bucket"])
+            local_path = file_handler.create_empty_temp_file(".duckdb")
+            try:
+                file_handler.download_file(warehouse["storage_path"], local_path)
+                self.sync_partitions(user_id, warehouse)
+                DuckDBHandler().check_semantic_model(local_path, model)
+            finally:
+                file_handler.cleanup(local_path)
+
+            response = self.supabase.table("user_warehouses") \
+                .update({"semantic_model": model}) \
+                .eq("id", warehouse_id) \
+                .eq("user_id", user_id) \
+                .execute()
+
+        if not response.data:
+            raise ValueError(f"Failed to update warehouse with ID {warehouse_id}")
+
+        return response.data[0]
+
+    def query_metrics(self, user_id: str, warehouse_id: str, metrics: List[str], dimensions: Optional[List[str]] = None, time_grain: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None, filters: Optional[List[Dict[str, Any]]] = None, order_by: Optional[str] = None, descending: bool = True, limit: Optional[int] = None, source: Optional[str] = None) -> Dict[str, Any]:
+        """Compute metrics of the warehouse's semantic model, broken down by dimensions.
+
+        The request is compiled to one aggregate query (see compile_metric_query), which
+        is answered from a rollup when one matches. Results are cached until a dataset of
+        the warehouse or the semantic model changes.
+        """
+        validate_user_id(user_id)
+        validate_warehouse_id(warehouse_id)
+        limit = settings.METRIC_MAX_ROWS if limit is None else limit
+        if limit <= 0 or limit > settings.METRIC_MAX_ROWS:
+            raise ValueError(f"Limit must be between 1 and {settings.METRIC_MAX_ROWS}")
+
+        warehouse = self.get_warehouse(user_id, warehouse_id)
+        model = warehouse.get("semantic_model") or {}
+        if not model.get("metrics"):
+            raise ValueError(f"Warehouse with ID {warehouse_id} has no metrics defined")
+
+        query, params = compile_metric_query(model, metrics, dimensions, time_grain, start, end, filters, order_by, descending)
+
+        datasets = self.dataset_service.get_user_datasets(user_id, warehouse_id=warehouse_id)
+        version = sorted((dataset["id"], dataset.get("updated_at")) for dataset in datasets)
+        cache_key = (warehouse_id, DuckDBHandler.query_cache_key(query, {"params": params, "limit": limit, "version": version}))
+        with _metric_lock:
+            if cache_key in _metric_cache:
+                _metric_cache.move_to_end(cache_key)
+                return {**_metric_cache[cache_key], "cached": True}
+
+        file_handler = FileHandler()
+        file_handler.set_bucket(warehouse["bucket"])
+        local_path = file_handler.create_empty_temp_file(".duckdb")
+        try:
+            file_handler.download_file(warehouse["storage_path"], local_path)
+            self.sync_partitions(user_id, warehouse)
+            # One row past the limit tells whether the result was cut off
+            rows = DuckDBHandler().execute_query(local_path, query, limit=limit + 1, params=params or None, warehouse_id=warehouse_id, source=source)
+        finally:
+            file_handler.cleanup(local_path)
+
+        result = {
+            "data": rows[:limit],
+            "truncated": len(rows) > limit,
+            "query": query,
+            "params": params
         }
+        with _metric_lock:
+            _metric_cache[cache_key] = result
+            while len(_metric_cache) > settings.METRIC_CACHE_SIZE:
+                _metric_cache.popitem(last=False)
+        return {**result, "cached": False}
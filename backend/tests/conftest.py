@@ -0,0 +1,6 @@
+import pytest
+
+@pytest.fixture
+def directory(tmp_path) -> str:
+    """A scratch directory for a test's warehouses and data files."""
+    return str(tmp_path)
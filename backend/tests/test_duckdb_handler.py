@@ -0,0 +1,540 @@
+import gzip
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import settings
+from services.duckdb_handler import DuckDBHandler, QueryWorkerCrashedError
+from services.query_log import slow_query_log
+from services.result_store import result_store
+from services.resource_governor import resource_governor
+from services.query_executor import query_executor
+from services.utils.file_formats import detect_file_format
+from services.utils.metrics import compile_metric_query
+
+handler = DuckDBHandler()
+
+def fts_available() -> bool:
+    import duckdb
+    from services.duckdb_extensions import extension_config
+    with duckdb.connect(config=extension_config()) as conn:
+        try:
+            conn.load_extension("fts")
+            return True
+        except duckdb.Error:
+            return False
+
+def create_warehouse(directory: str, name: str, sql: str) -> str:
+    import duckdb
+    path = os.path.join(directory, f"{name}.duckdb")
+    with duckdb.connect(path) as conn:
+        conn.execute(sql)
+    return path
+
+def test_result_types(directory: str):
+    # 1: SUM of an integer column comes back as a number, unless it overflows a BIGINT
+    print('Result types...')
+    path = create_warehouse(directory, "result_types", "CREATE TABLE orders AS SELECT range AS id, range % 3 AS grp FROM range(10)")
+    rows = handler.execute_query(path, "SELECT sum(id) AS total, sum(id)::HUGEINT * 170141183460469231731687303715 AS huge FROM orders")
+    assert rows == [{"total": 45, "huge": str(45 * 170141183460469231731687303715)}], rows
+
+    # 2: Columns with the same name are all kept
+    rows = handler.execute_query(path, "SELECT a.id, b.id, 1 AS x, 2 AS x FROM orders a JOIN orders b ON b.id = a.id + 1 WHERE a.id = 0")
+    assert rows == [{"id": 0, "id_1": 1, "x": 1, "x_1": 2}], rows
+    print('OK\n')
+
+def test_query_params(directory: str):
+    # 1: Parameters are bound by name, including lists and names that are SQL keywords
+    print('Query parameters...')
+    path = create_warehouse(directory, "query_params", "CREATE TABLE orders AS SELECT range AS id, 'c' || range AS code FROM range(10)")
+    rows = handler.execute_query(path, "SELECT id FROM orders WHERE id >= $start AND id < $end ORDER BY id", params={"start": 2, "end": 4})
+    assert rows == [{"id": 2}, {"id": 3}], rows
+    rows = handler.execute_query(path, "SELECT count(*) AS n FROM orders WHERE list_contains($codes, code)", params={"codes": ["c1", "c5", "x"]})
+    assert rows == [{"n": 2}], rows
+
+    # 2: Invalid parameter names are rejected
+    try:
+        handler.execute_query(path, "SELECT 1", params={"bad name": 1})
+        raise AssertionError("expected a ValueError")
+    except ValueError:
+        pass
+    print('OK\n')
+
+def test_slow_query_log(directory: str):
+    # 1: A slow query is logged with its wall-clock time, without profiling it
+    print('Slow query log...')
+    path = create_warehouse(directory, "slow_query_log", "CREATE TABLE orders AS SELECT range AS id FROM range(1000)")
+    threshold = settings.SLOW_QUERY_THRESHOLD_SECONDS
+    settings.SLOW_QUERY_THRESHOLD_SECONDS = 0
+    try:
+        query = "SELECT * FROM orders WHERE id < 50"
+        handler.execute_query_to_result(path, query, "user", spill_rows=10, page_rows=5)
+        entry = slow_query_log.get_entries(limit=1)[0]
+        assert entry["query"] == query and entry["rows_scanned"] is None, entry
+
+        # 2: Queries of a shape that was slow before are profiled, on the query itself
+        # rather than the statements reading back its spilled result
+        handler.execute_query_to_result(path, query, "user", spill_rows=10, page_rows=5)
+        entry = slow_query_log.get_entries(limit=1)[0]
+        assert entry["rows_scanned"] == 1000, entry
+    finally:
+        settings.SLOW_QUERY_THRESHOLD_SECONDS = threshold
+    print('OK\n')
+
+def test_approximate_query_names(directory: str):
+    # 1: Approximate queries name their columns like the exact query does
+    print('Approximate query column names...')
+    path = create_warehouse(directory, "approximate_query_names", "CREATE TABLE Sales AS SELECT range AS Amount, range % 3 AS region FROM range(5000)")
+    sample_rows = settings.SAMPLE_TABLE_ROWS
+    settings.SAMPLE_TABLE_ROWS = 1000
+    try:
+        import duckdb
+        with duckdb.connect(path) as conn:
+            handler._refresh_sample(conn, "Sales", 5000)
+        queries = [
+            "SELECT t.amount, region FROM sales t WHERE t.amount < $limit",
+            "SELECT region, SUM(t.Amount), count(*), sum(amount) / 2 AS half, sum(amount) FILTER (WHERE region = 1) FROM sales t GROUP BY region",
+            "SELECT *, amount + 1 FROM sales LIMIT 3"
+        ]
+        for query in queries:
+            params = {"limit": 10} if "$limit" in query else None
+            exact = handler.execute_query(path, query, params=params)
+            approximate = handler.execute_approximate_query(path, query, params=params)
+            assert approximate["approximate"], query
+            assert list(approximate["data"][0]) == list(exact[0]), (list(approximate["data"][0]), list(exact[0]))
+    finally:
+        settings.SAMPLE_TABLE_ROWS = sample_rows
+    print('OK\n')
+
+def write_sales_csv(directory: str, name: str, rows: int) -> str:
+    # Shuffled rows, so clustering on a sort key is visible in storage order
+    amounts = list(range(rows))
+    random.Random(7).shuffle(amounts)
+    path = os.path.join(directory, f"{name}.csv")
+    with open(path, "w") as f:
+        f.write("id,region,amount,day\n")
+        f.writelines(f"{i},{['north', 'south'][i % 2]},{amount},2024-0{1 + i % 3}-0{1 + i % 5}\n" for i, amount in enumerate(amounts))
+    return path
+
+def test_column_statistics(directory: str):
+    # 1: Numeric columns get bounds, moments and quantiles; text columns their top values
+    print('Column statistics...')
+    path = create_warehouse(directory, "column_statistics", "SELECT 1")
+    processed = handler.process_data(path, write_sales_csv(directory, "statistics", 200), "sales", "csv")
+    statistics = processed["statistics"]
+    assert statistics["row_count"] == 200, statistics
+    amount = statistics["columns"]["amount"]
+    assert (amount["min"], amount["max"], amount["avg"], amount["null_fraction"]) == ("0", "199", "99.5", 0.0), amount
+    assert set(amount["quantiles"]) == {"q25", "q50", "q75"}, amount
+    region = statistics["columns"]["region"]
+    assert region["top_values"] == [{"value": "north", "count": 100}, {"value": "south", "count": 100}], region
+    print('OK\n')
+
+def test_sort_key_clustering(directory: str):
+    # 1: Rows are stored in sort key order, so zone maps can skip row groups
+    print('Sort key clustering...')
+    path = create_warehouse(directory, "sort_key_clustering", "SELECT 1")
+    processed = handler.process_data(path, write_sales_csv(directory, "clustering", 1000), "sales", "csv", sort_key=["Amount"])
+    assert processed["sort_key"] == ["amount"], processed["sort_key"]
+    rows = handler.execute_query(path, "SELECT amount FROM sales ORDER BY rowid")
+    assert [row["amount"] for row in rows] == list(range(1000))
+
+    # 2: Unknown sort key columns are rejected
+    try:
+        handler.process_data(path, write_sales_csv(directory, "clustering", 10), "sales", "csv", sort_key=["missing"])
+        raise AssertionError("expected a ValueError")
+    except ValueError:
+        pass
+    print('OK\n')
+
+def test_file_format_detection(directory: str):
+    # 1: Formats and compression come from the file's bytes, not only its extension
+    print('File format detection...')
+    compressed = os.path.join(directory, "compressed.csv.gz")
+    with gzip.open(compressed, "wt") as f:
+        f.write("id,amount\n1,10\n2,20\n")
+    assert detect_file_format(compressed, "csv.gz") == ("csv", "gzip")
+    assert detect_file_format(compressed, "") == ("csv", "gzip")
+
+    documents = os.path.join(directory, "documents.txt")
+    with open(documents, "w") as f:
+        f.write('[{"id": 1}]')
+    assert detect_file_format(documents, "") == ("json", None)
+
+    path = create_warehouse(directory, "file_format_detection", "SELECT 1")
+    parquet = os.path.join(directory, "orders.parquet")
+    handler.execute_query(path, f"COPY (SELECT range AS id FROM range(3)) TO '{parquet}' (FORMAT parquet)")
+    assert detect_file_format(parquet, "csv") == ("parquet", None)
+
+    # 2: Compressed and mislabelled files load
+    handler.process_data(path, compressed, "compressed", "csv.gz")
+    handler.process_data(path, parquet, "orders", "csv")
+    rows = handler.execute_query(path, "SELECT (SELECT sum(amount) FROM compressed) AS amount, (SELECT count(*) FROM orders) AS orders")
+    assert rows == [{"amount": 30, "orders": 3}], rows
+    print('OK\n')
+
+def test_rollup_routing(directory: str):
+    # 1: Aggregates a rollup can answer are read from it, with the same results
+    print('Rollup routing...')
+    path = create_warehouse(directory, "rollup_routing", "SELECT 1")
+    handler.process_data(path, write_sales_csv(directory, "rollups", 200), "sales", "csv")
+    query = "SELECT region, sum(amount) AS total, count(amount) AS n FROM sales GROUP BY region ORDER BY region"
+    expected = handler.execute_query(path, query)
+    rollups = handler.define_rollups(path, "sales", [{"name": "by_region", "dimensions": ["region"], "measures": ["amount"], "time_column": "day", "time_grain": "month"}])
+    assert rollups[0]["row_count"] == 6, rollups
+
+    with handler.get_connection(path) as conn:
+        assert "__rollup_sales_by_region" in handler._route_to_rollup(conn, query)
+        # Grouping by a column the rollup does not keep needs the base table
+        unroutable = "SELECT id, sum(amount) FROM sales GROUP BY id"
+        assert handler._route_to_rollup(conn, unroutable) == unroutable
+    assert handler.execute_query(path, query) == expected
+
+    # 2: Appended rows are folded into the rollups, which keep one row per group
+    appended = os.path.join(directory, "new_sales.csv")
+    with open(appended, "w") as f:
+        f.write("id,region,amount,day\n200,north,1000,2024-01-09\n201,west,5,2024-04-01\n")
+    merged = handler.merge_data(path, appended, "sales", "csv", "append")
+    assert [rollup["row_count"] for rollup in merged["rollups"]] == [7], merged["rollups"]
+    routed = handler.execute_query(path, query)
+    assert routed == [{"region": "north", "total": expected[0]["total"] + 1000, "n": 101}, expected[1], {"region": "west", "total": 5, "n": 1}], routed
+    with handler.get_connection(path) as conn:
+        exact = conn.execute("SELECT region, sum(amount), count(amount), min(amount), max(amount) FROM sales GROUP BY ALL ORDER BY 1").fetchall()
+        rolled = conn.execute("SELECT region, sum(sum_amount), sum(count_amount), min(min_amount), max(max_amount) FROM __rollup_sales_by_region GROUP BY ALL ORDER BY 1").fetchall()
+    assert exact == rolled, (exact, rolled)
+    print('OK\n')
+
+def test_enum_encoding(directory: str):
+    # 1: Low-cardinality text columns are stored as ENUMs but still read and filter as text
+    print('ENUM encoding...')
+    path = create_warehouse(directory, "enum_encoding", "SELECT 1")
+    codes = os.path.join(directory, "codes.csv")
+    with open(codes, "w") as f:
+        f.write("region,code\n" + "".join(f"{['north', 'south', 'east'][i % 3]},C{i}\n" for i in range(300)))
+    processed = handler.process_data(path, codes, "codes", "csv")
+    assert processed["columns"] == [{"name": "region", "type": "VARCHAR", "encoding": "enum"}, {"name": "code", "type": "VARCHAR"}], processed["columns"]
+    rows = handler.execute_query(path, "SELECT region, count(*) AS n FROM codes WHERE region > 'east' GROUP BY region ORDER BY region")
+    assert rows == [{"region": "north", "n": 100}, {"region": "south", "n": 100}], rows
+
+    # 2: Appending new values extends the ENUM
+    appended = os.path.join(directory, "new_codes.csv")
+    with open(appended, "w") as f:
+        f.write("region,code\nwest,C300\n")
+    handler.merge_data(path, appended, "codes", "csv", "append")
+    rows = handler.execute_query(path, "SELECT code FROM codes WHERE region = 'west'")
+    assert rows == [{"code": "C300"}], rows
+    print('OK\n')
+
+def test_nested_json(directory: str):
+    # 1: Nested structs become flat columns, and lists move to child tables keyed by row id
+    print('Nested JSON...')
+    path = create_warehouse(directory, "nested_json", "SELECT 1")
+    orders = os.path.join(directory, "orders.json")
+    with open(orders, "w") as f:
+        for i in range(3):
+            f.write(json.dumps({"id": i, "address": {"city": f"c{i}", "geo": {"lat": i}}, "tags": ["a", "b"][:i]}) + "\n")
+    processed = handler.process_data(path, orders, "orders", "json", json_options={"flatten": True, "split_arrays": True})
+    assert [col["name"] for col in processed["columns"]] == ["_row_id", "id", "address_city", "address_geo_lat"], processed["columns"]
+    assert [(child["name"], child["row_count"]) for child in processed["child_tables"]] == [("orders__tags", 3)], processed["child_tables"]
+    rows = handler.execute_query(path, "SELECT o.id, t.position, t.value FROM orders o JOIN orders__tags t USING (_row_id) ORDER BY o.id, t.position")
+    assert rows == [{"id": 1, "position": 1, "value": "a"}, {"id": 2, "position": 1, "value": "a"}, {"id": 2, "position": 2, "value": "b"}], rows
+
+    # 2: JSON options are rejected for other formats
+    try:
+        handler.process_data(path, write_sales_csv(directory, "nested", 10), "sales", "csv", json_options={"flatten": True})
+        raise AssertionError("expected a ValueError")
+    except ValueError:
+        pass
+    print('OK\n')
+
+def test_partition_pruning(directory: str):
+    # 1: Rows are written to one directory per partition
+    print('Partition pruning...')
+    path = create_warehouse(directory, "partition_pruning", "SELECT 1")
+    partition_directory = os.path.join(directory, "partitions")
+    written = handler.write_partitions(path, write_sales_csv(directory, "partitions", 300), "sales", "csv", partition_directory, {"column": "day", "grain": "month"})
+    assert sorted({file.split("/")[0] for file in written["written_files"]}) == ["day_month=2024-01", "day_month=2024-02", "day_month=2024-03"], written
+
+    # 2: Filters on the partition column only read the matching files; the others are
+    # made unreadable to prove it
+    for file in written["written_files"]:
+        if not file.startswith("day_month=2024-01"):
+            with open(os.path.join(partition_directory, file), "wb") as f:
+                f.write(b"not parquet")
+    rows = handler.execute_query(path, "SELECT count(*) AS n FROM sales WHERE day_month = '2024-01'")
+    assert rows == [{"n": 100}], rows
+    print('OK\n')
+
+def test_metric_compilation(directory: str):
+    # 1: Metric queries compile to parameterized aggregates that answer like hand-written SQL
+    print('Metric compilation...')
+    path = create_warehouse(directory, "metric_compilation", "SELECT 1")
+    handler.process_data(path, write_sales_csv(directory, "metrics", 300), "sales", "csv")
+    model = {
+        "metrics": [{"name": "revenue", "table": "sales", "expression": "sum(amount)", "time_column": "day"}],
+        "dimensions": [{"name": "region", "table": "sales", "expression": "region"}]
+    }
+    query, params = compile_metric_query(model, ["revenue"], ["region"], "month", start="2024-02-01", filters=[{"dimension": "region", "operator": "=", "value": "north"}])
+    assert params == {"period_start": "2024-02-01", "filter_0": "north"}, params
+    rows = handler.execute_query(path, query, params=params)
+    expected = handler.execute_query(path, "SELECT date_trunc('month', day) AS month, region, sum(amount) AS revenue FROM sales WHERE day >= DATE '2024-02-01' AND region = 'north' GROUP BY ALL ORDER BY 1, 2")
+    assert rows == expected and len(rows) == 2, rows
+
+    # 2: Unknown metrics are rejected
+    try:
+        compile_metric_query(model, ["profit"])
+        raise AssertionError("expected a ValueError")
+    except ValueError:
+        pass
+    print('OK\n')
+
+def test_merge_csv_options(directory: str):
+    # 1: Appended CSV rows are typed with the options the table was created with
+    print('Merging with CSV options...')
+    path = create_warehouse(directory, "merge_csv_options", "SELECT 1")
+    csv_options = {"column_types": {"code": "VARCHAR", "amount": "BIGINT"}, "rejects": True}
+    created = os.path.join(directory, "created.csv")
+    with open(created, "w") as f:
+        f.write("code,amount\n001,1\n002,2\n")
+    handler.process_data(path, created, "codes", "csv", csv_options=csv_options)
+
+    appended = os.path.join(directory, "appended.csv")
+    with open(appended, "w") as f:
+        f.write("code,amount\n003,3\n004,oops\n005,5\n")
+    merged = handler.merge_data(path, appended, "codes", "csv", "append", csv_options=csv_options)
+    assert merged["rows_inserted"] == 2 and merged["rejected_rows"] == 1, merged
+    rows = handler.execute_query(path, "SELECT code FROM codes ORDER BY code")
+    assert [row["code"] for row in rows] == ["001", "002", "003", "005"], rows
+    print('OK\n')
+
+def test_indexed_merge(directory: str):
+    # 1: Point lookups through the indexes find appended and upserted rows
+    print('Merging into an indexed table...')
+    path = create_warehouse(directory, "indexed_merge", "SELECT 1")
+    created = os.path.join(directory, "customers.csv")
+    with open(created, "w") as f:
+        f.write("id,code,amount\n" + "".join(f"{i},C{i},{i}\n" for i in range(1000)))
+    handler.process_data(path, created, "customers", "csv", indexes=["id", "code"])
+
+    appended = os.path.join(directory, "new_customers.csv")
+    with open(appended, "w") as f:
+        f.write("id,code,amount\n1000,C1000,1000\n")
+    handler.merge_data(path, appended, "customers", "csv", "append", indexes=["id", "code"])
+
+    upserted = os.path.join(directory, "changed_customers.csv")
+    with open(upserted, "w") as f:
+        f.write("id,code,amount\n5,C5,-5\n1001,C1001,1001\n")
+    handler.merge_data(path, upserted, "customers", "csv", "upsert", key=["id"], indexes=["id", "code"])
+
+    lookups = {"id = 7": [7], "id = 1000": [1000], "id = 1001": [1001], "id = 5": [-5], "code = 'C5'": [-5], "code = 'C1000'": [1000]}
+    for condition, amounts in lookups.items():
+        rows = handler.execute_query(path, f"SELECT amount FROM customers WHERE {condition}")
+        assert [row["amount"] for row in rows] == amounts, (condition, rows)
+
+    # 2: Redefining the indexes keeps lookups right
+    handler.define_indexes(path, "customers", ["code"])
+    rows = handler.execute_query(path, "SELECT amount FROM customers WHERE code = 'C1001'")
+    assert rows == [{"amount": 1001}], rows
+
+    # 3: Indexes dropped to give an ENUM column a new value are rebuilt over all rows
+    created = os.path.join(directory, "orders.csv")
+    with open(created, "w") as f:
+        f.write("id,status\n" + "".join(f"{i},{['open', 'closed'][i % 2]}\n" for i in range(1000)))
+    processed = handler.process_data(path, created, "orders", "csv", indexes=["id", "status"])
+    assert processed["columns"][1] == {"name": "status", "type": "VARCHAR", "encoding": "enum"}, processed["columns"]
+    appended = os.path.join(directory, "new_orders.csv")
+    with open(appended, "w") as f:
+        f.write("id,status\n1000,refunded\n1001,open\n")
+    handler.merge_data(path, appended, "orders", "csv", "append", indexes=["id", "status"])
+    lookups = {"id = 1000": [{"status": "refunded"}], "id = 3": [{"status": "closed"}], "status = 'refunded'": [{"status": "refunded"}]}
+    for condition, expected in lookups.items():
+        rows = handler.execute_query(path, f"SELECT status FROM orders WHERE {condition}")
+        assert rows == expected, (condition, rows)
+    rows = handler.execute_query(path, "SELECT index_name FROM duckdb_indexes() WHERE table_name = 'orders' ORDER BY 1")
+    assert [row["index_name"] for row in rows] == ["__index_orders_id", "__index_orders_status"], rows
+    print('OK\n')
+
+def test_upsert_duplicate_keys(directory: str):
+    # 1: Of several incoming rows with the same key, the last one in the file wins
+    print('Upserting duplicate keys...')
+    path = create_warehouse(directory, "upsert_duplicate_keys", "SELECT 1")
+    created = os.path.join(directory, "balances.csv")
+    with open(created, "w") as f:
+        f.write("id,amount\n" + "".join(f"{i},{i}\n" for i in range(10)))
+    handler.process_data(path, created, "balances", "csv")
+
+    upserted = os.path.join(directory, "changed_balances.csv")
+    with open(upserted, "w") as f:
+        f.write("id,amount\n" + "".join(f"{i % 3},{100 + i}\n" for i in range(3000)))
+    merged = handler.merge_data(path, upserted, "balances", "csv", "upsert", key=["id"])
+    assert (merged["rows_deleted"], merged["rows_inserted"]) == (3, 3), merged
+    rows = handler.execute_query(path, "SELECT id, amount FROM balances WHERE id < 4 ORDER BY id")
+    assert rows == [{"id": 0, "amount": 3097}, {"id": 1, "amount": 3098}, {"id": 2, "amount": 3099}, {"id": 3, "amount": 3}], rows
+    print('OK\n')
+
+def test_text_search(directory: str):
+    # 1: Keywords match stemmed words of the indexed columns of a table whose name needs quoting
+    print('Full-text search...')
+    if not fts_available():
+        raise unittest.SkipTest("the fts extension is not installed")
+    path = create_warehouse(directory, "text_search", "SELECT 1")
+    articles = os.path.join(directory, "articles.csv")
+    with open(articles, "w") as f:
+        f.write(
+            "id,title,body\n"
+            "1,Refund policy,Orders can be refunded within 30 days\n"
+            "2,Shipping,We ship worldwide\n"
+            "3,Returns,Refunds for damaged goods are immediate\n"
+            "4,Contact,Email support for help\n"
+        )
+    processed = handler.process_data(path, articles, "Test Dataset", "csv", text_search={"columns": ["title", "body"], "id_column": "id"})
+    assert processed["text_search"] == {"columns": ["title", "body"], "id_column": "id"}, processed["text_search"]
+    rows = handler.search_text(path, "Test Dataset", "refunds")
+    assert sorted(row["id"] for row in rows) == [1, 3] and rows[0][DuckDBHandler.SEARCH_SCORE_COLUMN] >= rows[1][DuckDBHandler.SEARCH_SCORE_COLUMN], rows
+
+    # 2: Searches can be narrowed to some columns or require every keyword
+    assert [row["id"] for row in handler.search_text(path, "Test Dataset", "refunds", columns=["title"])] == [1]
+    assert [row["id"] for row in handler.search_text(path, "Test Dataset", "refunds damaged", match_all=True)] == [3]
+
+    # 3: The index is rebuilt over appended rows
+    appended = os.path.join(directory, "new_articles.csv")
+    with open(appended, "w") as f:
+        f.write("id,title,body\n5,Billing,Refunded payments show up in a week\n")
+    handler.merge_data(path, appended, "Test Dataset", "csv", "append")
+    assert sorted(row["id"] for row in handler.search_text(path, "Test Dataset", "refunds")) == [1, 3, 5]
+    print('OK\n')
+
+def test_query_results(directory: str):
+    # 1: Results that fit come back inline, without a result file
+    print('Query results...')
+    path = create_warehouse(directory, "query_results", "CREATE TABLE orders AS SELECT range AS id FROM range(100)")
+    files = set(os.listdir(settings.RESULT_DIRECTORY))
+    result = handler.execute_query_to_result(path, "SELECT id FROM orders WHERE id < 10", "user", spill_rows=10, page_rows=5)
+    assert result == {"data": [{"id": i} for i in range(10)], "row_count": 10}, result
+
+    # 2: Larger results are cut off, and only written to a file when they are kept
+    result = handler.execute_query_to_result(path, "SELECT id FROM orders ORDER BY id", "user", spill_rows=10, page_rows=5, keep_result=False)
+    assert result == {"data": [{"id": i} for i in range(5)], "row_count": None, "truncated": True}, result
+    assert set(os.listdir(settings.RESULT_DIRECTORY)) == files
+
+    result = handler.execute_query_to_result(path, "SELECT id FROM orders ORDER BY id", "user", spill_rows=10, page_rows=5)
+    assert result["truncated"] and result["row_count"] == 100 and len(result["data"]) == 5, result
+    handle = result_store.get(result["result"]["id"], "user")
+    assert handler.read_result(handle, offset=95) == [{"id": i} for i in range(95, 100)]
+    result_store.delete(handle.id, "user")
+
+    # 3: Rows read back from result files keep 128-bit integers exact and repeated names apart
+    query = "SELECT a.id, b.id, a.id::HUGEINT * 170141183460469231731687303715 AS huge FROM orders a JOIN orders b ON b.id = a.id ORDER BY a.id"
+    expected = [{"id": i, "id_1": i, "huge": str(i * 170141183460469231731687303715) if i else 0} for i in range(100)]
+    result = handler.execute_query_to_result(path, query, "user", spill_rows=100, page_rows=5)
+    assert result == {"data": expected, "row_count": 100}, result["data"][-1]
+    assert set(os.listdir(settings.RESULT_DIRECTORY)) == files
+    result = handler.execute_query_to_result(path, query, "user", spill_rows=10, page_rows=5)
+    assert result["data"] == expected[:5], result["data"]
+    handle = result_store.get(result["result"]["id"], "user")
+    assert handler.read_result(handle, offset=98) == expected[98:]
+    result_store.delete(handle.id, "user")
+    print('OK\n')
+
+def wait_for_process_opening(path: str, ignored: set, timeout: float = 30) -> int:
+    """Wait for a process other than this one and `ignored` to have a file open, and return its pid."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for pid in filter(str.isdigit, os.listdir("/proc")):
+            if int(pid) == os.getpid() or int(pid) in ignored:
+                continue
+            try:
+                if any(os.readlink(f"/proc/{pid}/fd/{fd}") == path for fd in os.listdir(f"/proc/{pid}/fd")):
+                    return int(pid)
+            except OSError:
+                continue
+        time.sleep(0.02)
+    raise AssertionError(f"no process opened {path}")
+
+def test_worker_crash(directory: str):
+    # 1: A query whose worker keeps dying fails, while a query running next to it in the
+    # pool is retried on its own and succeeds
+    print('Query worker crash...')
+    crashing = create_warehouse(directory, "worker_crash_crashing", "SELECT 1")
+    sibling = create_warehouse(directory, "worker_crash_sibling", "SELECT 1")
+    executor, max_threads = settings.QUERY_EXECUTOR, resource_governor.max_threads
+    settings.QUERY_EXECUTOR = "process"
+    resource_governor.max_threads = max(max_threads, 2 * settings.DUCKDB_THREADS)
+    try:
+        results = {}
+        def run(name, path, query):
+            try:
+                results[name] = handler.execute_query(path, query, timeout=60)
+            except Exception as e:
+                results[name] = e
+        def run_together(*queries):
+            threads = [threading.Thread(target=run, args=query) for query in queries]
+            for thread in threads:
+                thread.start()
+            return threads
+
+        # Start both workers with overlapping queries first: the pool only watches a worker
+        # it spawns for a query after that query is queued, so an early death goes unnoticed
+        warm_up = "SELECT count(*) AS n FROM range(50000000) t(i) WHERE hash(i) % 7 = 0"
+        for thread in run_together(("first", crashing, warm_up), ("second", sibling, warm_up)):
+            thread.join()
+
+        threads = run_together(
+            ("crashing", crashing, "SELECT count(*) AS n FROM range(1000000000000)"),
+            ("sibling", sibling, "SELECT count(*) AS n FROM range(300000000) t(i) WHERE hash(i) % 7 = 0")
+        )
+
+        # Kill the worker running the crashing query while the sibling runs too, then the
+        # process it is retried in
+        retried = query_executor.get_status()["queries"]["retried"]
+        killed = set()
+        pid = wait_for_process_opening(crashing, killed)
+        wait_for_process_opening(sibling, killed)
+        os.kill(pid, signal.SIGKILL)
+        killed.add(pid)
+        os.kill(wait_for_process_opening(crashing, killed), signal.SIGKILL)
+        for thread in threads:
+            thread.join()
+
+        assert isinstance(results["crashing"], QueryWorkerCrashedError), results
+        assert results["sibling"] == [{"n": 42861169}], results
+        assert query_executor.get_status()["queries"]["retried"] == retried + 2
+    finally:
+        settings.QUERY_EXECUTOR, resource_governor.max_threads = executor, max_threads
+    print('OK\n')
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        test_result_types(directory)
+        test_query_params(directory)
+        test_slow_query_log(directory)
+        test_approximate_query_names(directory)
+        test_column_statistics(directory)
+        test_sort_key_clustering(directory)
+        test_file_format_detection(directory)
+        test_rollup_routing(directory)
+        test_enum_encoding(directory)
+        test_nested_json(directory)
+        test_partition_pruning(directory)
+        test_metric_compilation(directory)
+        test_merge_csv_options(directory)
+        test_indexed_merge(directory)
+        test_upsert_duplicate_keys(directory)
+        try:
+            test_text_search(directory)
+        except unittest.SkipTest as e:
+            print(f'Skipped: {e}\n')
+        test_query_results(directory)
+        test_worker_crash(directory)
+
+# Query worker processes import this module too
+if __name__ == "__main__":
+    main()
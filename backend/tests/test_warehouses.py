@@ -38,6 +38,12 @@ def main(tester):
     result = tester.query_warehouse(warehouse_id, access_token)
     print(f'Result:\n{json.dumps(result, indent=4)}\n\n')
 
+    # 5.1: Query warehouse with parameters
+    print('Query warehouse with parameters...')
+    query = 'SELECT * FROM "Test Dataset" WHERE value >= $min_value'
+    result = tester.query_warehouse(warehouse_id, access_token, query=query, params={"min_value": 150})
+    print(f'Result:\n{json.dumps(result, indent=4)}\n\n')
+
     # 6: Get dataset
     # print('Get dataset...')
     # dataset = tester.get_dataset(dataset['id'], access_token)
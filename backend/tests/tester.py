@@ -1,5 +1,7 @@
 import requests
 import io
+import json
+import time
 
 class Tester:
     def __init__(self):
@@ -24,15 +26,41 @@ class Tester:
         response = requests.get(url, headers=headers)
         return response.json()
 
-    def create_dataset(self, warehouse_id: str, name: str, description: str, access_token: str, data: bytes) -> dict:
+    def create_dataset(self, warehouse_id: str, name: str, description: str, access_token: str, data: bytes, csv_options: dict = None) -> dict:
         url = f"{self.BASE_URL}/datasets"
         headers = {"Authorization": f"Bearer {access_token}"}
         file_data = io.BytesIO(data)
         file_data.name = "test.csv"
         files = {'file': ('test.csv', file_data, 'text/csv')}
         data = {'warehouse_id': warehouse_id, 'name': name, 'description': description}
+        for key, value in (csv_options or {}).items():
+            data[key] = json.dumps(value) if key == "column_types" else str(value).lower() if isinstance(value, bool) else str(value)
         response = requests.post(url, files=files, data=data, headers=headers)
+        job = response.json()
+        if response.status_code != 202:
+            return job
+        job = self.wait_for_ingest_job(job["id"], access_token)
+        return job["result"] if job["status"] == "succeeded" else job
+
+    def get_ingest_job(self, job_id: str, access_token: str) -> dict:
+        url = f"{self.BASE_URL}/datasets/jobs/{job_id}"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.get(url, headers=headers)
+        return response.json()
+
+    def cancel_ingest_job(self, job_id: str, access_token: str) -> dict:
+        url = f"{self.BASE_URL}/datasets/jobs/{job_id}/cancel"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.post(url, headers=headers)
         return response.json()
+
+    def wait_for_ingest_job(self, job_id: str, access_token: str, timeout: float = 120) -> dict:
+        deadline = time.time() + timeout
+        job = self.get_ingest_job(job_id, access_token)
+        while job.get("status") in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.5)
+            job = self.get_ingest_job(job_id, access_token)
+        return job
     
     def get_dataset(self, dataset_id: str, access_token: str) -> dict:
         url = f"{self.BASE_URL}/datasets/{dataset_id}"
@@ -55,16 +83,91 @@ class Tester:
         response = requests.put(url, files=files, headers=headers)
         return response.json()
 
+    def update_dataset_rollups(self, dataset_id: str, access_token: str, rollups: list) -> dict:
+        url = f"{self.BASE_URL}/datasets/{dataset_id}/rollups"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.put(url, headers=headers, json={"rollups": rollups})
+        return response.json()
+
+    def update_dataset_indexes(self, dataset_id: str, access_token: str, indexes: list) -> dict:
+        url = f"{self.BASE_URL}/datasets/{dataset_id}/indexes"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.put(url, headers=headers, json={"indexes": indexes})
+        return response.json()
+
+    def get_dataset_preview(self, dataset_id: str, access_token: str, rows: int = None, method: str = "random", stratify_by: str = None) -> dict:
+        url = f"{self.BASE_URL}/datasets/{dataset_id}/preview"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        params = {"method": method}
+        if rows is not None:
+            params["rows"] = rows
+        if stratify_by:
+            params["stratify_by"] = stratify_by
+        response = requests.get(url, headers=headers, params=params)
+        return response.json()
+
+    def update_dataset_text_search(self, dataset_id: str, access_token: str, columns: list, id_column: str = None) -> dict:
+        url = f"{self.BASE_URL}/datasets/{dataset_id}/text_search"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.put(url, headers=headers, json={"columns": columns, "id_column": id_column})
+        return response.json()
+
     def delete_dataset(self, dataset_id: str, access_token: str) -> dict:
         url = f"{self.BASE_URL}/datasets/{dataset_id}"
         headers = {"Authorization": f"Bearer {access_token}"}
         response = requests.delete(url, headers=headers)
         return response.json()
 
-    def query_warehouse(self, warehouse_id, access_token: str, query="SELECT table_name FROM information_schema.tables;") -> dict:
+    def query_warehouse(self, warehouse_id, access_token: str, query="SELECT table_name FROM information_schema.tables;", params: dict = None, approximate: bool = False, attach: list = None) -> dict:
         url = f"{self.BASE_URL}/warehouses/{warehouse_id}/query"
         headers = {"Authorization": f"Bearer {access_token}"}
-        response = requests.post(url, headers=headers, json={"query": query})
+        payload = {"query": query}
+        if params is not None:
+            payload["params"] = params
+        if approximate:
+            payload["approximate"] = True
+        if attach:
+            payload["attach"] = attach
+        response = requests.post(url, headers=headers, json=payload)
+        return response.json()
+
+    def update_semantic_model(self, warehouse_id: str, access_token: str, metrics: list, dimensions: list = None) -> dict:
+        url = f"{self.BASE_URL}/warehouses/{warehouse_id}/semantic_model"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.put(url, headers=headers, json={"metrics": metrics, "dimensions": dimensions or []})
+        return response.json()
+
+    def query_metrics(self, warehouse_id: str, access_token: str, metrics: list, dimensions: list = None, time_grain: str = None, filters: list = None) -> dict:
+        url = f"{self.BASE_URL}/warehouses/{warehouse_id}/metrics"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        payload = {"metrics": metrics, "dimensions": dimensions or [], "filters": filters or []}
+        if time_grain:
+            payload["time_grain"] = time_grain
+        response = requests.post(url, headers=headers, json=payload)
+        return response.json()
+
+    def get_result_rows(self, result_id: str, access_token: str, offset: int = 0, limit: int = 1000) -> dict:
+        url = f"{self.BASE_URL}/results/{result_id}/rows"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.get(url, headers=headers, params={"offset": offset, "limit": limit})
+        return response.json()
+    
+    def profile_query(self, warehouse_id, access_token: str, query: str, mode: str = "json") -> dict:
+        url = f"{self.BASE_URL}/warehouses/{warehouse_id}/profile"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.post(url, headers=headers, json={"query": query, "mode": mode})
+        return response.json()
+
+    def get_slow_queries(self, access_token: str, hottest: bool = False) -> dict:
+        url = f"{self.BASE_URL}/admin/slow-queries" + ("/hottest" if hottest else "")
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.get(url, headers=headers)
+        return response.json()
+
+    def get_resource_usage(self, access_token: str) -> dict:
+        url = f"{self.BASE_URL}/admin/resources"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = requests.get(url, headers=headers)
         return response.json()
     
     def create_chat(self, title: str, access_token: str) -> dict:
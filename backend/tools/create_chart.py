@@ -2,6 +2,7 @@ from typing import Any, Dict
 from .base import BaseTool
 from services.warehouses_service import WarehouseService
 from services.file_handler import FileHandler
+from services.result_store import result_store
 from core.config import settings
 from supabase import create_client, Client
 
@@ -34,7 +35,15 @@ class CreateChartTool(BaseTool):
                     },
                     "query": {
                         "type": "string",
-                        "description": "DuckDB SQL query selecting the required columns."
+                        "description": "DuckDB SQL query selecting the required columns. Filter values can be written as $name placeholders and supplied in params."
+                    },
+                    "params": {
+                        "type": "object",
+                        "description": "Optional. Values for the $name placeholders used in the query, e.g. {\"start_date\": \"2025-01-01\"}."
+                    },
+                    "result_id": {
+                        "type": "string",
+                        "description": "Optional. result_id returned by a truncated get_data call, to chart all of its rows instead of running a query."
                     },
                     "warehouse_id": {
                         "type": "string",
@@ -45,23 +54,31 @@ class CreateChartTool(BaseTool):
                         "description": "Title of the chart."
                     }
                 },
-                "required": ["kind", "x", "y", "query", "warehouse_id", "title"]
+                "required": ["kind", "x", "y", "warehouse_id", "title"]
             },
             user_id=user_id
         )
 
     def run(self, **kwargs) -> Any:
         # Validate required parameters
-        required_params = ["kind", "x", "y", "query", "warehouse_id", "title"]
+        required_params = ["kind", "x", "y", "warehouse_id", "title"]
         for param in required_params:
             if param not in kwargs:
                 raise ValueError(f"Missing required parameter: {param}")
+        if not kwargs.get("query") and not kwargs.get("result_id"):
+            raise ValueError("Missing required parameter: query or result_id")
 
         # Validate chart kind
         valid_kinds = ["bar", "line", "donut", "table", "scatter"]
         if kwargs["kind"] not in valid_kinds:
             raise ValueError(f"Invalid chart kind. Must be one of: {', '.join(valid_kinds)}")
 
+        if kwargs.get("params") is not None and not isinstance(kwargs["params"], dict):
+            raise ValueError("Params must be an object mapping parameter names to values")
+
+        if kwargs.get("result_id"):
+            return self._chart_from_result(**kwargs)
+
         # Validate warehouse exists
         warehouse_service = WarehouseService(supabase)
         warehouse = warehouse_service.get_warehouse(user_id=self.user_id, warehouse_id=kwargs["warehouse_id"])
@@ -75,11 +92,12 @@ class CreateChartTool(BaseTool):
         
         try:
             file_handler.download_file(warehouse["storage_path"], local_path)
+            warehouse_service.sync_partitions(self.user_id, warehouse)
             
             # Execute query to validate it works
             from services.duckdb_handler import DuckDBHandler
             handler = DuckDBHandler()
-            results = handler.execute_query(local_path, kwargs["query"])
+            results = handler.execute_query(local_path, kwargs["query"], params=kwargs.get("params"), warehouse_id=kwargs["warehouse_id"], source=self.name)
 
             # Validate that the required columns exist in the results
             if not results:
@@ -100,6 +118,7 @@ class CreateChartTool(BaseTool):
                 "y": kwargs["y"],
                 "categories": kwargs.get("categories"),
                 "query": kwargs["query"],
+                "params": kwargs.get("params"),
                 "warehouse_id": kwargs["warehouse_id"],
                 "title": kwargs["title"]
             }
@@ -108,6 +127,32 @@ class CreateChartTool(BaseTool):
             # Clean up temporary file
             file_handler.cleanup(local_path)
 
+    def _chart_from_result(self, **kwargs) -> Dict[str, Any]:
+        """Validate a chart over a spilled result, whose columns are known without running anything."""
+        handle = result_store.get(kwargs["result_id"], self.user_id)
+        if not handle or handle.warehouse_id != kwargs["warehouse_id"]:
+            raise ValueError(f"Result with ID {kwargs['result_id']} not found or expired")
+
+        columns = [column["name"] for column in handle.columns]
+        if kwargs["x"] not in columns:
+            raise ValueError(f"Column '{kwargs['x']}' not found in result")
+        if kwargs["y"] not in columns:
+            raise ValueError(f"Column '{kwargs['y']}' not found in result")
+        if kwargs.get("categories") and kwargs["categories"] not in columns:
+            raise ValueError(f"Categories column '{kwargs['categories']}' not found in result")
+
+        return {
+            "kind": kwargs["kind"],
+            "x": kwargs["x"],
+            "y": kwargs["y"],
+            "categories": kwargs.get("categories"),
+            "query": kwargs.get("query"),
+            "params": kwargs.get("params"),
+            "result_id": handle.id,
+            "warehouse_id": kwargs["warehouse_id"],
+            "title": kwargs["title"]
+        }
+
     def get_schema(self) -> Dict[str, Any]:
         """Get the schema for this tool."""
         return {
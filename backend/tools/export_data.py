@@ -4,6 +4,7 @@ import pandas as pd
 from supabase import create_client, Client
 from services.file_handler import FileHandler
 from services.warehouses_service import WarehouseService
+from services.result_store import result_store
 from core.config import settings
 import uuid
 from datetime import datetime
@@ -14,7 +15,7 @@ class ExportDataTool(BaseTool):
     def __init__(self, user_id: str):
         super().__init__(
             name="export_data",
-            description="Export data to a CSV file with a SQL query",
+            description="Export data to a CSV file with a SQL query, or export all rows of a truncated get_data result by its result_id",
             parameters={
                 "type": "object",
                 "properties": {
@@ -25,9 +26,13 @@ class ExportDataTool(BaseTool):
                     "query": {
                         "type": "string",
                         "description": "SQL query to execute"
+                    },
+                    "result_id": {
+                        "type": "string",
+                        "description": "result_id returned by a truncated get_data call, exported without running its query again. Replaces query."
                     }
                 },
-                "required": ["warehouse_id", "query"]
+                "required": ["warehouse_id"]
             },
             user_id=user_id
         )
@@ -37,9 +42,13 @@ class ExportDataTool(BaseTool):
         
         warehouse_id = kwargs.get("warehouse_id")
         query = kwargs.get("query")
+        result_id = kwargs.get("result_id")
         
-        if not warehouse_id or not query:
-            raise ValueError("Both warehouse_id and query are required")
+        if not warehouse_id or not (query or result_id):
+            raise ValueError("warehouse_id and either query or result_id are required")
+
+        if result_id:
+            return self._export_result(warehouse_id, result_id)
             
         # Get warehouse details
         warehouse_service = WarehouseService(supabase)
@@ -51,9 +60,10 @@ class ExportDataTool(BaseTool):
         
         try:
             file_handler.download_file(warehouse["storage_path"], local_path)
+            warehouse_service.sync_partitions(self.user_id, warehouse)
             
             handler = DuckDBHandler()
-            results = handler.execute_query(local_path, query)
+            results = handler.execute_query(local_path, query, warehouse_id=warehouse_id, source=self.name)
 
             df = pd.DataFrame(results)
             
@@ -77,6 +87,34 @@ class ExportDataTool(BaseTool):
             if 'temp_csv_path' in locals():
                 file_handler.cleanup(temp_csv_path)
 
+    def _export_result(self, warehouse_id: str, result_id: str) -> Dict[str, Any]:
+        from services.duckdb_handler import DuckDBHandler
+
+        handle = result_store.get(result_id, self.user_id)
+        if not handle or handle.warehouse_id != warehouse_id:
+            raise ValueError(f"Result with ID {result_id} not found or expired")
+
+        file_handler = FileHandler()
+        file_id = str(uuid.uuid4())
+        csv_filename = f"{file_id}.csv"
+        temp_csv_path = file_handler.create_empty_temp_file(".csv")
+
+        try:
+            # Copied straight from the result's Parquet file, without loading it into memory
+            row_count = DuckDBHandler().export_result(handle, temp_csv_path, file_format="csv")
+
+            file_handler.set_bucket("exports")
+            file_handler.upload_file(temp_csv_path, csv_filename)
+
+            return {
+                "download_url": f"{settings.BASE_URL}/api/exports/download/{file_id}",
+                "filename": csv_filename,
+                "row_count": row_count
+            }
+
+        finally:
+            file_handler.cleanup(temp_csv_path)
+
     def get_schema(self) -> Dict[str, Any]:
         """Get the schema for this tool."""
         return {
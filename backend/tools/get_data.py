@@ -14,6 +14,7 @@ supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_API_KE
 class GetDataTool(BaseTool):
 
     MAX_OUTPUT_TOKENS = 500
+    MAX_ROWS = 100
 
     def __init__(self, user_id: str):
         super().__init__(
@@ -29,6 +30,32 @@ class GetDataTool(BaseTool):
                     "query": {
                         "type": "string",
                         "description": "DuckDB SQL query to execute."
+                    },
+                    "approximate": {
+                        "type": "boolean",
+                        "description": "Answer from a uniform sample of the table for a fast estimate on large tables. SUM and COUNT are scaled to the full table and come with 95% error bounds. Use for exploration, not for final numbers."
+                    },
+                    "keep_result": {
+                        "type": "boolean",
+                        "description": "Keep the full result when it has more rows than are returned, and get a result_id to export or chart all of them. Costs running the query to completion; only use it when you will need all the rows."
+                    },
+                    "attach_warehouses": {
+                        "type": "array",
+                        "description": "Other warehouses to attach read-only so the query can join across warehouses. Reference their tables as alias.table_name.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "warehouse_id": {
+                                    "type": "string",
+                                    "description": "ID of the warehouse to attach."
+                                },
+                                "alias": {
+                                    "type": "string",
+                                    "description": "Name to reference the warehouse by in the query (letters, digits and underscores)."
+                                }
+                            },
+                            "required": ["warehouse_id", "alias"]
+                        }
                     }
                 },
                 "required": ["warehouse_id", "query"]
@@ -40,7 +67,9 @@ class GetDataTool(BaseTool):
         return sample(range(len(results)), min(len(results), sample_size))
 
     def _estimate_token_count(self, results: list[dict], sample_size: int = 10) -> int:
-        results_sample = self._get_sample(results, sample_size)
+        if not results:
+            return {'sample_tokens': 0, 'avg_record_token': 0, 'estimated_tokens': 0}
+        results_sample = [results[i] for i in self._get_sample(results, sample_size)]
         results_sample_json = '\n'.join([json.dumps(result) for result in results_sample])
         sample_tokens = len(tiktoken.encoding_for_model("gpt-4o").encode(results_sample_json))
         avg_record_token = sample_tokens / len(results_sample)
@@ -56,6 +85,9 @@ class GetDataTool(BaseTool):
         
         warehouse_id = kwargs.get("warehouse_id")
         query = kwargs.get("query")
+        approximate = bool(kwargs.get("approximate", False))
+        keep_result = bool(kwargs.get("keep_result", False))
+        attach_warehouses = kwargs.get("attach_warehouses") or []
         
         if not warehouse_id or not query:
             raise ValueError("Both warehouse_id and query are required")
@@ -68,18 +100,40 @@ class GetDataTool(BaseTool):
         file_handler = FileHandler()
         file_handler.set_bucket(warehouse["bucket"])
         local_path = file_handler.create_empty_temp_file(".duckdb")
+        attachments = {}
         
         try:
             file_handler.download_file(warehouse["storage_path"], local_path)
+            warehouse_service.sync_partitions(self.user_id, warehouse)
+            attachments = warehouse_service.download_attached_warehouses(self.user_id, attach_warehouses)
             
             # Execute query using DuckDBHandler
             handler = DuckDBHandler()
-            results = handler.execute_query(local_path, query)
+            approximation = None
+            spilled = None
+            if approximate:
+                # Fetch one row past the cap so we know whether the query had more rows
+                approximation = handler.execute_approximate_query(local_path, query, limit=self.MAX_ROWS + 1, warehouse_id=warehouse_id, source=self.name, attachments=attachments)
+                results = approximation.pop("data")
+                has_more_rows = len(results) > self.MAX_ROWS
+                results = results[:self.MAX_ROWS]
+                # Only ask the planner for a total when rows were cut off at the source
+                total_rows = handler.estimate_row_count(local_path, query, attachments=attachments) if has_more_rows else len(results)
+            else:
+                # Only rows up to the cap are fetched; when asked, results past it are kept as a
+                # result handle that export_data and create_chart can reuse
+                result = handler.execute_query_to_result(local_path, query, self.user_id, spill_rows=self.MAX_ROWS, page_rows=self.MAX_ROWS, warehouse_id=warehouse_id, source=self.name, attachments=attachments, keep_result=keep_result)
+                results = result["data"]
+                has_more_rows = bool(result.get("truncated"))
+                spilled = result.get("result")
+                total_rows = result["row_count"]
+                if has_more_rows and total_rows is None:
+                    total_rows = handler.estimate_row_count(local_path, query, attachments=attachments)
 
             estimated_token_count = self._estimate_token_count(results)
 
-            trucate_results = estimated_token_count['estimated_tokens'] > self.MAX_OUTPUT_TOKENS
-            if trucate_results:
+            trucate_results = has_more_rows or estimated_token_count['estimated_tokens'] > self.MAX_OUTPUT_TOKENS
+            if estimated_token_count['estimated_tokens'] > self.MAX_OUTPUT_TOKENS:
                 results = self._truncate_results(results, estimated_token_count['avg_record_token'])
 
             response = {
@@ -87,14 +141,31 @@ class GetDataTool(BaseTool):
                 'truncated': trucate_results,
             }
 
+            if approximation and approximation["approximate"]:
+                response['approximate'] = True
+                response['sample'] = approximation['sample']
+                if approximation['error_bounds']:
+                    response['error_bounds'] = approximation['error_bounds'][:len(results)]
+                response['note'] = "Results are estimated from a sample of the table; SUM and COUNT values are scaled and error_bounds give their 95% margin of error."
+
             if trucate_results:
-                response['warning'] = f"The query returned returned truncated results because the output was to big. The first {len(results)} records are returned."
+                if total_rows is None:
+                    total_rows_text = f"more than {self.MAX_ROWS}"
+                else:
+                    total_rows_text = f"about {total_rows}" if has_more_rows and not spilled else str(total_rows)
+                response['total_rows'] = total_rows
+                response['warning'] = f"The query returned returned truncated results because the output was to big. The first {len(results)} of {total_rows_text} records are returned."
+                if spilled:
+                    response['result_id'] = spilled['id']
+                    response['note'] = "Pass result_id to export_data or create_chart to use all rows of this result without running the query again."
+                elif has_more_rows and not approximation:
+                    response['note'] = "Run the query again with keep_result to export or chart all of its rows."
 
             return response
             
         finally:
-            # Clean up temporary file
-            file_handler.cleanup(local_path)
+            # Clean up temporary files
+            file_handler.cleanup(local_path, *attachments.values())
 
     def get_schema(self) -> Dict[str, Any]:
         """Get the schema for this tool."""
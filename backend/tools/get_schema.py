@@ -1,7 +1,6 @@
 from typing import Any, Dict
 from .base import BaseTool
 from services.warehouses_service import WarehouseService
-from services.datasets_service import DatasetService
 from supabase import create_client
 from core.config import settings
 
@@ -25,7 +24,6 @@ class GetSchemaTool(BaseTool):
         )
         self.supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_API_KEY)
         self.warehouse_service = WarehouseService(self.supabase)
-        self.dataset_service = DatasetService(self.supabase)
 
     def run(self, **kwargs) -> Any:
         """Get a specific warehouse and its tables by warehouse ID."""
@@ -36,26 +34,9 @@ class GetSchemaTool(BaseTool):
         if not warehouse:
             return {"error": f"Warehouse with ID {warehouse_id} not found or access denied"}
         
-        # Get all datasets (tables) for this warehouse
-        datasets = self.dataset_service.get_user_datasets(self.user_id, warehouse_id=warehouse_id)
-        
-        # Format tables information
-        tables = {}
-        for dataset in datasets:
-            tables[dataset["name"]] = {
-                "description": dataset.get("description", ""),
-                "columns": dataset.get("columns", [])
-            }
-        
-        # Format the result
-        result = {
-            "id": warehouse["id"],
-            "name": warehouse["name"],
-            "description": warehouse["description"],
-            "tables": tables
-        }
-        
-        return result
+        # Same tables and metadata as the warehouse schema endpoint, including indexes,
+        # partition columns and child tables
+        return self.warehouse_service.get_warehouse_schema(self.user_id, warehouse_id)
 
     def get_schema(self) -> Dict[str, Any]:
         """Get the schema for this tool."""
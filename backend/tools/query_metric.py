@@ -0,0 +1,124 @@
+from typing import Any, Dict
+from .base import BaseTool
+from supabase import create_client, Client
+from services.warehouses_service import WarehouseService
+from services.utils.metrics import FILTER_OPERATORS
+from services.utils.rollups import TIME_GRAINS
+
+from core.config import settings
+
+supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_API_KEY)
+
+class QueryMetricTool(BaseTool):
+
+    MAX_ROWS = 100
+
+    def __init__(self, user_id: str):
+        super().__init__(
+            name="query_metric",
+            description="Compute business metrics defined in the warehouse's semantic model (listed under metrics in the schema), optionally broken down by its dimensions and a time grain. Prefer it over writing SQL whenever the metrics asked for are defined, so they are computed consistently.",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "warehouse_id": {
+                        "type": "string",
+                        "description": "ID of the warehouse defining the metrics."
+                    },
+                    "metrics": {
+                        "type": "array",
+                        "description": "Names of the metrics to compute, all from the same table.",
+                        "items": {"type": "string"}
+                    },
+                    "dimensions": {
+                        "type": "array",
+                        "description": "Names of the dimensions to break the metrics down by.",
+                        "items": {"type": "string"}
+                    },
+                    "time_grain": {
+                        "type": "string",
+                        "enum": list(TIME_GRAINS),
+                        "description": "Group by the metrics' time column truncated to this grain."
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "First date to include (YYYY-MM-DD), on the metrics' time column."
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "Date to stop before (YYYY-MM-DD, exclusive), on the metrics' time column."
+                    },
+                    "filters": {
+                        "type": "array",
+                        "description": "Conditions on dimensions that rows must meet.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "dimension": {"type": "string"},
+                                "operator": {"type": "string", "enum": list(FILTER_OPERATORS)},
+                                "value": {"description": "Value to compare with; a list for in and not_in."}
+                            },
+                            "required": ["dimension", "operator", "value"]
+                        }
+                    },
+                    "order_by": {
+                        "type": "string",
+                        "description": "Metric or dimension to sort by, descending unless ascending is set. Defaults to the time period and dimensions."
+                    },
+                    "ascending": {
+                        "type": "boolean",
+                        "description": "Sort order_by ascending instead of descending."
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"Maximum number of rows to return, at most {self.MAX_ROWS}."
+                    }
+                },
+                "required": ["warehouse_id", "metrics"]
+            },
+            user_id=user_id
+        )
+
+    def run(self, **kwargs) -> Any:
+        warehouse_id = kwargs.get("warehouse_id")
+        metrics = kwargs.get("metrics")
+        limit = min(int(kwargs.get("limit") or self.MAX_ROWS), self.MAX_ROWS)
+
+        if not warehouse_id or not metrics:
+            raise ValueError("Both warehouse_id and metrics are required")
+
+        warehouse_service = WarehouseService(supabase)
+        result = warehouse_service.query_metrics(
+            user_id=self.user_id,
+            warehouse_id=warehouse_id,
+            metrics=metrics,
+            dimensions=kwargs.get("dimensions"),
+            time_grain=kwargs.get("time_grain"),
+            start=kwargs.get("start"),
+            end=kwargs.get("end"),
+            filters=kwargs.get("filters"),
+            order_by=kwargs.get("order_by"),
+            descending=not kwargs.get("ascending", False),
+            limit=limit,
+            source=self.name
+        )
+
+        response = {
+            'data': result['data'],
+            'truncated': result['truncated'],
+            # The compiled SQL lets follow-up get_data or create_chart calls build on the same definition
+            'query': result['query']
+        }
+        if result['params']:
+            response['params'] = result['params']
+        if result['truncated']:
+            response['warning'] = f"Only the first {limit} rows are returned; add filters or fewer dimensions to see the rest."
+        return response
+
+    def get_schema(self) -> Dict[str, Any]:
+        """Get the schema for this tool."""
+        return {
+            "type": "function",
+            "name": self.name,
+            "description": self.description,
+            "parameters": self.parameters
+        }
@@ -0,0 +1,108 @@
+from typing import Any, Dict
+from .base import BaseTool
+from supabase import create_client, Client
+from services.file_handler import FileHandler
+from services.warehouses_service import WarehouseService
+
+from core.config import settings
+
+supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_API_KEY)
+
+class SearchDataTool(BaseTool):
+
+    MAX_ROWS = 20
+
+    def __init__(self, user_id: str):
+        super().__init__(
+            name="search_data",
+            description="Find the rows of a table that best match keywords, using the table's full-text search index. Only works on tables listing text_search_columns in the schema. Prefer it over ILIKE filters for keyword questions.",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "warehouse_id": {
+                        "type": "string",
+                        "description": "ID of the warehouse holding the table."
+                    },
+                    "table_name": {
+                        "type": "string",
+                        "description": "Name of the table to search."
+                    },
+                    "query": {
+                        "type": "string",
+                        "description": "Keywords to search for. Words are matched on their stem, so 'refunds' also finds 'refunded'."
+                    },
+                    "columns": {
+                        "type": "array",
+                        "description": "Only search these of the table's text search columns. Defaults to all of them.",
+                        "items": {"type": "string"}
+                    },
+                    "match_all": {
+                        "type": "boolean",
+                        "description": "Only return rows containing every keyword instead of any of them."
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"Number of best matching rows to return, at most {self.MAX_ROWS}."
+                    }
+                },
+                "required": ["warehouse_id", "table_name", "query"]
+            },
+            user_id=user_id
+        )
+
+    def run(self, **kwargs) -> Any:
+        from services.duckdb_handler import DuckDBHandler
+
+        warehouse_id = kwargs.get("warehouse_id")
+        table_name = kwargs.get("table_name")
+        query = kwargs.get("query")
+        limit = kwargs.get("limit")
+        limit = self.MAX_ROWS if limit is None else int(limit)
+
+        if not warehouse_id or not table_name or not query:
+            raise ValueError("warehouse_id, table_name and query are required")
+        if limit <= 0:
+            raise ValueError("limit must be a positive number of rows")
+        limit = min(limit, self.MAX_ROWS)
+
+        # Get warehouse details
+        warehouse_service = WarehouseService(supabase)
+        warehouse = warehouse_service.get_warehouse(user_id=self.user_id, warehouse_id=warehouse_id)
+
+        # Initialize file handler and download warehouse file temporarily
+        file_handler = FileHandler()
+        file_handler.set_bucket(warehouse["bucket"])
+        local_path = file_handler.create_empty_temp_file(".duckdb")
+
+        try:
+            file_handler.download_file(warehouse["storage_path"], local_path)
+
+            handler = DuckDBHandler()
+            results = handler.search_text(
+                local_path,
+                table_name,
+                query,
+                columns=kwargs.get("columns"),
+                match_all=bool(kwargs.get("match_all", False)),
+                limit=limit,
+                warehouse_id=warehouse_id,
+                source=self.name
+            )
+
+            return {
+                'data': results,
+                'note': f"Rows are ranked best match first; {DuckDBHandler.SEARCH_SCORE_COLUMN} is their BM25 relevance."
+            }
+
+        finally:
+            # Clean up temporary files
+            file_handler.cleanup(local_path)
+
+    def get_schema(self) -> Dict[str, Any]:
+        """Get the schema for this tool."""
+        return {
+            "type": "function",
+            "name": self.name,
+            "description": self.description,
+            "parameters": self.parameters
+        }
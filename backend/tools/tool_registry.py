@@ -28,9 +28,13 @@ from tools.get_data import GetDataTool
 from tools.export_data import ExportDataTool
 from tools.get_schema import GetSchemaTool
 from tools.create_chart import CreateChartTool
+from tools.search_data import SearchDataTool
+from tools.query_metric import QueryMetricTool
 
 ToolRegistry.register(ListWarehousesTool)
 ToolRegistry.register(GetDataTool)
 ToolRegistry.register(ExportDataTool) 
 ToolRegistry.register(GetSchemaTool)
-ToolRegistry.register(CreateChartTool)
\ No newline at end of file
+ToolRegistry.register(CreateChartTool)
+ToolRegistry.register(SearchDataTool)
+ToolRegistry.register(QueryMetricTool)
\ No newline at end of file
@@ -1,11 +1,15 @@
 from abc import ABC, abstractmethod
-from src.modules.util import query_warehouse
+from src.modules.util import query_warehouse, get_result_rows
 import streamlit as st
 from uuid import uuid4
 
 class BaseChart(ABC):
     fig = None
-    def __init__(self, token: str, x: str, y: str, categories: list[str], query: str, warehouse_id: str, title: str):
+    # Large results are paged in up to this many rows
+    MAX_ROWS = 10000
+    RESULT_PAGE_ROWS = 1000
+
+    def __init__(self, token: str, x: str, y: str, categories: list[str], query: str, warehouse_id: str, title: str, params: dict = None, result_id: str = None):
         self.token = token
         self.x = x
         self.y = y
@@ -13,12 +17,32 @@ class BaseChart(ABC):
         self.query = query
         self.warehouse_id = warehouse_id
         self.title = title
+        self.params = params
+        self.result_id = result_id
+        self.row_count = None
         self.set_data()
         self.set_fig()
         self.render()        
     
     def set_data(self) -> None:
-        self.data = query_warehouse(self.token, self.warehouse_id, self.query)['data']
+        if self.result_id:
+            result_id, self.data, has_more = self.result_id, [], True
+        else:
+            response = query_warehouse(self.token, self.warehouse_id, self.query, self.params)
+            self.data = response['data']
+            self.row_count = response.get('row_count')
+            result_id = (response.get('result') or {}).get('id')
+            has_more = bool(response.get('truncated'))
+
+        # Truncated results keep the rest of their rows behind a result handle
+        while result_id and has_more and len(self.data) < self.MAX_ROWS:
+            page = get_result_rows(self.token, result_id, offset=len(self.data), limit=min(self.RESULT_PAGE_ROWS, self.MAX_ROWS - len(self.data)))
+            if 'data' not in page:
+                break
+            self.data = self.data + page['data']
+            self.row_count = page['row_count']
+            has_more = page['has_more']
+        self.truncated = has_more
 
     @abstractmethod
     def set_fig(self) -> None:
@@ -26,6 +50,9 @@ class BaseChart(ABC):
 
     def render(self) -> None:
         if self.token:
+            if self.truncated:
+                total = f" of {self.row_count:,}" if self.row_count else ""
+                st.caption(f"Showing the first {len(self.data):,}{total} rows.")
             if self.fig is not None:
                 self.fig.update_layout(height=400, margin=dict(l=70, r=20, t=45, b=70))
                 st.plotly_chart(self.fig, use_container_width=True, border=True, theme='streamlit', key=str(uuid4()))
@@ -3,8 +3,8 @@ import plotly.express as px
 
 class DonutChart(BaseChart):
 
-    def __init__(self, token: str, x: str, y: str, categories: list[str], query: str, warehouse_id: str, title: str):
-        super().__init__(token, x, y, categories, query, warehouse_id, title)
+    def __init__(self, token: str, x: str, y: str, categories: list[str], query: str, warehouse_id: str, title: str, params: dict = None, result_id: str = None):
+        super().__init__(token, x, y, categories, query, warehouse_id, title, params, result_id)
 
     def set_fig(self) -> None:
         self.fig = px.pie(self.data, values=self.y, names=self.x, title=self.title, hole=0.4) 
\ No newline at end of file
@@ -3,8 +3,8 @@ import plotly.express as px
 
 class LineChart(BaseChart):
 
-    def __init__(self, token: str, x: str, y: str, categories: list[str], query: str, warehouse_id: str, title: str):
-        super().__init__(token, x, y, categories, query, warehouse_id, title)
+    def __init__(self, token: str, x: str, y: str, categories: list[str], query: str, warehouse_id: str, title: str, params: dict = None, result_id: str = None):
+        super().__init__(token, x, y, categories, query, warehouse_id, title, params, result_id)
 
     def set_fig(self) -> None:
         self.fig = px.line(self.data, x=self.x, y=self.y, color=self.categories, title=self.title) 
\ No newline at end of file
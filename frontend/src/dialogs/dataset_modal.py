@@ -1,7 +1,7 @@
 import streamlit as st
 import time
 
-from src.modules.util import upload_dataset, update_dataset
+from src.modules.util import upload_dataset, update_dataset, get_ingest_job
 from src.pages.page_registry import PageRegistry
 
 
@@ -26,7 +26,20 @@ class DatasetModal:
                 st.error("Please upload a file")
                 return
             
-            dataset = upload_dataset(st.session_state['token'], file, self.warehouse_id, name, description )
+            job = upload_dataset(st.session_state['token'], file, self.warehouse_id, name, description )
+            if "error" in job:
+                st.error(job["error"])
+                return
+
+            # The dataset is ingested in the background; wait for the job to finish
+            with st.spinner("Processing dataset..."):
+                while job.get("status") in ("queued", "running"):
+                    time.sleep(1)
+                    job = get_ingest_job(st.session_state['token'], job["id"])
+
+            if job.get("status") != "succeeded":
+                st.error(job.get("error") or "Dataset processing was cancelled")
+                return
             st.success("Dataset created successfully!")
             time.sleep(2)
             page = PageRegistry.get_page(self.destination)
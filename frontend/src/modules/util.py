@@ -101,6 +101,11 @@ def upload_dataset(token, uploaded_file, warehouse_id, name, description=None):
     response = requests.post(url, headers=headers, files=files, data=data)
     return response.json()
 
+def get_ingest_job(token, job_id):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = requests.get(f"{BASE_URL}/api/datasets/jobs/{job_id}", headers=headers)
+    return response.json()
+
 def get_datasets(token, warehouse_id):
     headers = {"Authorization": f"Bearer {token}"}
     params = {"warehouse_id": warehouse_id}
@@ -112,6 +117,14 @@ def get_dataset(token, dataset_id):
     response = requests.get(f"{BASE_URL}/api/datasets/{dataset_id}", headers=headers)
     return response.json()
 
+def get_dataset_preview(token, dataset_id, rows=None, method="random"):
+    headers = {"Authorization": f"Bearer {token}"}
+    params = {"method": method}
+    if rows is not None:
+        params["rows"] = rows
+    response = requests.get(f"{BASE_URL}/api/datasets/{dataset_id}/preview", headers=headers, params=params)
+    return response.json()
+
 def get_chat_messages(token, chat_id, limit=None):
     headers = {"Authorization": f"Bearer {token}"}
     params = {}
@@ -120,12 +133,20 @@ def get_chat_messages(token, chat_id, limit=None):
     response = requests.get(f"{BASE_URL}/api/chats/{chat_id}/messages", headers=headers, params=params)
     return response.json()
 
-def query_warehouse(token, warehouse_id, query):
+def query_warehouse(token, warehouse_id, query, params=None):
     headers = {"Authorization": f"Bearer {token}"}
     data = {"query": query}
+    if params:
+        data["params"] = params
     response = requests.post(f"{BASE_URL}/api/warehouses/{warehouse_id}/query", headers=headers, json=data)
     return response.json()
 
+def get_result_rows(token, result_id, offset=0, limit=1000):
+    headers = {"Authorization": f"Bearer {token}"}
+    params = {"offset": offset, "limit": limit}
+    response = requests.get(f"{BASE_URL}/api/results/{result_id}/rows", headers=headers, params=params)
+    return response.json()
+
 def get_tools(token):
     headers = {"Authorization": f"Bearer {token}"}
     response = requests.get(f"{BASE_URL}/api/tools", headers=headers)
@@ -55,7 +55,9 @@ class ChatPage(BasePage):
                                     chart_config["categories"],
                                     chart_config["query"],
                                     chart_config["warehouse_id"],
-                                    chart_config["title"]
+                                    chart_config["title"],
+                                    chart_config.get("params"),
+                                    chart_config.get("result_id")
                                 )
 
     def _render_text(self, text: str, holder=st):
@@ -179,7 +181,9 @@ class ChatPage(BasePage):
                                 chart_config["categories"],
                                 chart_config["query"],
                                 chart_config["warehouse_id"],
-                                chart_config["title"]
+                                chart_config["title"],
+                                chart_config.get("params"),
+                                chart_config.get("result_id")
                             )
                         
                 elif event == 'response.content_part.added':
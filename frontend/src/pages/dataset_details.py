@@ -1,5 +1,5 @@
 import streamlit as st
-from src.modules.util import get_dataset, convert_size, delete_dataset, get_warehouse
+from src.modules.util import get_dataset, get_dataset_preview, convert_size, delete_dataset, get_warehouse
 
 from src.pages.base import BasePage
 from src.pages.page_registry import PageRegistry
@@ -74,6 +74,11 @@ class DatasetDetailsPage(BasePage):
         
         st.markdown('#### Preview')
         DividerComponent()
-        st.dataframe(self.dataset['preview_data'], use_container_width=True)
+        # Previews are sampled from the warehouse on request
+        preview = get_dataset_preview(st.session_state.token, self.dataset_id)
+        if preview.get('data') is None:
+            st.info(preview.get('error') or 'The preview of this dataset is not available right now.')
+        else:
+            st.dataframe(preview['data'], use_container_width=True)
 
 DatasetDetailsPage()
\ No newline at end of file